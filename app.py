@@ -1,6 +1,15 @@
 # app.py
 from flask import Flask, render_template
 from config import Config
+from commands import register_commands
+import busqueda
+import imagenes
+import identidad
+from permisos import registro_permisos
+from cache import cache_paginas
+from carrito_store import carritos
+from tareas import tareas
+import notificaciones  # registra las tareas de correo y alertas
 from extensions import db, login_manager, mail
 from models import Usuario, Rol
 from routes import (
@@ -12,9 +21,9 @@ from routes import (
     usuarios_bp,
     carrito_bp,
     home_bp,
-    resenas_bp
+    resenas_bp,
+    reportes_bp
 )
-from globals import SHOPPING_CARTS
 from flask import session
 from routes.pedidos import pedidos_bp
 
@@ -29,12 +38,19 @@ def create_app():
     db.init_app(app)
     login_manager.init_app(app)
     mail.init_app(app)
+    cache_paginas.init_app(app)
+    imagenes.init_app(app)
+    carritos.init_app(app)
+    tareas.init_app(app)
+    identidad.init_app(app)
+    registro_permisos.init_app(app)
 
     # Configurar Flask-Login
     login_manager.login_view = 'registro.login'  # Nombre del blueprint y la función de login
     @login_manager.user_loader
     def load_user(user_id):
-        return Usuario.query.get(user_id)
+        # Sin consulta mientras la identidad siga en la caché (IDENTIDAD_TTL)
+        return identidad.cargar_identidad(user_id)
 
     # Registrar Blueprints
     app.register_blueprint(contraseña_bp)
@@ -47,11 +63,18 @@ def create_app():
     app.register_blueprint(home_bp)
     app.register_blueprint(pedidos_bp)
     app.register_blueprint(resenas_bp)
+    app.register_blueprint(reportes_bp)
+
+    # Comandos de mantenimiento (flask crear-indices, ...)
+    register_commands(app)
 
     # Crear las tablas si no existen
     with app.app_context():
         db.create_all()
 
+    # Índice de búsqueda de productos en memoria
+    busqueda.init_app(app)
+
     return app
 
 
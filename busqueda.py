@@ -0,0 +1,234 @@
+# busqueda.py
+import bisect
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import Producto, VersionDatos
+
+# Peso de cada campo del producto en el ranking
+PESOS_CAMPOS = {
+    'nombre': 3.0,
+    'categoria': 2.0,
+    'color': 1.5,
+    'talla': 1.0,
+    'descripcion': 1.0,
+}
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+# Fila de `versiones_datos` que sube con cada cambio de productos
+VERSION_CATALOGO = 'catalogo'
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes: 'Camisón Azúl' -> 'camison azul'."""
+    if not texto:
+        return ''
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return texto.lower()
+
+def tokenizar(texto):
+    return _TOKEN_RE.findall(normalizar(texto))
+
+
+class IndiceProductos:
+    """Índice invertido en memoria de los productos del catálogo.
+
+    Se construye al arrancar y se actualiza producto a producto desde las
+    rutas de administración. Cada proceso de gunicorn mantiene su propia
+    copia: `refrescar_indice` la reconstruye cuando la versión del catálogo
+    en la base ya no es la `version` con la que se armó.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = defaultdict(dict)   # token -> {id_producto: peso}
+        self._docs = {}                      # id_producto -> {token: peso}
+        self._vocabulario = []               # tokens ordenados (búsqueda por prefijo)
+        self.version = None                  # versión del catálogo ya indexada
+
+    def __len__(self):
+        return len(self._docs)
+
+    @staticmethod
+    def _pesos(producto):
+        pesos = defaultdict(float)
+        for campo, peso in PESOS_CAMPOS.items():
+            for token in tokenizar(getattr(producto, campo, None)):
+                pesos[token] += peso
+        return pesos
+
+    def _quitar(self, id_producto):
+        for token in self._docs.pop(id_producto, {}):
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(id_producto, None)
+            if not posting:
+                del self._postings[token]
+                i = bisect.bisect_left(self._vocabulario, token)
+                if i < len(self._vocabulario) and self._vocabulario[i] == token:
+                    del self._vocabulario[i]
+
+    def _agregar(self, id_producto, pesos, nuevos=None):
+        self._docs[id_producto] = dict(pesos)
+        for token, peso in pesos.items():
+            if token not in self._postings:
+                # En lote, los tokens nuevos se ordenan una sola vez al final
+                if nuevos is None:
+                    bisect.insort(self._vocabulario, token)
+                else:
+                    nuevos.append(token)
+            self._postings[token][id_producto] = peso
+
+    # -----------------------
+    # Mantenimiento
+    # -----------------------
+    def reconstruir(self, productos, version=None):
+        pesos = [(p.id_producto, self._pesos(p)) for p in productos]
+        with self._lock:
+            self._postings = defaultdict(dict)
+            self._docs = {}
+            self._vocabulario = []
+            for id_producto, p in pesos:
+                self._agregar(id_producto, p)
+            self.version = version
+
+    def actualizar(self, producto):
+        pesos = self._pesos(producto)
+        with self._lock:
+            self._quitar(producto.id_producto)
+            self._agregar(producto.id_producto, pesos)
+
+    def actualizar_varios(self, productos):
+        """Como `actualizar` para muchos productos (importación masiva)."""
+        pesos = [(p.id_producto, self._pesos(p)) for p in productos]
+        with self._lock:
+            nuevos = []
+            for id_producto, p in pesos:
+                self._quitar(id_producto)
+                self._agregar(id_producto, p, nuevos)
+            if nuevos:
+                self._vocabulario = sorted(set(self._vocabulario).union(nuevos))
+
+    def eliminar(self, id_producto):
+        with self._lock:
+            self._quitar(id_producto)
+
+    # -----------------------
+    # Consulta
+    # -----------------------
+    def _expandir(self, token, prefijo):
+        """Tokens del vocabulario que casan con `token` (exacto o por prefijo)."""
+        if not prefijo:
+            return [token] if token in self._postings else []
+        i = bisect.bisect_left(self._vocabulario, token)
+        encontrados = []
+        while i < len(self._vocabulario) and self._vocabulario[i].startswith(token):
+            encontrados.append(self._vocabulario[i])
+            i += 1
+        return encontrados
+
+    def buscar(self, consulta, limite=50):
+        """Devuelve los ids de producto ordenados por relevancia.
+
+        Todos los términos deben aparecer; el último se trata como prefijo
+        para que funcione mientras el usuario escribe.
+        """
+        tokens = tokenizar(consulta)
+        if not tokens:
+            return []
+        with self._lock:
+            total_docs = len(self._docs) or 1
+            terminos = []
+            for n, token in enumerate(tokens):
+                expansion = self._expandir(token, prefijo=(n == len(tokens) - 1))
+                if not expansion:
+                    return []
+                postings = [self._postings[t] for t in expansion]
+                terminos.append((sum(len(p) for p in postings), postings))
+
+            # Se empieza por el término más raro: el conjunto de candidatos
+            # sólo puede encogerse con cada intersección.
+            terminos.sort(key=lambda par: par[0])
+            puntajes = None
+            for _, postings in terminos:
+                idfs = [math.log(1 + total_docs / len(p)) for p in postings]
+                if puntajes is None:
+                    puntajes = defaultdict(float)
+                    for posting, idf in zip(postings, idfs):
+                        for id_producto, peso in posting.items():
+                            puntajes[id_producto] = max(puntajes[id_producto], peso * idf)
+                    continue
+                siguiente = {}
+                for id_producto, acumulado in puntajes.items():
+                    mejor = 0.0
+                    for posting, idf in zip(postings, idfs):
+                        peso = posting.get(id_producto)
+                        if peso is not None:
+                            mejor = max(mejor, peso * idf)
+                    if mejor:
+                        siguiente[id_producto] = acumulado + mejor
+                puntajes = siguiente
+                if not puntajes:
+                    return []
+        mejores = heapq.nlargest(limite, puntajes.items(), key=lambda par: (par[1], -par[0]))
+        return [id_producto for id_producto, _ in mejores]
+
+
+indice_productos = IndiceProductos()
+
+
+def version_catalogo():
+    return db.session.execute(
+        db.select(VersionDatos.valor).where(VersionDatos.nombre == VERSION_CATALOGO)
+    ).scalar() or 0
+
+
+def marcar_cambio_catalogo():
+    """Sube la versión del catálogo dentro de la transacción en curso (sin commit).
+
+    Se llama antes del commit que crea, edita o borra productos, para que los
+    demás procesos vean el cambio en su próxima búsqueda.
+    """
+    tv = VersionDatos.__table__
+    db.session.execute(
+        tv.update().where(tv.c.nombre == VERSION_CATALOGO).values(valor=tv.c.valor + 1)
+    )
+
+
+def refrescar_indice():
+    """Reconstruye el índice si el catálogo cambió desde que se armó.
+
+    Cuesta una lectura por clave primaria; la versión se lee antes que los
+    productos para que un cambio simultáneo provoque otra reconstrucción.
+    """
+    version = version_catalogo()
+    if version != indice_productos.version:
+        indice_productos.reconstruir(Producto.query.all(), version)
+
+
+def _crear_version():
+    if db.session.get(VersionDatos, VERSION_CATALOGO) is not None:
+        return
+    db.session.add(VersionDatos(nombre=VERSION_CATALOGO, valor=0))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Otro proceso la creó al mismo tiempo
+        db.session.rollback()
+
+
+def init_app(app):
+    """Construye el índice de búsqueda con los productos actuales."""
+    with app.app_context():
+        try:
+            _crear_version()
+            refrescar_indice()
+        except Exception as e:
+            app.logger.error("No se pudo construir el índice de búsqueda: %s", e)
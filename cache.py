@@ -0,0 +1,175 @@
+# cache.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+from flask import request, session, make_response, Response
+from flask_login import current_user
+
+
+class EntradaCache:
+    """Respuesta renderizada guardada en la caché."""
+
+    def __init__(self, cuerpo, mimetype, etag, ultima_modificacion):
+        self.cuerpo = cuerpo
+        self.mimetype = mimetype
+        self.etag = etag
+        self.ultima_modificacion = ultima_modificacion
+
+
+class BackendCache:
+    """Interfaz mínima de un almacén de caché.
+
+    El backend local vive en la memoria del proceso; otro backend (Redis,
+    memcached...) sólo tiene que implementar estos cuatro métodos.
+    """
+
+    def get(self, clave):
+        raise NotImplementedError
+
+    def set(self, clave, valor, tags=()):
+        raise NotImplementedError
+
+    def invalidar_tag(self, tag):
+        raise NotImplementedError
+
+    def limpiar(self):
+        raise NotImplementedError
+
+
+class BackendLocal(BackendCache):
+    """LRU acotado por número de entradas, con expiración por TTL."""
+
+    def __init__(self, max_entradas=512, ttl=300):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()   # clave -> (expira, valor, tags)
+        self._por_tag = {}               # tag -> set(claves)
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def _quitar(self, clave):
+        _, _, tags = self._entradas.pop(clave)
+        for tag in tags:
+            claves = self._por_tag.get(tag)
+            if claves is not None:
+                claves.discard(clave)
+                if not claves:
+                    del self._por_tag[tag]
+
+    def get(self, clave):
+        with self._lock:
+            item = self._entradas.get(clave)
+            if item is None:
+                return None
+            if self.ttl and item[0] < time.monotonic():
+                self._quitar(clave)
+                return None
+            self._entradas.move_to_end(clave)
+            return item[1]
+
+    def set(self, clave, valor, tags=()):
+        tags = tuple(tags)
+        with self._lock:
+            if clave in self._entradas:
+                self._quitar(clave)
+            self._entradas[clave] = (time.monotonic() + self.ttl, valor, tags)
+            for tag in tags:
+                self._por_tag.setdefault(tag, set()).add(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._quitar(next(iter(self._entradas)))
+
+    def invalidar_tag(self, tag):
+        with self._lock:
+            for clave in list(self._por_tag.get(tag, ())):
+                self._quitar(clave)
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._por_tag.clear()
+
+
+class CachePaginas:
+    """Caché de páginas renderizadas con invalidación por tags."""
+
+    def __init__(self, backend=None):
+        self.backend = backend or BackendLocal()
+
+    def init_app(self, app):
+        self.backend = BackendLocal(
+            max_entradas=app.config.get('CACHE_PAGINAS_MAX', 512),
+            ttl=app.config.get('CACHE_PAGINAS_TTL', 300),
+        )
+
+    def invalidar_producto(self, id_producto):
+        self.backend.invalidar_tag(f'producto:{id_producto}')
+
+    def invalidar_catalogo(self):
+        self.backend.invalidar_tag('catalogo')
+
+
+cache_paginas = CachePaginas()
+
+
+# -----------------------
+# Decorador para vistas
+# -----------------------
+def _es_cacheable():
+    # Sólo páginas idénticas para cualquier visitante: sin sesión de usuario,
+    # sin mensajes flash pendientes y sin carrito asociado.
+    if request.method != 'GET' or current_user.is_authenticated:
+        return False
+    return '_flashes' not in session and not session.get('cart_id')
+
+def _clave():
+    args = '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+    return f'{request.path}?{args}'
+
+def _respuesta_condicional(resp, ultima_modificacion=None):
+    if ultima_modificacion is not None:
+        resp.last_modified = ultima_modificacion
+    resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
+
+
+def cache_pagina(tags):
+    """Cachea la respuesta de la vista y responde 304 a peticiones condicionales.
+
+    `tags` recibe los argumentos de la vista y devuelve los tags con los que se
+    invalidará la entrada (p. ej. ``producto:7``).
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not _es_cacheable():
+                resp = make_response(f(*args, **kwargs))
+                if resp.status_code == 200 and not resp.is_streamed:
+                    resp.add_etag()
+                    resp = _respuesta_condicional(resp)
+                return resp
+
+            clave = _clave()
+            entrada = cache_paginas.backend.get(clave)
+            if entrada is None:
+                resp = make_response(f(*args, **kwargs))
+                if resp.status_code != 200 or resp.is_streamed:
+                    return resp
+                cuerpo = resp.get_data()
+                entrada = EntradaCache(
+                    cuerpo=cuerpo,
+                    mimetype=resp.mimetype,
+                    etag=hashlib.sha1(cuerpo).hexdigest(),
+                    ultima_modificacion=datetime.now(timezone.utc).replace(microsecond=0),
+                )
+                cache_paginas.backend.set(clave, entrada, tags(**kwargs))
+
+            resp = Response(entrada.cuerpo, mimetype=entrada.mimetype)
+            resp.set_etag(entrada.etag)
+            return _respuesta_condicional(resp, entrada.ultima_modificacion)
+        return decorated_function
+    return decorator
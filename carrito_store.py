@@ -0,0 +1,327 @@
+# carrito_store.py
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from flask import current_app, session
+from flask_login import current_user
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import CarritoLinea
+
+
+class ErrorCarrito(Exception):
+    """El almacén no pudo guardar el cambio en el carrito."""
+
+
+def _linea(id_producto, id_variante, talla, cantidad, precio, nombre):
+    return {
+        'id': id_producto,
+        'id_variante': id_variante,
+        'talla': talla,
+        'cantidad': int(cantidad),
+        'precio': float(precio or 0),
+        'nombre': nombre,
+    }
+
+
+class CartStore:
+    """Interfaz del almacén de carritos, compartido entre procesos.
+
+    Un carrito es un conjunto de líneas identificadas por `clave`
+    ("<id_producto>:<talla>"). Todas las operaciones sobre una línea son una
+    única sentencia en el almacén, de modo que dos peticiones simultáneas del
+    mismo usuario no pierden cantidades.
+
+    Un carrito expira completo: cuando ninguna de sus líneas se tocó en `ttl`
+    segundos. `obtener`, `contar` y `purgar_expirados` aplican esa misma regla,
+    y toda escritura sobre una línea renueva su `actualizado_en`.
+    """
+
+    def __init__(self, ttl=30 * 24 * 3600):
+        self.ttl = ttl
+
+    def obtener(self, carrito_id):
+        """{clave: línea} del carrito (vacío si no existe o expiró)."""
+        raise NotImplementedError
+
+    def agregar(self, carrito_id, clave, linea, cantidad=1):
+        """Suma `cantidad` a la línea, creándola con los datos de `linea` si no existe.
+
+        Lanza ErrorCarrito si no se pudo guardar.
+        """
+        raise NotImplementedError
+
+    def cambiar_cantidad(self, carrito_id, clave, delta):
+        """Suma `delta` (puede ser negativo) sin bajar de 1. False si la línea no existe."""
+        raise NotImplementedError
+
+    def fijar_cantidad(self, carrito_id, clave, cantidad):
+        raise NotImplementedError
+
+    def actualizar_precio(self, carrito_id, clave, precio):
+        """Guarda el precio vigente de la línea (tras mostrárselo al cliente)."""
+        raise NotImplementedError
+
+    def quitar(self, carrito_id, clave):
+        raise NotImplementedError
+
+    def vaciar(self, carrito_id):
+        raise NotImplementedError
+
+    def contar(self, carrito_id):
+        """Número de líneas del carrito (0 si expiró, igual que `obtener`)."""
+        raise NotImplementedError
+
+    def purgar_expirados(self):
+        """Elimina los carritos sin actividad durante más de `ttl` segundos."""
+        raise NotImplementedError
+
+
+class SQLiteCartStore(CartStore):
+    """Backend local sobre sqlite3 (archivo o ``:memory:``), pensado para pruebas
+    y despliegues de un solo servidor."""
+
+    def __init__(self, ruta=':memory:', ttl=30 * 24 * 3600):
+        super().__init__(ttl)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS carrito_lineas (
+                carrito_id TEXT NOT NULL,
+                clave TEXT NOT NULL,
+                id_producto INTEGER NOT NULL,
+                id_variante INTEGER,
+                talla TEXT,
+                cantidad INTEGER NOT NULL,
+                precio TEXT,
+                nombre TEXT,
+                actualizado_en REAL NOT NULL,
+                PRIMARY KEY (carrito_id, clave)
+            )""")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_carrito_lineas_actualizado ON carrito_lineas (actualizado_en)")
+
+    # La conexión es compartida: el cursor se consume dentro del lock y sólo
+    # se devuelven datos (filas afectadas o el valor leído)
+    def _ejecutar(self, sql, params=()):
+        """Ejecuta una escritura y devuelve el número de filas afectadas."""
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+    def _valor(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()[0]
+
+    def _limite(self):
+        return time.time() - self.ttl
+
+    def obtener(self, carrito_id):
+        with self._lock:
+            filas = self._conn.execute(
+                "SELECT clave, id_producto, id_variante, talla, cantidad, precio, nombre, actualizado_en "
+                "FROM carrito_lineas WHERE carrito_id = ?", (carrito_id,)).fetchall()
+        if filas and max(f[7] for f in filas) < self._limite():
+            self.vaciar(carrito_id)
+            return {}
+        return {f[0]: _linea(f[1], f[2], f[3], f[4], Decimal(f[5] or 0), f[6]) for f in filas}
+
+    def agregar(self, carrito_id, clave, linea, cantidad=1):
+        self._ejecutar(
+            "INSERT INTO carrito_lineas (carrito_id, clave, id_producto, id_variante, talla, cantidad, precio, nombre, actualizado_en) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (carrito_id, clave) DO UPDATE SET cantidad = cantidad + excluded.cantidad, "
+            "actualizado_en = excluded.actualizado_en",
+            (carrito_id, clave, linea['id'], linea.get('id_variante'), linea.get('talla'), cantidad,
+             str(linea.get('precio', 0)), linea.get('nombre'), time.time()))
+
+    def cambiar_cantidad(self, carrito_id, clave, delta):
+        afectadas = self._ejecutar(
+            "UPDATE carrito_lineas SET cantidad = MAX(1, cantidad + ?), actualizado_en = ? "
+            "WHERE carrito_id = ? AND clave = ?", (delta, time.time(), carrito_id, clave))
+        return afectadas == 1
+
+    def fijar_cantidad(self, carrito_id, clave, cantidad):
+        afectadas = self._ejecutar(
+            "UPDATE carrito_lineas SET cantidad = ?, actualizado_en = ? WHERE carrito_id = ? AND clave = ?",
+            (max(1, int(cantidad)), time.time(), carrito_id, clave))
+        return afectadas == 1
+
+    def actualizar_precio(self, carrito_id, clave, precio):
+        afectadas = self._ejecutar(
+            "UPDATE carrito_lineas SET precio = ?, actualizado_en = ? WHERE carrito_id = ? AND clave = ?",
+            (str(precio), time.time(), carrito_id, clave))
+        return afectadas == 1
+
+    def quitar(self, carrito_id, clave):
+        afectadas = self._ejecutar("DELETE FROM carrito_lineas WHERE carrito_id = ? AND clave = ?", (carrito_id, clave))
+        return afectadas == 1
+
+    def vaciar(self, carrito_id):
+        self._ejecutar("DELETE FROM carrito_lineas WHERE carrito_id = ?", (carrito_id,))
+
+    def contar(self, carrito_id):
+        return self._valor(
+            "SELECT CASE WHEN MAX(actualizado_en) >= ? THEN COUNT(*) ELSE 0 END "
+            "FROM carrito_lineas WHERE carrito_id = ?",
+            (self._limite(), carrito_id))
+
+    def purgar_expirados(self):
+        # Un carrito expira completo: se borran los que no tienen ninguna línea reciente
+        afectadas = self._ejecutar(
+            "DELETE FROM carrito_lineas WHERE carrito_id IN ("
+            " SELECT carrito_id FROM carrito_lineas GROUP BY carrito_id HAVING MAX(actualizado_en) < ?)",
+            (self._limite(),))
+        return afectadas
+
+
+class DBCartStore(CartStore):
+    """Backend de producción: tabla `carrito_lineas` en la base de la aplicación.
+
+    Cada operación se confirma por separado, así que no debe llamarse en medio
+    de otra transacción que aún no se quiera confirmar.
+    """
+
+    def _limite(self):
+        return datetime.utcnow() - timedelta(seconds=self.ttl)
+
+    def _filtro(self, carrito_id, clave=None):
+        conds = [CarritoLinea.carrito_id == carrito_id]
+        if clave is not None:
+            conds.append(CarritoLinea.clave == clave)
+        return conds
+
+    def _actualizar(self, carrito_id, clave, valores):
+        tabla = CarritoLinea.__table__
+        valores['actualizado_en'] = datetime.utcnow()
+        resultado = db.session.execute(tabla.update().where(*self._filtro(carrito_id, clave)).values(valores))
+        db.session.commit()
+        return resultado.rowcount == 1
+
+    def obtener(self, carrito_id):
+        filas = CarritoLinea.query.filter(*self._filtro(carrito_id)).all()
+        if filas and max(f.actualizado_en for f in filas) < self._limite():
+            self.vaciar(carrito_id)
+            return {}
+        return {f.clave: _linea(f.id_producto, f.id_variante, f.talla, f.cantidad, f.precio, f.nombre)
+                for f in filas}
+
+    def agregar(self, carrito_id, clave, linea, cantidad=1):
+        tabla = CarritoLinea.__table__
+        # UPDATE atómico; si la línea no existe se inserta (y si otra petición
+        # la insertó primero, se reintenta el UPDATE)
+        error = None
+        for _ in range(2):
+            if self._actualizar(carrito_id, clave, {'cantidad': tabla.c.cantidad + cantidad}):
+                return
+            db.session.add(CarritoLinea(
+                carrito_id=carrito_id, clave=clave,
+                id_producto=linea['id'], id_variante=linea.get('id_variante'),
+                talla=linea.get('talla'), cantidad=cantidad,
+                precio=linea.get('precio', 0), nombre=linea.get('nombre'),
+                actualizado_en=datetime.utcnow(),
+            ))
+            try:
+                db.session.commit()
+                return
+            except IntegrityError as e:
+                db.session.rollback()
+                error = e
+        raise ErrorCarrito(f'No se pudo agregar {clave} al carrito') from error
+
+    def cambiar_cantidad(self, carrito_id, clave, delta):
+        tabla = CarritoLinea.__table__
+        nueva = db.case((tabla.c.cantidad + delta < 1, 1), else_=tabla.c.cantidad + delta)
+        return self._actualizar(carrito_id, clave, {'cantidad': nueva})
+
+    def fijar_cantidad(self, carrito_id, clave, cantidad):
+        return self._actualizar(carrito_id, clave, {'cantidad': max(1, int(cantidad))})
+
+    def actualizar_precio(self, carrito_id, clave, precio):
+        return self._actualizar(carrito_id, clave, {'precio': precio})
+
+    def quitar(self, carrito_id, clave):
+        resultado = db.session.execute(
+            CarritoLinea.__table__.delete().where(*self._filtro(carrito_id, clave)))
+        db.session.commit()
+        return resultado.rowcount == 1
+
+    def vaciar(self, carrito_id):
+        db.session.execute(CarritoLinea.__table__.delete().where(*self._filtro(carrito_id)))
+        db.session.commit()
+
+    def contar(self, carrito_id):
+        vigente = db.func.max(CarritoLinea.actualizado_en) >= self._limite()
+        return db.session.query(
+            db.case((vigente, db.func.count()), else_=0)
+        ).filter(*self._filtro(carrito_id)).scalar()
+
+    def purgar_expirados(self):
+        tabla = CarritoLinea.__table__
+        inactivos = (db.select(tabla.c.carrito_id)
+                     .group_by(tabla.c.carrito_id)
+                     .having(db.func.max(tabla.c.actualizado_en) < self._limite()))
+        resultado = db.session.execute(tabla.delete().where(tabla.c.carrito_id.in_(inactivos)))
+        db.session.commit()
+        return resultado.rowcount
+
+
+class Carritos:
+    """Punto de acceso al almacén configurado (CARRITO_BACKEND)."""
+
+    def __init__(self):
+        self.store = None
+
+    def init_app(self, app):
+        backend = app.config.get('CARRITO_BACKEND', 'db')
+        ttl = app.config.get('CARRITO_TTL', 30 * 24 * 3600)
+        if backend.startswith('sqlite:'):
+            # 'sqlite::memory:' o 'sqlite:/ruta/carritos.db'
+            self.store = SQLiteCartStore(backend[len('sqlite:'):] or ':memory:', ttl=ttl)
+        else:
+            self.store = DBCartStore(ttl=ttl)
+        app.add_template_global(lineas_en_carrito, 'lineas_en_carrito')
+
+    def __getattr__(self, nombre):
+        return getattr(self.store, nombre)
+
+
+carritos = Carritos()
+
+
+# -----------------------
+# Carrito de la sesión actual
+# -----------------------
+def carrito_actual():
+    """Id del carrito del usuario autenticado (None si no hay sesión)."""
+    cid = session.get('cart_id')
+    if cid is None and current_user.is_authenticated:
+        cid = session['cart_id'] = str(current_user.get_id())
+    return cid
+
+
+def abrir_carrito(usuario):
+    """Asocia la sesión al carrito del usuario al iniciar sesión.
+
+    Si la cookie aún trae un carrito del formato anterior (líneas completas
+    en la sesión) se vuelca al almacén y se elimina de la cookie.
+    """
+    cid = str(usuario.id_usuario)
+    session['cart_id'] = cid
+    anterior = session.pop('cart', None)
+    if isinstance(anterior, dict):
+        for clave, linea in anterior.items():
+            if isinstance(linea, dict) and 'id' in linea:
+                try:
+                    carritos.agregar(cid, clave, linea, int(linea.get('cantidad', 1)))
+                except ErrorCarrito:
+                    # No se impide el login por una línea heredada de la cookie
+                    current_app.logger.warning("Línea %s del carrito anterior no migrada", clave)
+    return cid
+
+
+def lineas_en_carrito():
+    """Número de líneas del carrito actual, para el contador de la barra."""
+    cid = carrito_actual()
+    return carritos.contar(cid) if cid else 0
@@ -0,0 +1,402 @@
+# catalogo_masivo.py
+import csv
+import io
+import json
+import os
+import time
+import uuid
+from decimal import Decimal, InvalidOperation
+from flask import current_app
+from sqlalchemy.exc import DBAPIError
+from werkzeug.utils import secure_filename
+from extensions import db
+from models import Producto, VarianteProducto
+from busqueda import indice_productos, marcar_cambio_catalogo
+from cache import cache_paginas
+from imagenes import olvidar_foto
+from inventario import sincronizar_stock_productos
+
+LOTE = 1000
+MAX_ERRORES_PANTALLA = 50
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+}
+COLUMNAS = [
+    'id_producto', 'nombre', 'descripcion', 'categoria', 'talla', 'color',
+    'precio_producto', 'disponibilidad', 'stock', 'foto_producto',
+]
+LARGOS = {'nombre': 150, 'descripcion': 255, 'categoria': 100, 'talla': 20, 'color': 25, 'foto_producto': 255}
+# Valores de un producto nuevo para las columnas que no vienen en el archivo
+POR_DEFECTO = {'descripcion': '', 'categoria': '', 'talla': None, 'color': None,
+               'precio_producto': Decimal('0.00'), 'disponibilidad': 'SI', 'stock': 0, 'foto_producto': None}
+CAMPOS_BUSQUEDA = ('nombre', 'categoria', 'color', 'talla', 'descripcion')
+
+
+class ErrorFila(ValueError):
+    """Una fila del archivo no es válida; el mensaje va al reporte."""
+
+
+# -----------------------
+# Lectura del archivo
+# -----------------------
+def _filas_csv(archivo):
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    for numero, fila in enumerate(csv.DictReader(texto), start=2):  # la 1 es la cabecera
+        # Celda vacía = "no cambiar" en las actualizaciones
+        yield numero, {k.strip(): v for k, v in fila.items() if k and v not in (None, '')}
+
+
+def _filas_jsonl(archivo):
+    for numero, linea in enumerate(io.TextIOWrapper(archivo, encoding='utf-8-sig'), start=1):
+        if not linea.strip():
+            continue
+        try:
+            datos = json.loads(linea)
+        except ValueError as e:
+            yield numero, ErrorFila(f'JSON inválido: {e}')
+            continue
+        if not isinstance(datos, dict):
+            yield numero, ErrorFila('Cada línea debe ser un objeto JSON')
+            continue
+        yield numero, {k: v for k, v in datos.items() if v is not None}
+
+
+LECTORES = {
+    'csv': _filas_csv,
+    'jsonl': _filas_jsonl,
+}
+
+
+# -----------------------
+# Validación
+# -----------------------
+def _validar_foto(nombre):
+    """La foto es un archivo ya subido a static/img (el formulario guarda sólo el nombre)."""
+    if secure_filename(nombre) != nombre:
+        raise ErrorFila(f'Nombre de foto no permitido: {nombre!r}')
+    if not os.path.isfile(os.path.join(current_app.static_folder, 'img', nombre)):
+        raise ErrorFila(f'La foto {nombre} no existe en static/img')
+
+
+def validar_fila(datos):
+    """Valores limpios de la fila: sólo las columnas conocidas que trae.
+
+    Lanza ErrorFila con el primer problema encontrado.
+    """
+    valores = {}
+    for columna, valor in datos.items():
+        if columna not in COLUMNAS:
+            continue
+        if columna == 'id_producto':
+            try:
+                valores[columna] = int(valor)
+            except (TypeError, ValueError):
+                raise ErrorFila(f'id_producto no es un número: {valor!r}')
+        elif columna == 'precio_producto':
+            try:
+                precio = Decimal(str(valor).strip().replace(',', '.')).quantize(Decimal('0.01'))
+            except (InvalidOperation, ValueError):
+                raise ErrorFila(f'Precio inválido: {valor!r}')
+            if precio < 0 or precio >= Decimal('100000000'):
+                raise ErrorFila(f'Precio fuera de rango: {valor}')
+            valores[columna] = precio
+        elif columna == 'stock':
+            try:
+                stock = int(str(valor).strip())
+            except ValueError:
+                raise ErrorFila(f'Stock inválido: {valor!r}')
+            if stock < 0:
+                raise ErrorFila('El stock no puede ser negativo')
+            valores[columna] = stock
+        elif columna == 'disponibilidad':
+            disponibilidad = str(valor).strip().upper()
+            if disponibilidad not in ('SI', 'NO'):
+                raise ErrorFila(f'Disponibilidad debe ser SI o NO: {valor!r}')
+            valores[columna] = disponibilidad
+        else:
+            texto = str(valor).strip()
+            if len(texto) > LARGOS[columna]:
+                raise ErrorFila(f'{columna} supera {LARGOS[columna]} caracteres')
+            if columna == 'foto_producto' and texto:
+                _validar_foto(texto)
+            # descripcion y categoria son NOT NULL: vacío se guarda como ''
+            valores[columna] = texto if columna in ('descripcion', 'categoria') else (texto or None)
+
+    if 'id_producto' not in valores and not valores.get('nombre'):
+        raise ErrorFila('Falta el nombre del producto')
+    if 'nombre' in valores and not valores['nombre']:
+        raise ErrorFila('El nombre no puede quedar vacío')
+    return valores
+
+
+# -----------------------
+# Escritura por lotes
+# -----------------------
+class ResultadoImportacion:
+    """Contadores de la importación y reporte de errores en orden de fila.
+
+    Los errores de un lote se conocen en distinto momento (al leer la fila o
+    al escribir el lote); se acumulan y se vuelcan ordenados tras cada lote.
+    """
+
+    def __init__(self, reporte):
+        self.creados = 0
+        self.actualizados = 0
+        self.errores = 0
+        self.primeros_errores = []
+        self.reporte = reporte
+        self.segundos = 0.0
+        self._escritor = None
+        self._pendientes = []
+
+    @property
+    def filas(self):
+        return self.creados + self.actualizados + self.errores
+
+    def error(self, numero, mensaje):
+        self.errores += 1
+        self._pendientes.append((numero, mensaje))
+
+    def volcar(self):
+        """Escribe los errores acumulados; todos son de filas anteriores a las que faltan."""
+        if not self._pendientes:
+            return
+        self._pendientes.sort(key=lambda e: e[0])
+        faltan = MAX_ERRORES_PANTALLA - len(self.primeros_errores)
+        self.primeros_errores.extend(self._pendientes[:max(faltan, 0)])
+        if self._escritor is None:
+            self._archivo = open(self.reporte, 'w', encoding='utf-8', newline='')
+            self._escritor = csv.writer(self._archivo)
+            self._escritor.writerow(['fila', 'error'])
+        self._escritor.writerows(self._pendientes)
+        self._pendientes = []
+
+    def cerrar(self):
+        self.volcar()
+        if self._escritor is not None:
+            self._archivo.close()
+        else:
+            self.reporte = None
+
+
+def _insertar(nuevos):
+    """INSERT de varios productos con su variante inicial (como el formulario).
+
+    Devuelve los ids creados, en el orden de `nuevos`.
+    """
+    tp, tv = Producto.__table__, VarianteProducto.__table__
+    filas = [{**POR_DEFECTO, **v} for _, v in nuevos]
+    if db.engine.dialect.insert_executemany_returning_sort_by_parameter_order:
+        # Un solo executemany con RETURNING (SQLite, PostgreSQL, MariaDB)
+        ids = db.session.execute(
+            tp.insert().returning(tp.c.id_producto, sort_by_parameter_order=True), filas
+        ).scalars().all()
+    else:
+        # MySQL no tiene RETURNING y los autoincrementos de un INSERT múltiple
+        # no son necesariamente consecutivos: una fila por sentencia
+        ids = [db.session.execute(tp.insert().values(f)).inserted_primary_key[0] for f in filas]
+    variantes = [{'id_producto': id_producto, 'talla': f['talla'], 'color': f['color'],
+                  'stock': f['stock'], 'disponibilidad': f['disponibilidad']}
+                 for id_producto, f in zip(ids, filas) if f['talla']]
+    if variantes:
+        db.session.execute(tv.insert(), variantes)
+    return ids
+
+
+def _actualizar(existentes):
+    """UPDATE por id, un executemany por cada combinación de columnas presentes."""
+    tp = Producto.__table__
+    por_columnas = {}
+    for _, valores in existentes:
+        columnas = tuple(sorted(c for c in valores if c != 'id_producto'))
+        if columnas:
+            por_columnas.setdefault(columnas, []).append(valores)
+    for columnas, filas in por_columnas.items():
+        db.session.execute(
+            tp.update()
+            .where(tp.c.id_producto == db.bindparam('p_id'))
+            .values({c: db.bindparam(f'p_{c}') for c in columnas}),
+            [{'p_id': f['id_producto'], **{f'p_{c}': f[c] for c in columnas}} for f in filas],
+        )
+    # Con variantes, el stock del producto es la suma del de sus tallas
+    # (_aplicar_lote ya rechazó las filas que intentaban cambiarlo)
+    sincronizar_stock_productos([v['id_producto'] for _, v in existentes])
+
+
+def _refrescar_indice(condicion):
+    tp = Producto.__table__
+    indice_productos.actualizar_varios(db.session.execute(
+        db.select(tp.c.id_producto, *[tp.c[c] for c in CAMPOS_BUSQUEDA]).where(condicion)
+    ).all())
+
+
+def _aplicar_lote(lote, resultado):
+    """Escribe un lote validado en una transacción.
+
+    Si la base rechaza el lote, se reintenta fila por fila para que sólo
+    las filas culpables vayan al reporte.
+    """
+    if not lote:
+        return
+    tp, tv = Producto.__table__, VarianteProducto.__table__
+    ids = {v['id_producto'] for _, v in lote if 'id_producto' in v}
+    # id -> stock de los productos con variantes (None si no tiene)
+    conocidos = dict(db.session.execute(
+        db.select(tp.c.id_producto,
+                  db.case((db.exists().where(tv.c.id_producto == tp.c.id_producto), tp.c.stock)))
+        .where(tp.c.id_producto.in_(ids))
+    ).all()) if ids else {}
+
+    nuevos, existentes = [], []
+    for numero, valores in lote:
+        if 'id_producto' not in valores:
+            nuevos.append((numero, valores))
+        elif valores['id_producto'] not in conocidos:
+            resultado.error(numero, f"No existe el producto {valores['id_producto']}")
+        elif ('stock' in valores and conocidos[valores['id_producto']] is not None
+              and valores['stock'] != conocidos[valores['id_producto']]):
+            # Su stock es la suma de las tallas: se cambia por variante, no aquí
+            resultado.error(numero, f"El producto {valores['id_producto']} tiene tallas: "
+                                    "su stock se cambia en cada talla desde el formulario")
+        else:
+            existentes.append((numero, valores))
+
+    try:
+        creados = _insertar(nuevos) if nuevos else []
+        if existentes:
+            _actualizar(existentes)
+        marcar_cambio_catalogo()
+        db.session.commit()
+    except DBAPIError as e:
+        db.session.rollback()
+        if len(lote) == 1:
+            resultado.error(lote[0][0], f'Rechazada por la base de datos: {e.orig}')
+            return
+        for fila in nuevos + existentes:
+            _aplicar_lote([fila], resultado)
+        return
+
+    resultado.creados += len(nuevos)
+    resultado.actualizados += len(existentes)
+    actualizados = [v['id_producto'] for _, v in existentes]
+    if creados or actualizados:
+        _refrescar_indice(tp.c.id_producto.in_(creados + actualizados))
+    # Un id recién creado pudo quedar memorizado como "sin foto"
+    for id_producto in creados:
+        olvidar_foto(id_producto)
+    for _, valores in existentes:
+        if 'foto_producto' in valores:
+            olvidar_foto(valores['id_producto'])
+
+
+def _carpeta_reportes():
+    ruta = os.path.join(current_app.instance_path, 'importaciones')
+    os.makedirs(ruta, exist_ok=True)
+    # Los reportes se guardan un día
+    limite = time.time() - 86400
+    for nombre in os.listdir(ruta):
+        archivo = os.path.join(ruta, nombre)
+        if os.path.getmtime(archivo) < limite:
+            try:
+                os.remove(archivo)
+            except OSError:
+                pass
+    return ruta
+
+
+def ruta_reporte(nombre):
+    """Ruta del reporte de errores si el nombre es uno de los generados, si no None."""
+    try:
+        uuid.UUID(nombre.removesuffix('.csv'))
+    except ValueError:
+        return None
+    ruta = os.path.join(current_app.instance_path, 'importaciones', nombre)
+    return ruta if nombre.endswith('.csv') and os.path.exists(ruta) else None
+
+
+def importar_productos(archivo, formato, lote=LOTE):
+    """Importa productos desde un archivo CSV o JSONL leído en streaming.
+
+    Las filas sin id_producto se crean y las que lo traen actualizan sólo
+    las columnas presentes. Se escribe cada LOTE filas válidas con un
+    executemany, así que la memoria no depende del tamaño del archivo. Los
+    errores van, con su número de fila, a un CSV en instance/importaciones.
+    """
+    inicio = time.perf_counter()
+    resultado = ResultadoImportacion(os.path.join(_carpeta_reportes(), f'{uuid.uuid4()}.csv'))
+    pendientes = []
+    try:
+        for numero, datos in LECTORES[formato](archivo):
+            try:
+                if isinstance(datos, ErrorFila):
+                    raise datos
+                pendientes.append((numero, validar_fila(datos)))
+            except ErrorFila as e:
+                resultado.error(numero, str(e))
+            if len(pendientes) >= lote:
+                _aplicar_lote(pendientes, resultado)
+                resultado.volcar()
+                pendientes = []
+        _aplicar_lote(pendientes, resultado)
+    except (UnicodeDecodeError, csv.Error) as e:
+        resultado.error(0, f'No se pudo leer el archivo: {e}')
+    finally:
+        resultado.cerrar()
+        if resultado.creados or resultado.actualizados:
+            cache_paginas.invalidar_catalogo()
+    resultado.segundos = time.perf_counter() - inicio
+    return resultado
+
+
+# -----------------------
+# Exportación
+# -----------------------
+def lotes_productos(lote=LOTE):
+    """Listas de filas de productos recorriendo la tabla por id."""
+    tp = Producto.__table__
+    ultimo = 0
+    while True:
+        filas = db.session.execute(
+            db.select(*[tp.c[c] for c in COLUMNAS])
+            .where(tp.c.id_producto > ultimo)
+            .order_by(tp.c.id_producto)
+            .limit(lote)
+        ).all()
+        if not filas:
+            return
+        yield filas
+        ultimo = filas[-1].id_producto
+
+
+def _valor(valor):
+    return '' if valor is None else str(valor)
+
+
+def exportar_csv():
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    buffer.write('\ufeff')  # BOM: Excel abre el archivo como UTF-8
+    escritor.writerow(COLUMNAS)
+    for filas in lotes_productos():
+        escritor.writerows([_valor(v) for v in fila] for fila in filas)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def exportar_jsonl():
+    for filas in lotes_productos():
+        yield ''.join(
+            json.dumps({c: (str(v) if isinstance(v, Decimal) else v) for c, v in zip(COLUMNAS, fila)},
+                       ensure_ascii=False) + '\n'
+            for fila in filas
+        ).encode('utf-8')
+
+
+EXPORTADORES = {
+    'csv': exportar_csv,
+    'jsonl': exportar_jsonl,
+}
@@ -0,0 +1,174 @@
+# commands.py
+import click
+from flask import current_app
+from extensions import db
+
+
+def _agregar_columnas_faltantes():
+    """Añade a tablas existentes las columnas nuevas declaradas en los modelos.
+
+    `db.create_all()` sólo crea tablas que no existen; este paso cubre las
+    columnas opcionales que se van agregando a tablas ya en producción.
+    """
+    inspector = db.inspect(db.engine)
+    agregadas = []
+    for tabla in db.metadata.sorted_tables:
+        if not inspector.has_table(tabla.name):
+            continue
+        existentes = {c['name'] for c in inspector.get_columns(tabla.name)}
+        for columna in tabla.columns:
+            if columna.name in existentes or not columna.nullable:
+                continue
+            tipo = columna.type.compile(dialect=db.engine.dialect)
+            with db.engine.begin() as conn:
+                conn.execute(db.text(f'ALTER TABLE {tabla.name} ADD COLUMN {columna.name} {tipo}'))
+            agregadas.append(f'{tabla.name}.{columna.name}')
+    return agregadas
+
+
+def register_commands(app):
+    """Registra los comandos `flask ...` de mantenimiento."""
+
+    @app.cli.command('actualizar-esquema')
+    def actualizar_esquema():
+        """Crea tablas, columnas opcionales e índices que falten en la base."""
+        db.create_all()
+        for nombre in _agregar_columnas_faltantes():
+            click.echo(f"➕ Columna agregada: {nombre}")
+        creados = 0
+        for tabla in db.metadata.sorted_tables:
+            for indice in tabla.indexes:
+                indice.create(db.engine, checkfirst=True)
+                creados += 1
+        click.echo(f"✅ Esquema actualizado. Índices verificados: {creados}")
+        from permisos import hay_permisos
+        if not hay_permisos():
+            click.echo("⚠️  Ningún rol tiene permisos de administración: ejecuta `flask conceder-permisos`")
+
+    @app.cli.command('derivar-imagenes')
+    @click.option('--forzar', is_flag=True, help='Regenera también los productos que ya tienen derivados.')
+    def derivar_imagenes(forzar):
+        """Genera miniaturas WebP/JPEG para las fotos de productos existentes."""
+        from models import Producto
+        from imagenes import generar_derivados, derivados_vigentes
+
+        procesados = fallidos = 0
+        for producto in Producto.query.filter(Producto.foto_producto.isnot(None)).all():
+            if not forzar and derivados_vigentes(producto):
+                continue
+            meta = generar_derivados(current_app.static_folder, producto.foto_producto)
+            if meta is None:
+                fallidos += 1
+                click.echo(f"⚠️  {producto.id_producto}: no se pudo procesar {producto.foto_producto}")
+                continue
+            producto.foto_derivados = meta
+            procesados += 1
+        db.session.commit()
+        click.echo(f"✅ Derivados generados: {procesados} (fallidos: {fallidos})")
+
+    @app.cli.command('reconstruir-resumenes')
+    def reconstruir_resumenes_cmd():
+        """Recalcula los resúmenes de reseñas de todos los productos."""
+        from valoraciones import reconstruir_resumenes
+        total = reconstruir_resumenes()
+        click.echo(f"✅ Resúmenes de reseñas reconstruidos: {total}")
+
+    @app.cli.command('migrar-variantes')
+    def migrar_variantes_cmd():
+        """Crea la variante inicial (talla/color/stock) de los productos que no tienen."""
+        from inventario import migrar_variantes
+        creadas = migrar_variantes()
+        click.echo(f"✅ Variantes creadas: {creadas}")
+
+    @app.cli.command('migrar-pedidos')
+    def migrar_pedidos_cmd():
+        """Enlaza los pedidos antiguos con su factura, línea y producto."""
+        from pedidos import migrar_pedidos
+        enlazados, sin_pareja = migrar_pedidos()
+        click.echo(f"✅ Pedidos enlazados: {enlazados} (sin línea de factura: {sin_pareja})")
+
+    @app.cli.command('actualizar-ventas')
+    def actualizar_ventas_cmd():
+        """Suma a los agregados de ventas las facturas nuevas (para cron)."""
+        from ventas import actualizar_ventas
+        total = actualizar_ventas()
+        click.echo(f"✅ Facturas sumadas a los agregados: {total}")
+
+    @app.cli.command('reconstruir-ventas')
+    def reconstruir_ventas_cmd():
+        """Recalcula desde cero los agregados de ventas."""
+        from ventas import reconstruir_ventas
+        total = reconstruir_ventas()
+        click.echo(f"✅ Agregados de ventas reconstruidos con {total} facturas")
+
+    @app.cli.command('conceder-permisos')
+    @click.argument('id_rol', type=int, required=False)
+    def conceder_permisos_cmd(id_rol):
+        """Da todos los permisos a un rol (por defecto, al rol 'admin').
+
+        Se ejecuta una vez al instalar y sirve también si el admin se quitó
+        `roles.gestionar`.
+        """
+        from permisos import PERMISOS, ROL_INICIAL, guardar_permisos, id_rol_inicial
+        if id_rol is None:
+            id_rol = id_rol_inicial()
+            if id_rol is None:
+                raise click.ClickException(f"No existe el rol '{ROL_INICIAL}'; indica el id del rol")
+        guardar_permisos(id_rol, PERMISOS)
+        db.session.commit()
+        click.echo(f"✅ Rol {id_rol}: {len(PERMISOS)} permisos concedidos")
+
+    @app.cli.command('purgar-carritos')
+    def purgar_carritos_cmd():
+        """Elimina los carritos sin actividad durante más de CARRITO_TTL segundos."""
+        from carrito_store import carritos
+        eliminadas = carritos.purgar_expirados()
+        click.echo(f"✅ Líneas de carrito eliminadas: {eliminadas}")
+
+    @app.cli.command('tareas-worker')
+    @click.option('--procesos', default=1, show_default=True, help='Workers en paralelo.')
+    @click.option('--intervalo', default=2.0, show_default=True, help='Segundos de espera con la cola vacía.')
+    @click.option('--lote', default=10, show_default=True, help='Tareas tomadas por consulta.')
+    @click.option('--una-vez', is_flag=True, help='Procesa las tareas vencidas y termina.')
+    def tareas_worker(procesos, intervalo, lote, una_vez):
+        """Ejecuta las tareas en segundo plano de la tabla `tareas`."""
+        import multiprocessing
+        from tareas import tareas
+
+        app_real = current_app._get_current_object()
+
+        def _trabajar():
+            with app_real.app_context():
+                db.engine.dispose()  # conexiones propias en cada proceso
+                tareas.trabajar(intervalo=intervalo, lote=lote, una_vez=una_vez)
+
+        if procesos <= 1:
+            total = tareas.trabajar(intervalo=intervalo, lote=lote, una_vez=una_vez)
+            click.echo(f"✅ Tareas procesadas: {total}")
+            return
+
+        # fork: cada hijo hereda la app ya configurada
+        contexto = multiprocessing.get_context('fork')
+        hijos = [contexto.Process(target=_trabajar, daemon=True) for _ in range(procesos)]
+        for hijo in hijos:
+            hijo.start()
+        click.echo(f"▶️  {procesos} workers en marcha")
+        try:
+            for hijo in hijos:
+                hijo.join()
+        except KeyboardInterrupt:
+            for hijo in hijos:
+                hijo.terminate()
+
+    @app.cli.command('tareas-reintentar')
+    @click.option('--id', 'id_tarea', type=int, help='Sólo esta tarea.')
+    def tareas_reintentar(id_tarea):
+        """Devuelve a la cola las tareas fallidas (dead letter)."""
+        from datetime import datetime
+        from models import Tarea
+        consulta = Tarea.query.filter_by(estado='fallida')
+        if id_tarea:
+            consulta = consulta.filter_by(id=id_tarea)
+        total = consulta.update({'estado': 'pendiente', 'intentos': 0, 'disponible_en': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+        click.echo(f"✅ Tareas devueltas a la cola: {total}")
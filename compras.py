@@ -0,0 +1,79 @@
+# compras.py
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import Factura, FacturaItem
+from inventario import cantidades_por_producto, cantidades_por_variante, reservar_stock
+from pedidos import crear_pedidos_factura
+from tareas import tareas
+
+LARGO_CLAVE = 64
+
+
+def normalizar_clave(clave):
+    """Clave de idempotencia válida o None (se ignora si viene vacía o es demasiado larga)."""
+    clave = (clave or '').strip()
+    return clave if 0 < len(clave) <= LARGO_CLAVE else None
+
+
+def factura_por_clave(usuario_id, clave):
+    if not clave:
+        return None
+    return (db.session.query(Factura.id_factura)
+            .filter_by(id_usuario=str(usuario_id), clave_idempotencia=clave)
+            .scalar())
+
+
+def registrar_compra(usuario_id, direccion_envio, cart, resumen, clave=None):
+    """Registra la compra completa en una sola transacción y devuelve id_factura.
+
+    Reserva el stock, inserta la factura y todas sus líneas con un único
+    executemany, crea los pedidos a partir de esas líneas con un INSERT ...
+    SELECT y encola las tareas posteriores (correo, alertas, PDF). Si algo
+    falla no queda nada escrito.
+    Lanza StockInsuficiente si alguna línea no alcanza. Si otra petición con
+    la misma clave de idempotencia se confirmó antes, devuelve esa factura.
+    """
+    usuario_id = str(usuario_id)
+    cantidades = cantidades_por_producto(cart)
+    try:
+        reservar_stock(cantidades, cantidades_por_variante(cart))
+
+        resultado = db.session.execute(db.insert(Factura).values(
+            id_usuario=usuario_id,
+            direccion_envio=direccion_envio,
+            total=resumen.total,
+            estado='pagada',
+            clave_idempotencia=clave,
+        ))
+        id_factura = resultado.inserted_primary_key[0]
+
+        db.session.execute(db.insert(FacturaItem), [{
+            'id_factura': id_factura,
+            'id_producto': linea.id_producto,
+            'nombre_producto': linea.nombre,
+            'talla': linea.talla or '',
+            'cantidad': linea.cantidad,
+            'precio_unitario': linea.precio,
+            'subtotal': linea.subtotal,
+        } for linea in resumen])
+        crear_pedidos_factura(id_factura, direccion_envio)
+
+        # Trabajo posterior a la compra: se confirma con la misma transacción
+        # y lo ejecuta el worker, fuera de la petición
+        tareas.encolar('correo_confirmacion', {'id_factura': id_factura})
+        tareas.encolar('alerta_stock', {'productos': sorted(cantidades)})
+        if current_app.config.get('FACTURAS_PDF_PRECALENTAR', True):
+            tareas.encolar('factura_pdf', {'id_factura': id_factura})
+
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        existente = factura_por_clave(usuario_id, clave)
+        if existente is None:
+            raise
+        return existente
+    except Exception:
+        db.session.rollback()
+        raise
+    return id_factura
@@ -12,6 +12,56 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Caché de páginas del catálogo (entradas LRU y segundos de vida)
+    CACHE_PAGINAS_MAX = int(os.environ.get('CACHE_PAGINAS_MAX', 512))
+    CACHE_PAGINAS_TTL = int(os.environ.get('CACHE_PAGINAS_TTL', 300))
+
+    # Prefijo de la location interna de nginx para servir static/ con
+    # X-Accel-Redirect (vacío = la app envía el archivo con sendfile)
+    IMAGENES_X_ACCEL = os.environ.get('IMAGENES_X_ACCEL')
+
+    # Almacén de carritos: 'db' (tabla carrito_lineas, compartida entre
+    # workers) o 'sqlite:<ruta>' / 'sqlite::memory:' para pruebas locales
+    CARRITO_BACKEND = os.environ.get('CARRITO_BACKEND', 'db')
+    # Segundos sin actividad tras los que un carrito se descarta
+    CARRITO_TTL = int(os.environ.get('CARRITO_TTL', 30 * 24 * 3600))
+
+    # Cola de tareas en segundo plano: 'db' (tabla tareas) o 'memoria' (pruebas)
+    TAREAS_BACKEND = os.environ.get('TAREAS_BACKEND', 'db')
+    # Espera base y máxima (segundos) entre reintentos de una tarea fallida
+    TAREAS_BACKOFF_BASE = int(os.environ.get('TAREAS_BACKOFF_BASE', 10))
+    TAREAS_BACKOFF_MAX = int(os.environ.get('TAREAS_BACKOFF_MAX', 3600))
+    # Segundos tras los que una tarea en proceso se considera abandonada
+    TAREAS_TIEMPO_LIMITE = int(os.environ.get('TAREAS_TIEMPO_LIMITE', 600))
+
+    # PDFs de facturas ya generados (vacío = <instance>/facturas) y si se
+    # generan en segundo plano al confirmar la compra
+    FACTURAS_PDF_DIR = os.environ.get('FACTURAS_PDF_DIR')
+    FACTURAS_PDF_PRECALENTAR = os.environ.get('FACTURAS_PDF_PRECALENTAR', '1') == '1'
+    # Pool de procesos para generar PDFs (0 = en el propio worker web),
+    # PDFs generándose o en cola por worker, límite de segundos por PDF y
+    # Retry-After cuando la cola está llena
+    FACTURAS_PDF_PROCESOS = int(os.environ.get('FACTURAS_PDF_PROCESOS', 2))
+    FACTURAS_PDF_COLA_MAX = int(os.environ.get('FACTURAS_PDF_COLA_MAX', 8))
+    FACTURAS_PDF_TIMEOUT = int(os.environ.get('FACTURAS_PDF_TIMEOUT', 20))
+    FACTURAS_PDF_REINTENTAR = int(os.environ.get('FACTURAS_PDF_REINTENTAR', 5))
+
+    # Agregados de ventas: facturas por pasada y segundos recientes que se
+    # dejan para la siguiente (compras que aún pueden estar confirmándose)
+    VENTAS_LOTE = int(os.environ.get('VENTAS_LOTE', 1000))
+    VENTAS_MARGEN = int(os.environ.get('VENTAS_MARGEN', 120))
+
+    # Segundos que cada proceso guarda usuario + rol de las sesiones activas
+    IDENTIDAD_TTL = int(os.environ.get('IDENTIDAD_TTL', 60))
+
+    # Segundos tras los que cada proceso vuelve a leer los permisos por rol
+    # (el proceso que los edita los recompila al instante)
+    PERMISOS_TTL = int(os.environ.get('PERMISOS_TTL', 60))
+
+    # Alertas de inventario: umbral por talla y correo que las recibe
+    STOCK_MINIMO = int(os.environ.get('STOCK_MINIMO', 3))
+    ALERTAS_STOCK_CORREO = os.environ.get('ALERTAS_STOCK_CORREO')
+
     # Email (Gmail)
     MAIL_SERVER = 'smtp.gmail.com'
     MAIL_PORT = 587
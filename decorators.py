@@ -1,12 +1,18 @@
 from functools import wraps
-from flask import session, redirect, url_for, flash
+from flask import redirect, url_for, flash
+from flask_login import current_user
+from permisos import bit, registro_permisos
+
+def permiso_requerido(permiso):
+    """Restringe la vista a los roles con `permiso` (ver permisos.PERMISOS)."""
+    b = bit(permiso)  # un nombre mal escrito falla al importar la ruta
 
-def role_required(required_role):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            print("DEBUG session:", dict(session))
-            if 'role' not in session or int(session['role']) != int(required_role):
+            # Rol de la identidad ya cargada (identidad.py) contra la máscara compilada
+            id_rol = getattr(current_user, 'id_rol', None)
+            if id_rol is None or not registro_permisos.mascara(id_rol) & b:
                 flash("🚫 No tienes permisos para acceder a esta sección.", "danger")
                 return redirect(url_for('index'))
             return f(*args, **kwargs)
@@ -0,0 +1,260 @@
+# exportacion.py
+import csv
+import io
+import json
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import TimeoutError as TimeoutFuturo
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from flask import current_app
+from extensions import db
+from models import Factura, FacturaItem, Pedido, Usuario
+from facturas_pdf import version_pdf, html_factura, guardar_version, pool_pdf, metricas, PDFOcupado
+from pedidos import ESTADOS_PEDIDO
+
+LOTE = 200
+# Las facturas se guardan siempre pagadas: se filtra por el estado de sus pedidos
+ESTADOS = ESTADOS_PEDIDO
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+    'zip': 'application/zip',
+}
+COLUMNAS_CSV = [
+    'id_factura', 'fecha', 'id_usuario', 'cliente', 'estado', 'direccion_envio', 'total_factura',
+    'id_item', 'producto', 'talla', 'color', 'cantidad', 'precio_unitario', 'subtotal',
+]
+
+
+class FiltrosExportacion:
+    """Rango de fechas (ambos extremos incluidos) y estado de los pedidos de la factura."""
+
+    def __init__(self, desde=None, hasta=None, estado=None):
+        self.desde = desde
+        self.hasta = hasta
+        self.estado = estado if estado in ESTADOS else None
+
+    @classmethod
+    def desde_args(cls, args):
+        return cls(_fecha(args.get('desde')), _fecha(args.get('hasta')), args.get('estado'))
+
+    def condiciones(self):
+        tf = Factura.__table__
+        conds = []
+        if self.desde:
+            conds.append(tf.c.creado_en >= self.desde)
+        if self.hasta:
+            conds.append(tf.c.creado_en < self.hasta + timedelta(days=1))
+        if self.estado:
+            # Facturas con algún pedido en ese estado (por ix_pedido_factura)
+            tpe = Pedido.__table__
+            conds.append(db.exists().where(tpe.c.id_factura == tf.c.id_factura, tpe.c.estado == self.estado))
+        return conds
+
+    def nombre_archivo(self, formato):
+        partes = ['facturas']
+        if self.desde:
+            partes.append(self.desde.strftime('%Y%m%d'))
+        if self.hasta:
+            partes.append(self.hasta.strftime('%Y%m%d'))
+        if self.estado:
+            partes.append(self.estado)
+        return '_'.join(partes) + '.' + formato
+
+
+def _fecha(valor):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d') if valor else None
+    except ValueError:
+        return None
+
+
+# -----------------------
+# Lectura por lotes
+# -----------------------
+def lotes_facturas(filtros, lote=LOTE):
+    """Genera listas [(factura, [items])] recorriendo las facturas por id.
+
+    Cada lote cuesta dos consultas (facturas con el nombre del cliente y sus
+    líneas con IN) y se leen filas, no objetos ORM, así que la memoria no
+    crece con el tamaño de la exportación.
+    """
+    tf, ti, tu = Factura.__table__, FacturaItem.__table__, Usuario.__table__
+    ultimo = 0
+    while True:
+        facturas = db.session.execute(
+            db.select(tf, tu.c.nombre.label('nombre_cliente'))
+            .select_from(tf.outerjoin(tu, tu.c.id_usuario == tf.c.id_usuario))
+            .where(tf.c.id_factura > ultimo, *filtros.condiciones())
+            .order_by(tf.c.id_factura)
+            .limit(lote)
+        ).all()
+        if not facturas:
+            return
+        por_factura = {f.id_factura: [] for f in facturas}
+        for item in db.session.execute(
+            db.select(ti).where(ti.c.id_factura.in_(list(por_factura))).order_by(ti.c.id_factura, ti.c.id_item)
+        ):
+            por_factura[item.id_factura].append(item)
+        yield [(f, por_factura[f.id_factura]) for f in facturas]
+        ultimo = facturas[-1].id_factura
+
+
+def _num(valor):
+    return '' if valor is None else str(valor)
+
+
+# -----------------------
+# CSV / JSONL
+# -----------------------
+def exportar_csv(filtros):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    buffer.write('\ufeff')  # BOM: Excel abre el archivo como UTF-8
+    escritor.writerow(COLUMNAS_CSV)
+    for lote in lotes_facturas(filtros):
+        for f, items in lote:
+            cabecera = [f.id_factura, f.creado_en.isoformat(sep=' ') if f.creado_en else '', f.id_usuario,
+                        f.nombre_cliente or '', f.estado, f.direccion_envio, _num(f.total)]
+            if not items:
+                escritor.writerow(cabecera + [''] * 7)
+            for it in items:
+                escritor.writerow(cabecera + [it.id_item, it.nombre_producto or '', it.talla or '', it.color or '',
+                                              it.cantidad, _num(it.precio_unitario), _num(it.subtotal)])
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def exportar_jsonl(filtros):
+    for lote in lotes_facturas(filtros):
+        lineas = []
+        for f, items in lote:
+            lineas.append(json.dumps({
+                'id_factura': f.id_factura,
+                'fecha': f.creado_en.isoformat() if f.creado_en else None,
+                'id_usuario': f.id_usuario,
+                'cliente': f.nombre_cliente,
+                'estado': f.estado,
+                'direccion_envio': f.direccion_envio,
+                'total': _num(f.total),
+                'items': [{
+                    'id_item': it.id_item,
+                    'id_producto': it.id_producto,
+                    'producto': it.nombre_producto,
+                    'talla': it.talla,
+                    'color': it.color,
+                    'cantidad': it.cantidad,
+                    'precio_unitario': _num(it.precio_unitario),
+                    'subtotal': _num(it.subtotal),
+                } for it in items],
+            }, ensure_ascii=False))
+        yield ('\n'.join(lineas) + '\n').encode('utf-8')
+
+
+# -----------------------
+# ZIP de PDFs
+# -----------------------
+class _Flujo(io.RawIOBase):
+    """Destino no buscable para ZipFile: acumula lo escrito hasta `vaciar()`."""
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes = []
+        return datos
+
+
+def _pdfs_en_orden(filtros):
+    """(nombre, bytes o None, error) por factura, generando varios PDFs a la vez.
+
+    Los que ya están en la caché de disco se leen; el resto se envía al pool
+    con una ventana de tamaño acotado, de modo que nunca hay más de unos
+    pocos PDFs en memoria. Cada envío espera su lugar en la cola del pool y
+    un PDF que se pasa de FACTURAS_PDF_TIMEOUT se cancela o recicla su pool.
+    """
+    config = current_app.config
+    ventana = max(1, config.get('FACTURAS_PDF_PROCESOS', 2)) * 2
+    timeout = config.get('FACTURAS_PDF_TIMEOUT', 20)
+    pendientes = deque()
+
+    def _resolver(entrada):
+        nombre, id_factura, ruta, envio = entrada
+        if envio is None:
+            with open(ruta, 'rb') as archivo:
+                return nombre, archivo.read(), None
+        if isinstance(envio, str):
+            return nombre, None, envio
+        pool, futuro = envio
+        try:
+            datos, error = futuro.result(timeout=timeout)
+        except TimeoutFuturo:
+            metricas.sumar(timeouts=1)
+            pool_pdf.abandonar(pool, futuro, espera=timeout)
+            return nombre, None, 'tiempo agotado'
+        except Exception as e:
+            metricas.sumar(errores=1)
+            return nombre, None, str(e)
+        if error:
+            metricas.sumar(errores=1)
+            return nombre, None, error
+        guardar_version(id_factura, ruta, datos)
+        return nombre, datos, None
+
+    for lote in lotes_facturas(filtros):
+        for f, items in lote:
+            ruta, _, factura_ctx, items_ctx = version_pdf(f, items)
+            nombre = f'factura_{f.id_factura}.pdf'
+            if os.path.exists(ruta):
+                metricas.sumar(aciertos_cache=1)
+                pendientes.append((nombre, f.id_factura, ruta, None))
+            else:
+                try:
+                    # Comparte el límite de cola con las descargas sueltas
+                    envio = pool_pdf.enviar(html_factura(factura_ctx, items_ctx), esperar=timeout)
+                except (PDFOcupado, BrokenProcessPool) as e:
+                    envio = str(e)
+                pendientes.append((nombre, f.id_factura, ruta, envio))
+            while len(pendientes) >= ventana:
+                yield _resolver(pendientes.popleft())
+    while pendientes:
+        yield _resolver(pendientes.popleft())
+
+
+def exportar_zip(filtros):
+    flujo = _Flujo()
+    errores = []
+    # Los PDF ya vienen comprimidos: se guardan sin volver a comprimir
+    with zipfile.ZipFile(flujo, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for nombre, datos, error in _pdfs_en_orden(filtros):
+            if datos is None:
+                errores.append(f'{nombre}: {error}')
+                continue
+            zf.writestr(nombre, datos)
+            yield flujo.vaciar()
+        if errores:
+            zf.writestr('ERRORES.txt', '\n'.join(errores) + '\n')
+    yield flujo.vaciar()
+
+
+EXPORTADORES = {
+    'csv': exportar_csv,
+    'jsonl': exportar_jsonl,
+    'zip': exportar_zip,
+}
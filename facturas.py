@@ -0,0 +1,91 @@
+# facturas.py
+from datetime import datetime
+from extensions import db
+from models import Factura, FacturaItem, Usuario
+from paginacion import codificar_cursor, decodificar_cursor, condicion_keyset
+
+POR_PAGINA_HISTORIAL = 20
+
+
+class ItemFactura:
+    """Línea de una factura tal como se muestra (pantalla y PDF)."""
+
+    def __init__(self, fila):
+        self.id_item = fila.id_item
+        self.id_producto = fila.id_producto
+        self.nombre_producto = fila.nombre_producto or 'Producto'
+        self.talla = fila.talla
+        self.color = fila.color
+        self.cantidad = fila.cantidad
+        self.precio_unitario = fila.precio_unitario
+        self.subtotal = fila.subtotal
+
+
+class FacturaVista:
+    """Factura con sus líneas y el nombre del cliente, de solo lectura."""
+
+    def __init__(self, fila):
+        self.id_factura = fila.id_factura
+        self.id_usuario = fila.id_usuario
+        self.nombre_cliente = fila.nombre_cliente or fila.id_usuario
+        self.direccion_envio = fila.direccion_envio or 'No registrada'
+        self.estado = fila.estado
+        self.total = fila.total  # el guardado al comprar, no se recalcula
+        self.creado_en = fila.creado_en
+        self.items = []
+
+    @property
+    def usuario(self):
+        return {'nombre': self.nombre_cliente}
+
+
+def cargar_factura(id_factura):
+    """FacturaVista con sus líneas en una sola consulta (None si no existe)."""
+    tf, ti, tu = Factura.__table__, FacturaItem.__table__, Usuario.__table__
+    filas = db.session.execute(
+        db.select(
+            tf.c.id_factura, tf.c.id_usuario, tf.c.direccion_envio, tf.c.estado, tf.c.total, tf.c.creado_en,
+            tu.c.nombre.label('nombre_cliente'),
+            ti.c.id_item, ti.c.id_producto, ti.c.nombre_producto, ti.c.talla, ti.c.color,
+            ti.c.cantidad, ti.c.precio_unitario, ti.c.subtotal,
+        )
+        .select_from(
+            tf.outerjoin(tu, tu.c.id_usuario == tf.c.id_usuario)
+              .outerjoin(ti, ti.c.id_factura == tf.c.id_factura)
+        )
+        .where(tf.c.id_factura == id_factura)
+        .order_by(ti.c.id_item)
+    ).all()
+    if not filas:
+        return None
+    vista = FacturaVista(filas[0])
+    vista.items = [ItemFactura(f) for f in filas if f.id_item is not None]
+    return vista
+
+
+def historial_facturas(id_usuario, despues=None, por_pagina=POR_PAGINA_HISTORIAL):
+    """Facturas del usuario, de la más reciente a la más antigua, por cursor.
+
+    Devuelve (filas, cursor_siguiente). Cada fila trae el número de artículos;
+    el recorrido usa el índice (id_usuario, creado_en, id_factura).
+    """
+    tf, ti = Factura.__table__, FacturaItem.__table__
+    articulos = (db.select(db.func.coalesce(db.func.sum(ti.c.cantidad), 0))
+                 .where(ti.c.id_factura == tf.c.id_factura)
+                 .scalar_subquery())
+    consulta = (db.select(tf.c.id_factura, tf.c.creado_en, tf.c.estado, tf.c.total,
+                          articulos.label('articulos'))
+                .where(tf.c.id_usuario == str(id_usuario)))
+
+    cursor = decodificar_cursor(despues, datetime.fromisoformat)
+    if cursor is not None:
+        consulta = consulta.where(condicion_keyset(tf.c.creado_en, tf.c.id_factura, *cursor, desc=True))
+
+    filas = db.session.execute(
+        consulta.order_by(tf.c.creado_en.desc(), tf.c.id_factura.desc()).limit(por_pagina + 1)
+    ).all()
+    siguiente = None
+    if len(filas) > por_pagina:
+        filas = filas[:por_pagina]
+        siguiente = codificar_cursor(filas[-1].creado_en, filas[-1].id_factura)
+    return filas, siguiente
@@ -0,0 +1,354 @@
+# facturas_pdf.py
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as TimeoutFuturo, wait as esperar_futuros
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app, render_template
+from facturas import cargar_factura
+from generador_pdf import html_a_pdf
+from models import FacturaItem
+from tareas import tarea
+from utils import _static_file_to_datauri
+
+PLANTILLA = 'factura_pdf.html'
+
+
+class ErrorPDF(Exception):
+    """xhtml2pdf no pudo generar el documento."""
+
+
+class PDFOcupado(Exception):
+    """Hay demasiados PDFs generándose; el cliente debe reintentar."""
+
+    def __init__(self, reintentar_en):
+        super().__init__(f'Cola de PDFs llena, reintentar en {reintentar_en}s')
+        self.reintentar_en = reintentar_en
+
+
+# -----------------------
+# Métricas (por proceso)
+# -----------------------
+class MetricasPDF:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.renders = 0
+            self.errores = 0
+            self.timeouts = 0
+            self.rechazados = 0
+            self.aciertos_cache = 0
+            self.en_curso = 0
+            self.segundos_total = 0.0
+            self.segundos_max = 0.0
+
+    def sumar(self, **contadores):
+        with self._lock:
+            for nombre, valor in contadores.items():
+                setattr(self, nombre, getattr(self, nombre) + valor)
+
+    def registrar_render(self, segundos):
+        with self._lock:
+            self.renders += 1
+            self.segundos_total += segundos
+            self.segundos_max = max(self.segundos_max, segundos)
+
+    def como_dict(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'renders': self.renders,
+                'errores': self.errores,
+                'timeouts': self.timeouts,
+                'rechazados': self.rechazados,
+                'aciertos_cache': self.aciertos_cache,
+                'en_curso': self.en_curso,
+                'segundos_promedio': round(self.segundos_total / self.renders, 4) if self.renders else 0,
+                'segundos_max': round(self.segundos_max, 4),
+            }
+
+
+metricas = MetricasPDF()
+
+
+# -----------------------
+# Pool de procesos
+# -----------------------
+class PoolPDF:
+    """Genera los PDFs en procesos aparte para no bloquear al worker web.
+
+    Como mucho FACTURAS_PDF_COLA_MAX PDFs pueden estar generándose o en cola
+    a la vez en cada proceso web, contando los de las exportaciones; el resto
+    se rechaza con PDFOcupado. Un PDF
+    que supera FACTURAS_PDF_TIMEOUT segundos se abandona: si aún no empezó se
+    cancela; si ya corre, su pool deja de recibir trabajo y se recicla cuando
+    terminan los demás PDFs que tenía en curso.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+        self._cupos = None
+        self._en_curso = {}  # pool -> futuros enviados que no han terminado
+
+    def _enviar(self, procesos, html):
+        """(pool, futuro) del PDF enviado al pool vigente."""
+        for intento in range(2):
+            with self._lock:
+                # Tras un fork (gunicorn --preload) el pool heredado no sirve
+                if self._pool is None or self._pid != os.getpid():
+                    # spawn: los hijos no heredan conexiones ni hilos del worker web
+                    self._pool = ProcessPoolExecutor(max_workers=procesos,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+                    self._pid = os.getpid()
+                    self._en_curso = {}
+                pool = self._pool
+                try:
+                    futuro = pool.submit(html_a_pdf, html)
+                except BrokenProcessPool:
+                    futuro = None
+                else:
+                    en_curso = self._en_curso.setdefault(pool, set())
+                    en_curso.add(futuro)
+            if futuro is None:
+                # Un proceso del pool murió: se descarta y se reintenta con uno nuevo
+                self._retirar(pool)
+                if intento:
+                    raise BrokenProcessPool('No se pudo iniciar el pool de PDFs')
+                continue
+            futuro.add_done_callback(en_curso.discard)
+            return pool, futuro
+
+    def _retirar(self, pool, colgado=None, espera=0):
+        """Saca `pool` de servicio y lo cierra cuando drena su trabajo en curso.
+
+        Los demás PDFs del pool tienen hasta `espera` segundos para terminar;
+        luego se terminan sus procesos (con ellos el `colgado`).
+        """
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+            pendientes = self._en_curso.pop(pool, set()) - {colgado}
+
+        def _cerrar():
+            if pendientes and espera:
+                esperar_futuros(pendientes, timeout=espera)
+            # Una tarea en curso no se puede cancelar: se terminan sus procesos
+            for proceso in list((getattr(pool, '_processes', None) or {}).values()):
+                proceso.terminate()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        threading.Thread(target=_cerrar, name='retirar-pool-pdf', daemon=True).start()
+
+    def _tomar_cupo(self, esperar=None):
+        """Reserva un lugar en la cola; PDFOcupado si no hay (esperando hasta `esperar` s)."""
+        config = current_app.config
+        with self._lock:
+            if self._cupos is None:
+                self._cupos = threading.BoundedSemaphore(config.get('FACTURAS_PDF_COLA_MAX', 8))
+        tomado = self._cupos.acquire(timeout=esperar) if esperar else self._cupos.acquire(blocking=False)
+        if not tomado:
+            metricas.sumar(rechazados=1)
+            raise PDFOcupado(config.get('FACTURAS_PDF_REINTENTAR', 5))
+        return self._cupos
+
+    def enviar(self, html, esperar=None):
+        """(pool, futuro) con (bytes, error) del PDF, dentro del límite de cola.
+
+        El lugar se libera cuando el futuro termina (o se cancela, o su pool se
+        recicla). Las exportaciones pasan `esperar` para aguardar un lugar en
+        vez de fallar al instante.
+        """
+        cupos = self._tomar_cupo(esperar)
+        metricas.sumar(en_curso=1)
+
+        def _liberar(_=None):
+            metricas.sumar(en_curso=-1)
+            cupos.release()
+
+        try:
+            pool, futuro = self._enviar(max(1, current_app.config.get('FACTURAS_PDF_PROCESOS', 2)), html)
+        except BaseException:
+            _liberar()
+            raise
+        futuro.add_done_callback(_liberar)
+        return pool, futuro
+
+    def abandonar(self, pool, futuro, espera):
+        """Deja un PDF que superó el tiempo: se cancela si no empezó; si ya corre, se recicla su pool."""
+        if not futuro.cancel():
+            self._retirar(pool, colgado=futuro, espera=espera)
+
+    def renderizar(self, html):
+        config = current_app.config
+        if config.get('FACTURAS_PDF_PROCESOS', 2) <= 0:
+            return _convertir(html)
+
+        limite = config.get('FACTURAS_PDF_TIMEOUT', 20)
+        try:
+            pool, futuro = self.enviar(html)
+            try:
+                datos, error = futuro.result(timeout=limite)
+            except TimeoutFuturo:
+                metricas.sumar(timeouts=1)
+                self.abandonar(pool, futuro, espera=limite)
+                raise ErrorPDF('Tiempo agotado generando el PDF')
+            except BrokenProcessPool:
+                self._retirar(pool)
+                raise
+        except BrokenProcessPool:
+            raise ErrorPDF('El proceso que generaba el PDF terminó inesperadamente')
+        if error:
+            raise ErrorPDF(error)
+        return datos
+
+
+def _convertir(html):
+    datos, error = html_a_pdf(html)
+    if error:
+        raise ErrorPDF(error)
+    return datos
+
+
+pool_pdf = PoolPDF()
+
+
+# -----------------------
+# Contenido de la factura
+# -----------------------
+def contexto_factura(factura, items):
+    """Datos que se pintan en el PDF; de ellos sale la huella del archivo."""
+    creado = getattr(factura, 'creado_en', None)
+    factura_ctx = {
+        'id_factura': factura.id_factura,
+        'usuario': {'nombre': getattr(factura, 'nombre_cliente', None) or getattr(factura, 'id_usuario', 'Cliente')},
+        'creado_en_str': creado.strftime("%d/%m/%Y %H:%M") if creado else '',
+        'direccion_envio': getattr(factura, 'direccion_envio', '') or 'No registrada',
+        'estado': factura.estado,
+        'total': float(factura.total) if factura.total is not None else 0.0
+    }
+    items_ctx = [{
+        'nombre_producto': getattr(it, 'nombre_producto', 'Producto'),
+        'talla': getattr(it, 'talla', '-') or '-',
+        'color': getattr(it, 'color', '-') or '-',
+        'cantidad': int(getattr(it, 'cantidad', 1)),
+        'precio_unitario': float(getattr(it, 'precio_unitario', 0)),
+        'subtotal': float(getattr(it, 'subtotal', 0))
+    } for it in items]
+    return factura_ctx, items_ctx
+
+
+def _huella_plantilla():
+    # Un cambio de diseño del PDF también debe invalidar los archivos guardados
+    origen, _, _ = current_app.jinja_env.loader.get_source(current_app.jinja_env, PLANTILLA)
+    return hashlib.sha256(origen.encode('utf-8')).hexdigest()[:12]
+
+
+def huella(factura_ctx, items_ctx):
+    contenido = json.dumps([factura_ctx, items_ctx, _huella_plantilla()],
+                           sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()[:20]
+
+
+# -----------------------
+# Render y caché en disco
+# -----------------------
+def carpeta():
+    ruta = current_app.config.get('FACTURAS_PDF_DIR') or os.path.join(current_app.instance_path, 'facturas')
+    os.makedirs(ruta, exist_ok=True)
+    return ruta
+
+
+def _logo_datauri():
+    if not os.path.exists(os.path.join(current_app.static_folder, 'logo.png')):
+        return None
+    return _static_file_to_datauri('logo.png')
+
+
+def html_factura(factura_ctx, items_ctx):
+    return render_template(PLANTILLA, factura=factura_ctx, items=items_ctx,
+                           logo_datauri=_logo_datauri())
+
+
+def renderizar_pdf(factura_ctx, items_ctx, en_pool=True):
+    """Bytes del PDF. La plantilla se pinta aquí; la conversión, en el pool."""
+    html_out = html_factura(factura_ctx, items_ctx)
+    inicio = time.perf_counter()
+    try:
+        datos = pool_pdf.renderizar(html_out) if en_pool else _convertir(html_out)
+    except ErrorPDF:
+        metricas.sumar(errores=1)
+        raise
+    segundos = time.perf_counter() - inicio
+    metricas.registrar_render(segundos)
+    current_app.logger.info("PDF de factura %s generado en %.3fs", factura_ctx['id_factura'], segundos)
+    return datos
+
+
+def _guardar(ruta, datos):
+    # Escritura atómica: nadie llega a servir un PDF a medio escribir
+    fd, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(datos)
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def version_pdf(factura, items):
+    """(ruta, huella, factura_ctx, items_ctx) de la versión vigente del PDF."""
+    factura_ctx, items_ctx = contexto_factura(factura, items)
+    firma = huella(factura_ctx, items_ctx)
+    ruta = os.path.join(carpeta(), f'factura_{factura.id_factura}_{firma}.pdf')
+    return ruta, firma, factura_ctx, items_ctx
+
+
+def guardar_version(id_factura, ruta, datos):
+    """Guarda el PDF y borra las versiones anteriores de la misma factura."""
+    _guardar(ruta, datos)
+    for anterior in glob.glob(os.path.join(os.path.dirname(ruta), f'factura_{id_factura}_*.pdf')):
+        if anterior != ruta:
+            try:
+                os.remove(anterior)
+            except OSError:
+                pass
+
+
+def pdf_factura(factura, items=None, en_pool=True):
+    """(ruta, huella) del PDF de la factura, generándolo sólo si no existe.
+
+    El archivo se nombra con la huella del contenido: si la factura cambia
+    (estado, líneas, plantilla...) la huella cambia, se genera un archivo
+    nuevo y se borran las versiones anteriores. Puede lanzar ErrorPDF o
+    PDFOcupado.
+    """
+    if items is None:
+        items = FacturaItem.query.filter_by(id_factura=factura.id_factura).order_by(FacturaItem.id_item).all()
+    ruta, firma, factura_ctx, items_ctx = version_pdf(factura, items)
+    if os.path.exists(ruta):
+        metricas.sumar(aciertos_cache=1)
+        return ruta, firma
+
+    guardar_version(factura.id_factura, ruta, renderizar_pdf(factura_ctx, items_ctx, en_pool))
+    return ruta, firma
+
+
+@tarea('factura_pdf')
+def precalentar_pdf(payload):
+    """Genera el PDF tras la compra para que la primera descarga no espere."""
+    factura = cargar_factura(payload['id_factura'])
+    if factura is not None:
+        # El worker ya es un proceso aparte: no necesita el pool
+        pdf_factura(factura, factura.items, en_pool=False)
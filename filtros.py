@@ -0,0 +1,149 @@
+# filtros.py
+from decimal import Decimal, InvalidOperation
+from extensions import db
+from models import Producto, VarianteProducto
+
+# Dimensiones de selección múltiple: parámetro -> columna
+DIMENSIONES = {
+    'categoria': Producto.categoria,
+    'talla': VarianteProducto.talla,
+    'color': Producto.color,
+}
+
+# La talla se resuelve contra las variantes con stock, no contra Producto.talla
+_VARIANTE_EN_STOCK = db.and_(VarianteProducto.stock > 0, VarianteProducto.disponibilidad == 'SI')
+
+
+def _decimal(valor):
+    if valor in (None, ''):
+        return None
+    try:
+        return Decimal(str(valor))
+    except InvalidOperation:
+        return None
+
+
+class FiltrosCatalogo:
+    """Filtros activos del catálogo leídos de la query string."""
+
+    def __init__(self, categoria=None, talla=None, color=None,
+                 precio_min=None, precio_max=None, disponible=False):
+        self.valores = {
+            'categoria': [v for v in (categoria or []) if v],
+            'talla': [v for v in (talla or []) if v],
+            'color': [v for v in (color or []) if v],
+        }
+        self.precio_min = precio_min
+        self.precio_max = precio_max
+        self.disponible = disponible
+
+    @classmethod
+    def desde_args(cls, args):
+        return cls(
+            categoria=args.getlist('categoria'),
+            talla=args.getlist('talla'),
+            color=args.getlist('color'),
+            precio_min=_decimal(args.get('precio_min')),
+            precio_max=_decimal(args.get('precio_max')),
+            disponible=args.get('disponible') in ('1', 'on', 'SI'),
+        )
+
+    @property
+    def activos(self):
+        return (any(self.valores.values()) or self.disponible
+                or self.precio_min is not None or self.precio_max is not None)
+
+    def a_args(self):
+        """Parámetros para reconstruir la URL (paginación, orden, etc.)."""
+        args = {k: v for k, v in self.valores.items() if v}
+        if self.precio_min is not None:
+            args['precio_min'] = str(self.precio_min)
+        if self.precio_max is not None:
+            args['precio_max'] = str(self.precio_max)
+        if self.disponible:
+            args['disponible'] = '1'
+        return args
+
+    def condiciones(self, excluir=None):
+        """Condiciones SQL de los filtros, omitiendo la dimensión `excluir`."""
+        conds = []
+        for nombre, columna in DIMENSIONES.items():
+            if nombre == excluir or not self.valores[nombre]:
+                continue
+            if nombre == 'talla':
+                conds.append(Producto.id_producto.in_(
+                    db.select(VarianteProducto.id_producto)
+                    .where(_VARIANTE_EN_STOCK, VarianteProducto.talla.in_(self.valores['talla']))
+                ))
+            else:
+                conds.append(columna.in_(self.valores[nombre]))
+        if excluir != 'precio':
+            if self.precio_min is not None:
+                conds.append(Producto.precio_producto >= self.precio_min)
+            if self.precio_max is not None:
+                conds.append(Producto.precio_producto <= self.precio_max)
+        if excluir != 'disponibilidad' and self.disponible:
+            conds.append(Producto.disponibilidad == 'SI')
+        return conds
+
+
+def aplicar_filtros(query, filtros):
+    conds = filtros.condiciones()
+    return query.filter(*conds) if conds else query
+
+
+def contar_facetas(filtros):
+    """Cuenta de productos por valor de cada dimensión, en una sola consulta.
+
+    Cada dimensión se cuenta con todos los filtros activos excepto el suyo, de
+    modo que el cliente ve cuántos resultados tendría al cambiar esa opción.
+    Las ramas se unen con UNION ALL: un único viaje a la base de datos.
+    """
+    ramas = []
+    for nombre, columna in DIMENSIONES.items():
+        if nombre == 'talla':
+            ramas.append(
+                db.select(db.literal(nombre).label('dimension'),
+                          db.cast(columna, db.String).label('valor'),
+                          db.func.count(db.distinct(VarianteProducto.id_producto)).label('total'))
+                .select_from(VarianteProducto)
+                .join(Producto, Producto.id_producto == VarianteProducto.id_producto)
+                .where(_VARIANTE_EN_STOCK, *filtros.condiciones(excluir=nombre))
+                .group_by(columna)
+            )
+            continue
+        ramas.append(
+            db.select(db.literal(nombre).label('dimension'),
+                      db.cast(columna, db.String).label('valor'),
+                      db.func.count().label('total'))
+            .where(columna.isnot(None), *filtros.condiciones(excluir=nombre))
+            .group_by(columna)
+        )
+    ramas.append(
+        db.select(db.literal('disponibilidad').label('dimension'),
+                  db.cast(Producto.disponibilidad, db.String).label('valor'),
+                  db.func.count().label('total'))
+        .where(*filtros.condiciones(excluir='disponibilidad'))
+        .group_by(Producto.disponibilidad)
+    )
+    for extremo, func in (('precio_min', db.func.min), ('precio_max', db.func.max)):
+        ramas.append(
+            db.select(db.literal(extremo).label('dimension'),
+                      db.cast(func(Producto.precio_producto), db.String).label('valor'),
+                      db.func.count().label('total'))
+            .where(*filtros.condiciones(excluir='precio'))
+        )
+
+    facetas = {nombre: [] for nombre in DIMENSIONES}
+    facetas['disponibilidad'] = {}
+    facetas['precio'] = {'min': None, 'max': None}
+    for dimension, valor, total in db.session.execute(db.union_all(*ramas)):
+        if dimension in DIMENSIONES:
+            facetas[dimension].append((valor, total))
+        elif dimension == 'disponibilidad':
+            facetas['disponibilidad'][valor] = total
+        else:
+            facetas['precio'][dimension[len('precio_'):]] = _decimal(valor)
+    for nombre in DIMENSIONES:
+        facetas[nombre].sort(key=lambda par: par[0].lower())
+    return facetas
@@ -0,0 +1,14 @@
+# generador_pdf.py
+# Se ejecuta dentro de los procesos del pool de PDFs: sólo importa xhtml2pdf,
+# no la aplicación.
+from io import BytesIO
+from xhtml2pdf import pisa
+
+
+def html_a_pdf(html):
+    """Convierte HTML en PDF. Devuelve (bytes, None) o (None, mensaje de error)."""
+    pdf_io = BytesIO()
+    pisa_status = pisa.CreatePDF(src=html, dest=pdf_io, encoding='utf-8')
+    if pisa_status.err:
+        return None, f"xhtml2pdf error: {pisa_status.err}"
+    return pdf_io.getvalue(), None
@@ -1 +0,0 @@
-SHOPPING_CARTS = {}
\ No newline at end of file
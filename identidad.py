@@ -0,0 +1,85 @@
+# identidad.py
+from flask import g, has_request_context
+from flask_login import UserMixin
+from cache import BackendLocal
+from extensions import db
+from models import Usuario, Rol
+
+# Usuario + rol por id_usuario; lo invalidan las rutas de usuarios y roles.
+# En los demás procesos de gunicorn un cambio se ve como mucho tras el TTL.
+_identidades = BackendLocal(max_entradas=2048, ttl=60)
+
+
+class Identidad(UserMixin):
+    """Datos del usuario autenticado y su rol, sin sesión de SQLAlchemy.
+
+    Es lo que Flask-Login expone como `current_user` en cada petición:
+    de solo lectura y barata de guardar en la caché del proceso.
+    """
+
+    def __init__(self, fila):
+        self.id_usuario = fila.id_usuario
+        self.nombre = fila.nombre
+        self.correo = fila.correo
+        self.direccion = fila.direccion
+        self.id_rol = fila.id_rol
+        self.nombre_rol = fila.nombre_rol
+
+    def get_id(self):
+        return str(self.id_usuario)
+
+    def __repr__(self):
+        return f'<Identidad {self.id_usuario} rol={self.id_rol}>'
+
+
+def init_app(app):
+    _identidades.ttl = app.config.get('IDENTIDAD_TTL', 60)
+
+
+def _consultar(id_usuario):
+    tu, tr = Usuario.__table__, Rol.__table__
+    fila = db.session.execute(
+        db.select(tu.c.id_usuario, tu.c.nombre, tu.c.correo, tu.c.direccion, tu.c.id_rol,
+                  tr.c.nombre.label('nombre_rol'))
+        .select_from(tu.outerjoin(tr, tr.c.id_rol == tu.c.id_rol))
+        .where(tu.c.id_usuario == id_usuario)
+    ).first()
+    return Identidad(fila) if fila else None
+
+
+def cargar_identidad(id_usuario):
+    """Identidad del usuario: de la petición, de la caché del proceso o de la base.
+
+    Devuelve None si el usuario no existe (no se guarda: un usuario recién
+    creado debe poder entrar de inmediato).
+    """
+    id_usuario = str(id_usuario)
+    memo = g.setdefault('_identidades', {}) if has_request_context() else {}
+    if id_usuario in memo:
+        return memo[id_usuario]
+
+    identidad = _identidades.get(id_usuario)
+    if identidad is None:
+        identidad = _consultar(id_usuario)
+        if identidad is not None:
+            _identidades.set(id_usuario, identidad,
+                             tags=(f'usuario:{id_usuario}', f'rol:{identidad.id_rol}'))
+    memo[id_usuario] = identidad
+    return identidad
+
+
+def _olvidar_memo():
+    if has_request_context():
+        g.pop('_identidades', None)
+
+
+def olvidar_usuario(id_usuario):
+    """Tras editar o borrar un usuario."""
+    _identidades.invalidar_tag(f'usuario:{id_usuario}')
+    _olvidar_memo()
+
+
+def olvidar_rol(id_rol):
+    """Tras renombrar o borrar un rol: caen todos los usuarios que lo tienen."""
+    _identidades.invalidar_tag(f'rol:{id_rol}')
+    _olvidar_memo()
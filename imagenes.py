@@ -0,0 +1,184 @@
+# imagenes.py
+import hashlib
+import mimetypes
+import os
+from flask import url_for, current_app, send_file, Response, abort
+from werkzeug.security import safe_join
+from PIL import Image, ImageOps, UnidentifiedImageError
+from cache import BackendLocal
+from extensions import db
+from models import Producto
+
+# Ancho máximo (px) de cada derivado
+TAMANOS = {
+    'thumb': 320,
+    'card': 640,
+    'full': 1280,
+}
+FORMATOS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 6},
+    'jpg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+CARPETA_DERIVADOS = 'img/derivados'
+UN_ANO = 365 * 24 * 3600
+
+# id_producto -> (foto_producto, foto_derivados); evita ir a la base por cada imagen
+_fotos = BackendLocal(max_entradas=4096, ttl=600)
+_NO_EXISTE = False
+
+
+def _huella(ruta):
+    h = hashlib.sha1()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(65536), b''):
+            h.update(bloque)
+    return h.hexdigest()[:10]
+
+
+def generar_derivados(static_folder, foto_producto):
+    """Genera las versiones thumb/card/full en WebP y JPEG de una foto.
+
+    Devuelve los metadatos a guardar en `Producto.foto_derivados`, o None si
+    el archivo no existe o no es una imagen. Los nombres llevan la huella del
+    original, así que una URL nunca cambia de contenido y puede cachearse
+    indefinidamente. Los derivados se guardan sin EXIF.
+    """
+    original = safe_join(static_folder, 'img', foto_producto)
+    if original is None or not os.path.isfile(original):
+        return None
+
+    huella = _huella(original)
+    base = os.path.splitext(os.path.basename(foto_producto))[0]
+    destino = os.path.join(static_folder, CARPETA_DERIVADOS)
+    os.makedirs(destino, exist_ok=True)
+
+    try:
+        with Image.open(original) as img:
+            img = ImageOps.exif_transpose(img)
+            img = img.convert('RGB')
+            ancho_original = img.width
+            derivados = {}
+            for tamano, ancho in TAMANOS.items():
+                # No se amplían imágenes más pequeñas que el tamaño pedido
+                copia = img.copy()
+                copia.thumbnail((min(ancho, ancho_original), 10 ** 5), Image.LANCZOS)
+                info = {'w': copia.width, 'h': copia.height}
+                for ext, opciones in FORMATOS.items():
+                    nombre = f"{base}-{huella}-{tamano}.{ext}"
+                    copia.save(os.path.join(destino, nombre), **opciones)
+                    info[ext] = f"{CARPETA_DERIVADOS}/{nombre}"
+                derivados[tamano] = info
+    except (UnidentifiedImageError, OSError):
+        return None
+
+    return {'original': foto_producto, 'huella': huella, 'tamanos': derivados}
+
+
+def derivados_vigentes(producto):
+    """Metadatos de derivados del producto si corresponden a su foto actual."""
+    meta = getattr(producto, 'foto_derivados', None)
+    if not meta or meta.get('original') != producto.foto_producto:
+        return None
+    return meta
+
+
+def srcset(producto, formato='jpg'):
+    """Cadena `srcset` con todos los anchos disponibles, o '' si no hay derivados."""
+    meta = derivados_vigentes(producto)
+    if not meta:
+        return ''
+    return ', '.join(
+        f"{url_for('static', filename=info[formato])} {info['w']}w"
+        for info in sorted(meta['tamanos'].values(), key=lambda i: i['w'])
+    )
+
+
+def imagen_url(producto, tamano='card', formato='jpg'):
+    """URL del derivado pedido, con la foto original o la imagen por defecto como respaldo."""
+    meta = derivados_vigentes(producto)
+    if meta and tamano in meta['tamanos']:
+        return url_for('static', filename=meta['tamanos'][tamano][formato])
+    if producto.foto_producto:
+        return url_for('static', filename='img/' + producto.foto_producto)
+    return url_for('static', filename='img/no-image.png')
+
+
+# -----------------------
+# Servir imágenes
+# -----------------------
+def foto_de_producto(id_producto):
+    """(foto_producto, foto_derivados) del producto, memoizado por proceso.
+
+    Devuelve None si el producto no existe.
+    """
+    valor = _fotos.get(id_producto)
+    if valor is None:
+        fila = (db.session.query(Producto.foto_producto, Producto.foto_derivados)
+                .filter(Producto.id_producto == id_producto).first())
+        valor = (fila[0], fila[1]) if fila else _NO_EXISTE
+        _fotos.set(id_producto, valor, tags=(f'producto:{id_producto}',))
+    return valor or None
+
+
+def olvidar_foto(id_producto):
+    _fotos.invalidar_tag(f'producto:{id_producto}')
+
+
+def ruta_estatica(foto_producto, derivados, tamano=None, formato='jpg'):
+    """(ruta relativa a static, huella) de la foto o del derivado pedido."""
+    if derivados and derivados.get('original') == foto_producto and tamano in derivados['tamanos']:
+        return derivados['tamanos'][tamano][formato], derivados['huella']
+    return 'img/' + foto_producto, None
+
+
+def archivo_estatico(relativa):
+    """Ruta absoluta de `relativa` dentro de static/, o None si sale de la carpeta."""
+    return safe_join(current_app.static_folder, relativa)
+
+
+def enviar_imagen(relativa, inmutable=False):
+    """Respuesta para un archivo de static/ sin copiarlo a memoria.
+
+    Con IMAGENES_X_ACCEL configurado el envío se delega a nginx mediante
+    X-Accel-Redirect; si no, `send_file` usa el file wrapper del servidor
+    (sendfile) y atiende Range, If-None-Match e If-Modified-Since. Una ruta
+    que escapa de static/ (p. ej. una foto '../..') responde 404.
+    """
+    ruta = archivo_estatico(relativa)
+    if ruta is None:
+        abort(404)
+    mimetype = mimetypes.guess_type(relativa)[0] or 'application/octet-stream'
+    prefijo = current_app.config.get('IMAGENES_X_ACCEL')
+    if prefijo:
+        resp = Response(mimetype=mimetype)
+        # Relativa ya normalizada: nginx no debe recibir '..' ni '\\'
+        relativa = os.path.relpath(ruta, current_app.static_folder).replace(os.sep, '/')
+        resp.headers['X-Accel-Redirect'] = prefijo.rstrip('/') + '/' + relativa
+    else:
+        resp = send_file(ruta,
+                         mimetype=mimetype, conditional=True,
+                         max_age=UN_ANO if inmutable else None)
+
+    if inmutable:
+        resp.cache_control.no_cache = False
+        resp.cache_control.public = True
+        resp.cache_control.max_age = UN_ANO
+        resp.cache_control.immutable = True
+    else:
+        resp.cache_control.no_cache = True
+    return resp
+
+
+def _max_age_static(original):
+    # Los derivados llevan la huella en el nombre: su contenido nunca cambia
+    def get_send_file_max_age(filename):
+        if filename and filename.replace('\\', '/').startswith(CARPETA_DERIVADOS + '/'):
+            return UN_ANO
+        return original(filename)
+    return get_send_file_max_age
+
+
+def init_app(app):
+    app.add_template_global(srcset, 'srcset')
+    app.add_template_global(imagen_url, 'imagen_url')
+    app.get_send_file_max_age = _max_age_static(app.get_send_file_max_age)
@@ -0,0 +1,201 @@
+# inventario.py
+from extensions import db
+from models import Producto, VarianteProducto
+
+# Orden de presentación de las tallas; las desconocidas van al final
+ORDEN_TALLAS = ['XS', 'S', 'M', 'L', 'XL', 'XXL']
+
+
+class StockInsuficiente(Exception):
+    """Alguna línea del pedido pide más unidades de las disponibles."""
+
+    def __init__(self, faltantes):
+        # faltantes: [{'id_producto', 'nombre', 'pedido', 'disponible'}]
+        self.faltantes = faltantes
+        super().__init__(', '.join(f"{f['nombre']} ({f['disponible']}/{f['pedido']})" for f in faltantes))
+
+    def mensaje(self):
+        partes = [f"{f['nombre']} (pediste {f['pedido']}, quedan {f['disponible']})" for f in self.faltantes]
+        return 'No hay stock suficiente para: ' + '; '.join(partes)
+
+
+def _orden_talla(talla):
+    t = (talla or '').upper()
+    return (ORDEN_TALLAS.index(t) if t in ORDEN_TALLAS else len(ORDEN_TALLAS), t)
+
+
+# -----------------------
+# Variantes (talla/color)
+# -----------------------
+def tallas_disponibles(ids):
+    """{id_producto: [tallas con stock]} para una página, en una sola consulta."""
+    if not ids:
+        return {}
+    filas = db.session.execute(
+        db.select(VarianteProducto.id_producto, VarianteProducto.talla)
+        .where(VarianteProducto.id_producto.in_(ids),
+               VarianteProducto.stock > 0,
+               VarianteProducto.disponibilidad == 'SI')
+        .distinct()
+    ).all()
+    tallas = {}
+    for id_producto, talla in filas:
+        tallas.setdefault(id_producto, []).append(talla)
+    for lista in tallas.values():
+        lista.sort(key=_orden_talla)
+    return tallas
+
+
+def buscar_variante(id_producto, talla, color=None):
+    """Variante con stock para (producto, talla[, color]), usando el índice único."""
+    query = VarianteProducto.query.filter(
+        VarianteProducto.id_producto == id_producto,
+        VarianteProducto.talla == talla,
+        VarianteProducto.stock > 0,
+        VarianteProducto.disponibilidad == 'SI',
+    )
+    if color:
+        query = query.filter(VarianteProducto.color == color)
+    return query.order_by(VarianteProducto.stock.desc()).first()
+
+
+def tiene_variantes(id_producto):
+    return db.session.query(
+        db.exists().where(VarianteProducto.id_producto == id_producto)
+    ).scalar()
+
+
+def migrar_variantes():
+    """Crea una variante por producto sin variantes, copiando su talla, color y stock."""
+    sin_variantes = ~db.exists().where(VarianteProducto.id_producto == Producto.id_producto)
+    consulta = (db.select(Producto.id_producto,
+                          db.func.coalesce(Producto.talla, 'U'),
+                          Producto.color,
+                          Producto.stock,
+                          Producto.disponibilidad)
+                .where(sin_variantes))
+    resultado = db.session.execute(
+        VarianteProducto.__table__.insert().from_select(
+            ['id_producto', 'talla', 'color', 'stock', 'disponibilidad'], consulta)
+    )
+    db.session.commit()
+    return resultado.rowcount
+
+
+def sincronizar_stock_producto(id_producto):
+    """Producto.stock = suma del stock de sus variantes (sin commit)."""
+    total = db.select(db.func.coalesce(db.func.sum(VarianteProducto.stock), 0)).where(
+        VarianteProducto.id_producto == id_producto).scalar_subquery()
+    db.session.execute(
+        Producto.__table__.update()
+        .where(Producto.id_producto == id_producto)
+        .values(stock=total)
+    )
+
+
+def sincronizar_stock_productos(ids):
+    """Como sincronizar_stock_producto, para varios productos en un solo UPDATE.
+
+    Los productos sin variantes conservan su stock.
+    """
+    if not ids:
+        return
+    tp, tv = Producto.__table__, VarianteProducto.__table__
+    total = db.select(db.func.coalesce(db.func.sum(tv.c.stock), 0)).where(
+        tv.c.id_producto == tp.c.id_producto).scalar_subquery()
+    db.session.execute(
+        tp.update()
+        .where(tp.c.id_producto.in_(ids), db.exists().where(tv.c.id_producto == tp.c.id_producto))
+        .values(stock=total)
+    )
+
+
+# -----------------------
+# Reserva en el checkout
+# -----------------------
+def cantidades_por_producto(cart):
+    """Suma las cantidades del carrito por producto."""
+    cantidades = {}
+    for item in cart.values():
+        pid = int(item['id'])
+        cantidades[pid] = cantidades.get(pid, 0) + int(item.get('cantidad', 1))
+    return cantidades
+
+
+def cantidades_por_variante(cart):
+    """Suma las cantidades del carrito por variante (líneas con id_variante)."""
+    cantidades = {}
+    for item in cart.values():
+        if item.get('id_variante'):
+            vid = int(item['id_variante'])
+            cantidades[vid] = cantidades.get(vid, 0) + int(item.get('cantidad', 1))
+    return cantidades
+
+
+def _descontar(tabla, columna_id, cantidades, *condiciones):
+    """UPDATE condicional por fila, en orden de id. Devuelve los ids que no alcanzaron."""
+    faltantes = []
+    for id_fila in sorted(cantidades):
+        pedido = cantidades[id_fila]
+        resultado = db.session.execute(
+            tabla.update()
+            .where(columna_id == id_fila, tabla.c.stock >= pedido, *condiciones)
+            .values(stock=tabla.c.stock - pedido)
+        )
+        if resultado.rowcount != 1:
+            faltantes.append(id_fila)
+    return faltantes
+
+
+def reservar_stock(cantidades, variantes=None):
+    """Descuenta el stock del pedido dentro de la transacción actual.
+
+    Cada línea es un ``UPDATE ... SET stock = stock - :n WHERE stock >= :n``:
+    la base hace la comprobación y el descuento de forma atómica, sin leer
+    antes la fila. Primero se descuentan las variantes y luego el total de
+    cada producto, siempre en orden de id, para que dos compras simultáneas
+    no se bloqueen mutuamente (deadlock).
+
+    Si alguna línea no alcanza se lanza StockInsuficiente con el detalle de
+    todas las que faltan; el llamador debe hacer rollback.
+    """
+    variantes = variantes or {}
+    tv = VarianteProducto.__table__
+    tp = Producto.__table__
+
+    faltan_variantes = _descontar(tv, tv.c.id_variante, variantes, tv.c.disponibilidad == 'SI')
+    faltan_productos = [] if faltan_variantes else _descontar(
+        tp, tp.c.id_producto, cantidades, tp.c.disponibilidad == 'SI')
+
+    detalle = []
+    if faltan_variantes:
+        filas = db.session.execute(
+            db.select(tv.c.id_variante, tv.c.talla, tv.c.stock, tv.c.disponibilidad, tp.c.nombre)
+            .join(tp, tp.c.id_producto == tv.c.id_producto)
+            .where(tv.c.id_variante.in_(faltan_variantes))
+        ).all()
+        por_id = {f.id_variante: f for f in filas}
+        for vid in faltan_variantes:
+            fila = por_id.get(vid)
+            detalle.append({
+                'id_variante': vid,
+                'nombre': f"{fila.nombre} talla {fila.talla}" if fila is not None else f'Variante {vid}',
+                'pedido': variantes[vid],
+                'disponible': fila.stock if fila is not None and fila.disponibilidad == 'SI' else 0,
+            })
+    elif faltan_productos:
+        filas = db.session.execute(
+            db.select(tp.c.id_producto, tp.c.nombre, tp.c.stock, tp.c.disponibilidad)
+            .where(tp.c.id_producto.in_(faltan_productos))
+        ).all()
+        por_id = {f.id_producto: f for f in filas}
+        for id_producto in faltan_productos:
+            fila = por_id.get(id_producto)
+            detalle.append({
+                'id_producto': id_producto,
+                'nombre': fila.nombre if fila is not None else f'Producto {id_producto}',
+                'pedido': cantidades[id_producto],
+                'disponible': fila.stock if fila is not None and fila.disponibilidad == 'SI' else 0,
+            })
+    if detalle:
+        raise StockInsuficiente(detalle)
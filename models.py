@@ -9,6 +9,12 @@ class Rol(db.Model):
     nombre = db.Column(db.String(25), nullable=False, unique=True)
     fecha_registro = db.Column(db.DateTime, server_default=db.func.now())
 
+class RolPermiso(db.Model):
+    """Permiso con nombre (ver permisos.PERMISOS) concedido a un rol."""
+    __tablename__ = 'rol_permisos'
+    id_rol = db.Column(db.Integer, db.ForeignKey('rol.id_rol'), primary_key=True)
+    permiso = db.Column(db.String(50), primary_key=True)
+
 class Usuario(db.Model, UserMixin):
     __tablename__ = 'usuarios'
     id_usuario = db.Column(db.String(15), primary_key=True)
@@ -42,8 +48,48 @@ class Producto(db.Model):
     disponibilidad = db.Column(db.Enum('SI', 'NO', name='disponibilidad_enum'), nullable=False, default='SI')
     stock = db.Column(db.Integer, nullable=False, default=0)
     foto_producto = db.Column(db.String(255), nullable=True) 
+    foto_derivados = db.Column(db.JSON, nullable=True)  # miniaturas generadas (ver imagenes.py)
     creado_en = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Índices para la paginación por cursor y los filtros del catálogo
+    __table_args__ = (
+        db.Index('ix_productos_creado_en_id', 'creado_en', 'id_producto'),
+        db.Index('ix_productos_precio_id', 'precio_producto', 'id_producto'),
+        db.Index('ix_productos_categoria_color', 'categoria', 'color'),
+        db.Index('ix_productos_disp_categoria_precio', 'disponibilidad', 'categoria', 'precio_producto'),
+        db.Index('ix_productos_color', 'color'),
+    )
+
+
+class VarianteProducto(db.Model):
+    """Combinación talla/color de un producto con su propio stock (SKU)."""
+    __tablename__ = 'producto_variantes'
+    id_variante = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    id_producto = db.Column(db.Integer, db.ForeignKey('productos.id_producto', ondelete='CASCADE'), nullable=False)
+    talla = db.Column(db.String(20), nullable=False)
+    color = db.Column(db.String(25))
+    sku = db.Column(db.String(60), unique=True)
+    stock = db.Column(db.Integer, nullable=False, default=0)
+    precio = db.Column(db.Numeric(10, 2), nullable=True)  # None = precio del producto
+    disponibilidad = db.Column(db.Enum('SI', 'NO', name='disponibilidad_enum'), nullable=False, default='SI')
+
+    producto = db.relationship('Producto', backref=db.backref('variantes', lazy='dynamic', cascade='all, delete-orphan'))
+
+    __table_args__ = (
+        db.UniqueConstraint('id_producto', 'talla', 'color', name='uq_variante_producto_talla_color'),
+        # Tallas con stock de una página del catálogo y filtro por talla
+        db.Index('ix_variantes_producto_stock', 'id_producto', 'stock'),
+        db.Index('ix_variantes_talla_stock', 'talla', 'stock', 'id_producto'),
+    )
+
+    @property
+    def precio_efectivo(self):
+        return self.precio if self.precio is not None else self.producto.precio_producto
+
+    @property
+    def en_stock(self):
+        return self.disponibilidad == 'SI' and (self.stock or 0) > 0
+
 
 class Factura(db.Model):
     __tablename__ = 'factura'
@@ -53,6 +99,16 @@ class Factura(db.Model):
     estado = db.Column(db.Enum('pendiente', 'pagada', 'enviada', 'cancelada', name='estado_enum'), default='pendiente')
     total = db.Column(db.Numeric(10, 2), nullable=False)
     creado_en = db.Column(db.DateTime, default=datetime.utcnow)
+    # Clave enviada por el cliente en el checkout: un POST repetido devuelve esta factura
+    clave_idempotencia = db.Column(db.String(64))
+
+    __table_args__ = (
+        db.Index('uq_factura_usuario_idempotencia', 'id_usuario', 'clave_idempotencia', unique=True),
+        # Exportación por rango de fechas
+        db.Index('ix_factura_creado_en', 'creado_en', 'id_factura'),
+        # Historial "mis facturas" por cursor
+        db.Index('ix_factura_usuario_creado', 'id_usuario', 'creado_en', 'id_factura'),
+    )
 
 class FacturaItem(db.Model):
     __tablename__ = 'factura_items'
@@ -82,6 +138,30 @@ class Pedido(db.Model):
     direccion = db.Column(db.String(200), nullable=False)
     usuario_id = db.Column(db.String(15), db.ForeignKey('usuarios.id_usuario'), nullable=False)
     estado = db.Column(db.String(20), nullable=False, default="pendiente") 
+    # Línea de factura que origina el pedido. Las filas anteriores a estas
+    # columnas se enlazan con `flask migrar-pedidos`
+    id_factura = db.Column(db.Integer, db.ForeignKey('factura.id_factura'))
+    id_item = db.Column(db.Integer, db.ForeignKey('factura_items.id_item'))
+    id_producto = db.Column(db.Integer, db.ForeignKey('productos.id_producto', ondelete='SET NULL'))
+    creado_en = db.Column(db.DateTime, default=datetime.utcnow)
+
+    factura = db.relationship('Factura', backref=db.backref('pedidos', lazy='dynamic'))
+    # `producto` ya es el nombre copiado; al borrar el producto el pedido queda sin id
+    producto_catalogo = db.relationship('Producto', backref=db.backref('pedidos', lazy='dynamic'))
+    item = db.relationship('FacturaItem', backref=db.backref('pedido', uselist=False))
+
+    # Tablero de administración: filtro por estado o por cliente, del más nuevo al más viejo
+    __table_args__ = (
+        db.Index('ix_pedido_estado_id', 'estado', 'id'),
+        db.Index('ix_pedido_usuario_id', 'usuario_id', 'id'),
+        # "Mis pedidos" abiertos de un cliente
+        db.Index('ix_pedido_usuario_estado_id', 'usuario_id', 'estado', 'id'),
+        # Todos los pedidos de un producto
+        db.Index('ix_pedido_producto_id', 'id_producto', 'id'),
+        db.Index('ix_pedido_factura', 'id_factura'),
+        # Un pedido por línea de factura
+        db.Index('uq_pedido_item', 'id_item', unique=True),
+    )
 
     def __repr__(self):
         return f"<Pedido {self.producto} - {self.talla}>"
@@ -96,6 +176,141 @@ class Resena(db.Model):
     usuario = db.Column(db.String(100))
     fecha = db.Column(db.DateTime, default=datetime.utcnow)
 
-    producto = db.relationship('Producto', backref='resenas')
+    # Consulta (no lista) para no cargar todas las reseñas de golpe
+    producto = db.relationship('Producto', backref=db.backref('resenas', lazy='dynamic'))
+
+    # Índices del listado paginado de reseñas de un producto
+    __table_args__ = (
+        db.Index('ix_resena_producto_fecha', 'id_producto', 'fecha', 'id'),
+        db.Index('ix_resena_producto_calidad', 'id_producto', 'calidad', 'id'),
+    )
+
+class ResumenResenas(db.Model):
+    """Agregados de reseñas por producto, mantenidos al guardar cada reseña."""
+    __tablename__ = 'resumen_resenas'
+    id_producto = db.Column(db.Integer, db.ForeignKey('productos.id_producto', ondelete='CASCADE'), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    suma_calidad = db.Column(db.Integer, nullable=False, default=0)
+    suma_comodidad = db.Column(db.Integer, nullable=False, default=0)
+    # Histograma de estrellas de calidad
+    calidad_1 = db.Column(db.Integer, nullable=False, default=0)
+    calidad_2 = db.Column(db.Integer, nullable=False, default=0)
+    calidad_3 = db.Column(db.Integer, nullable=False, default=0)
+    calidad_4 = db.Column(db.Integer, nullable=False, default=0)
+    calidad_5 = db.Column(db.Integer, nullable=False, default=0)
+
+    # El resumen se va con su producto (ORM y, en esquemas nuevos, ON DELETE)
+    producto = db.relationship('Producto', backref=db.backref('resumen_resenas', uselist=False,
+                                                              cascade='all, delete-orphan'))
+
+    @property
+    def promedio_calidad(self):
+        return self.suma_calidad / self.total if self.total else 0
+
+    @property
+    def promedio_comodidad(self):
+        return self.suma_comodidad / self.total if self.total else 0
+
+    @property
+    def distribucion(self):
+        """[(estrellas, cantidad, porcentaje)] de 5 a 1 estrellas."""
+        filas = []
+        for estrellas in range(5, 0, -1):
+            cantidad = getattr(self, f'calidad_{estrellas}') or 0
+            filas.append((estrellas, cantidad, round(100 * cantidad / self.total) if self.total else 0))
+        return filas
+
+
+class CarritoLinea(db.Model):
+    """Línea del carrito de un usuario; la cookie sólo guarda el id del carrito."""
+    __tablename__ = 'carrito_lineas'
+    carrito_id = db.Column(db.String(50), primary_key=True)
+    clave = db.Column(db.String(80), primary_key=True)  # "<id_producto>:<talla>"
+    id_producto = db.Column(db.Integer, nullable=False)
+    id_variante = db.Column(db.Integer)
+    talla = db.Column(db.String(20))
+    cantidad = db.Column(db.Integer, nullable=False, default=1)
+    precio = db.Column(db.Numeric(10, 2))
+    nombre = db.Column(db.String(150))
+    actualizado_en = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_carrito_lineas_actualizado', 'actualizado_en'),
+    )
+
+class Tarea(db.Model):
+    """Trabajo en segundo plano (outbox): se inserta en la misma transacción
+    que lo origina y lo ejecuta `flask tareas-worker`."""
+    __tablename__ = 'tareas'
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    # pendiente -> en_proceso -> hecha | fallida (dead letter)
+    estado = db.Column(db.String(12), nullable=False, default='pendiente')
+    intentos = db.Column(db.Integer, nullable=False, default=0)
+    max_intentos = db.Column(db.Integer, nullable=False, default=5)
+    disponible_en = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    tomada_en = db.Column(db.DateTime)
+    ultimo_error = db.Column(db.Text)
+    creado_en = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_tareas_estado_disponible', 'estado', 'disponible_en', 'id'),
+    )
+
+
+# -----------------------
+# Agregados de ventas (ver ventas.py)
+# -----------------------
+class VentaDiaProducto(db.Model):
+    """Ventas de un producto en un día (UTC). id_producto 0 = producto borrado."""
+    __tablename__ = 'ventas_dia_producto'
+    dia = db.Column(db.Date, primary_key=True)
+    id_producto = db.Column(db.Integer, primary_key=True)
+    unidades = db.Column(db.Integer, nullable=False, default=0)
+    ingresos = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    facturas = db.Column(db.Integer, nullable=False, default=0)
+
+class VentaDiaCategoria(db.Model):
+    """Ventas de una categoría en un día (UTC). Categoría '' = sin categoría."""
+    __tablename__ = 'ventas_dia_categoria'
+    dia = db.Column(db.Date, primary_key=True)
+    categoria = db.Column(db.String(100), primary_key=True)
+    unidades = db.Column(db.Integer, nullable=False, default=0)
+    ingresos = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    facturas = db.Column(db.Integer, nullable=False, default=0)
+
+class VentaDia(db.Model):
+    """Facturas de un día (UTC); ingresos = suma de Factura.total."""
+    __tablename__ = 'ventas_dia'
+    dia = db.Column(db.Date, primary_key=True)
+    unidades = db.Column(db.Integer, nullable=False, default=0)
+    ingresos = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    facturas = db.Column(db.Integer, nullable=False, default=0)
+
+class VentaDiaEstado(db.Model):
+    """Pedidos de un día (UTC) por su estado actual; ingresos = subtotal de la línea."""
+    __tablename__ = 'ventas_dia_estado_pedido'
+    dia = db.Column(db.Date, primary_key=True)
+    estado = db.Column(db.String(20), primary_key=True)
+    unidades = db.Column(db.Integer, nullable=False, default=0)
+    ingresos = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    pedidos = db.Column(db.Integer, nullable=False, default=0)
+
+class MarcaAgregado(db.Model):
+    """Última factura (creado_en, id_factura) ya sumada a los agregados."""
+    __tablename__ = 'marcas_agregados'
+    nombre = db.Column(db.String(30), primary_key=True)
+    creado_en = db.Column(db.DateTime, nullable=False, default=datetime(1970, 1, 1))
+    id_factura = db.Column(db.Integer, nullable=False, default=0)
+    actualizado_en = db.Column(db.DateTime)
 
+class VersionDatos(db.Model):
+    """Contador que sube con cada cambio de un conjunto de datos compartido.
 
+    Los procesos que guardan una copia en memoria (el índice de búsqueda)
+    comparan su versión con ésta para saber si quedaron atrasados.
+    """
+    __tablename__ = 'versiones_datos'
+    nombre = db.Column(db.String(30), primary_key=True)
+    valor = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,58 @@
+# notificaciones.py
+from flask import current_app
+from flask_mail import Message
+from extensions import db, mail
+from models import Factura, FacturaItem, Usuario, Producto, VarianteProducto
+from tareas import tarea
+
+
+@tarea('correo_confirmacion')
+def enviar_confirmacion(payload):
+    """Correo al cliente con el resumen de su compra."""
+    factura = db.session.get(Factura, payload['id_factura'])
+    if factura is None:
+        return
+    usuario = db.session.get(Usuario, factura.id_usuario)
+    if usuario is None or not usuario.correo:
+        return
+
+    items = FacturaItem.query.filter_by(id_factura=factura.id_factura).order_by(FacturaItem.id_item).all()
+    lineas = [f"- {it.nombre_producto} (Talla {it.talla or '-'}) x{it.cantidad}: ${it.subtotal:,.2f}" for it in items]
+    cuerpo = (
+        f"Hola {usuario.nombre},\n\n"
+        f"Recibimos tu compra #{factura.id_factura}.\n\n"
+        + "\n".join(lineas)
+        + f"\n\nTotal: ${factura.total:,.2f}\nEnvío a: {factura.direccion_envio}\n\n"
+        "Gracias por comprar en FashionFusion."
+    )
+    mail.send(Message(
+        subject=f'Confirmación de tu compra #{factura.id_factura}',
+        recipients=[usuario.correo],
+        body=cuerpo,
+    ))
+
+
+@tarea('alerta_stock')
+def alertar_stock_bajo(payload):
+    """Avisa de las tallas que quedaron con poco stock tras una compra."""
+    ids = payload.get('productos') or []
+    if not ids:
+        return
+    minimo = current_app.config.get('STOCK_MINIMO', 3)
+    filas = (db.session.query(Producto.id_producto, Producto.nombre, VarianteProducto.talla, VarianteProducto.stock)
+             .join(VarianteProducto, VarianteProducto.id_producto == Producto.id_producto)
+             .filter(Producto.id_producto.in_(ids), VarianteProducto.stock <= minimo)
+             .order_by(Producto.id_producto, VarianteProducto.talla)
+             .all())
+    if not filas:
+        return
+
+    lineas = [f"- #{pid} {nombre} talla {talla}: quedan {stock}" for pid, nombre, talla, stock in filas]
+    current_app.logger.warning("Stock bajo:\n%s", "\n".join(lineas))
+    destino = current_app.config.get('ALERTAS_STOCK_CORREO')
+    if destino:
+        mail.send(Message(
+            subject='Alerta de stock bajo',
+            recipients=[destino],
+            body="Estas tallas quedaron con poco stock:\n\n" + "\n".join(lineas),
+        ))
@@ -0,0 +1,136 @@
+# paginacion.py
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from extensions import db
+from models import Producto
+
+POR_PAGINA_DEFECTO = 24
+POR_PAGINA_MAX = 60
+
+# Modo de orden -> (columna, descendente)
+ORDENES = {
+    'recientes': (Producto.creado_en, True),
+    'precio_asc': (Producto.precio_producto, False),
+    'precio_desc': (Producto.precio_producto, True),
+}
+ORDEN_DEFECTO = 'recientes'
+
+
+class Pagina:
+    """Resultado de una consulta paginada por cursor."""
+
+    def __init__(self, items, orden, por_pagina, cursor_siguiente=None, cursor_anterior=None):
+        self.items = items
+        self.orden = orden
+        self.por_pagina = por_pagina
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+
+    @property
+    def tiene_siguiente(self):
+        return self.cursor_siguiente is not None
+
+    @property
+    def tiene_anterior(self):
+        return self.cursor_anterior is not None
+
+
+# -----------------------
+# Cursores
+# -----------------------
+def _valor_orden(producto, orden):
+    columna, _ = ORDENES[orden]
+    return getattr(producto, columna.key)
+
+def codificar_cursor(valor, id_ref):
+    if isinstance(valor, datetime):
+        valor = valor.isoformat()
+    elif isinstance(valor, Decimal):
+        valor = str(valor)
+    raw = json.dumps([valor, id_ref], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decodificar_cursor(cursor, convertir):
+    """Devuelve (valor, id) o None si el cursor no es válido.
+
+    `convertir` reconstruye el valor de orden (datetime, Decimal, int...).
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        valor, id_ref = json.loads(raw)
+        return convertir(valor), int(id_ref)
+    except (ValueError, TypeError, InvalidOperation):
+        return None
+
+
+def condicion_keyset(columna, columna_id, valor, id_ref, desc):
+    """Filas estrictamente posteriores a (valor, id_ref) en el orden dado."""
+    if desc:
+        return db.or_(columna < valor, db.and_(columna == valor, columna_id < id_ref))
+    return db.or_(columna > valor, db.and_(columna == valor, columna_id > id_ref))
+
+
+def normalizar_por_pagina(valor):
+    try:
+        n = int(valor)
+    except (TypeError, ValueError):
+        return POR_PAGINA_DEFECTO
+    return max(1, min(n, POR_PAGINA_MAX))
+
+
+# -----------------------
+# Consulta paginada
+# -----------------------
+def paginar_productos(query=None, orden=ORDEN_DEFECTO, por_pagina=POR_PAGINA_DEFECTO,
+                      despues=None, antes=None):
+    """Pagina productos con cursores (valor de orden, id_producto).
+
+    Cada página cuesta una sola consulta con LIMIT sobre un índice compuesto,
+    así que el tiempo no depende del tamaño de la tabla.
+    """
+    if orden not in ORDENES:
+        orden = ORDEN_DEFECTO
+    por_pagina = normalizar_por_pagina(por_pagina)
+    columna, desc = ORDENES[orden]
+    query = query if query is not None else Producto.query
+
+    convertir = datetime.fromisoformat if orden == 'recientes' else Decimal
+    cursor = decodificar_cursor(antes, convertir)
+    hacia_atras = cursor is not None
+    if not hacia_atras:
+        cursor = decodificar_cursor(despues, convertir)
+
+    # Al retroceder se recorre el índice en sentido contrario y luego se invierte
+    desc_consulta = desc != hacia_atras
+    if cursor is not None:
+        valor, id_ref = cursor
+        query = query.filter(condicion_keyset(columna, Producto.id_producto, valor, id_ref, desc_consulta))
+
+    if desc_consulta:
+        query = query.order_by(columna.desc(), Producto.id_producto.desc())
+    else:
+        query = query.order_by(columna.asc(), Producto.id_producto.asc())
+
+    filas = query.limit(por_pagina + 1).all()
+    hay_mas = len(filas) > por_pagina
+    filas = filas[:por_pagina]
+    if hacia_atras:
+        filas.reverse()
+
+    def _cursor(p):
+        return codificar_cursor(_valor_orden(p, orden), p.id_producto)
+
+    siguiente = anterior = None
+    if filas:
+        if hacia_atras:
+            siguiente = _cursor(filas[-1])
+            anterior = _cursor(filas[0]) if hay_mas else None
+        else:
+            siguiente = _cursor(filas[-1]) if hay_mas else None
+            anterior = _cursor(filas[0]) if cursor is not None else None
+
+    return Pagina(filas, orden, por_pagina, siguiente, anterior)
@@ -0,0 +1,181 @@
+# pedidos.py
+from collections import defaultdict, deque
+from extensions import db
+from models import Factura, FacturaItem, Pedido
+
+POR_PAGINA_ADMIN = 50
+POR_PAGINA_HISTORIAL = 20
+ESTADOS_PEDIDO = ('pendiente', 'finalizado')
+LOTE_MIGRACION = 500
+
+
+class FiltrosPedidos:
+    """Filtros del tablero de pedidos: estado, usuario y texto del producto."""
+
+    def __init__(self, estado=None, usuario_id=None, q=None, id_producto=None):
+        self.estado = estado if estado in ESTADOS_PEDIDO else None
+        self.usuario_id = (usuario_id or '').strip() or None
+        self.q = (q or '').strip()[:100] or None
+        self.id_producto = id_producto
+
+    @classmethod
+    def desde_args(cls, args):
+        return cls(args.get('estado'), args.get('usuario_id'), args.get('q'),
+                   args.get('id_producto', type=int))
+
+    def condiciones(self, con_estado=True):
+        conds = []
+        if con_estado and self.estado:
+            conds.append(Pedido.estado == self.estado)
+        if self.usuario_id:
+            conds.append(Pedido.usuario_id == self.usuario_id)
+        if self.id_producto:
+            conds.append(Pedido.id_producto == self.id_producto)
+        if self.q:
+            conds.append(Pedido.producto.icontains(self.q, autoescape=True))
+        return conds
+
+    def como_args(self, **extra):
+        """Parámetros de URL para enlazar a otra página con los mismos filtros."""
+        args = {'estado': self.estado, 'usuario_id': self.usuario_id, 'q': self.q,
+                'id_producto': self.id_producto}
+        args.update(extra)
+        return {k: v for k, v in args.items() if v}
+
+
+def _despues(valor):
+    try:
+        return int(valor) if valor else None
+    except (TypeError, ValueError):
+        return None
+
+
+# -----------------------
+# Alta en el checkout
+# -----------------------
+def crear_pedidos_factura(id_factura, direccion_envio):
+    """Un pedido por línea de la factura, en un solo INSERT ... SELECT (sin commit)."""
+    tf, ti = Factura.__table__, FacturaItem.__table__
+    consulta = (db.select(db.func.coalesce(ti.c.nombre_producto, 'Producto'),
+                          db.func.coalesce(ti.c.talla, ''),
+                          db.literal(direccion_envio),
+                          tf.c.id_usuario,
+                          tf.c.id_factura,
+                          ti.c.id_item,
+                          ti.c.id_producto,
+                          tf.c.creado_en)
+                .select_from(ti.join(tf, tf.c.id_factura == ti.c.id_factura))
+                .where(ti.c.id_factura == id_factura)
+                .order_by(ti.c.id_item))
+    db.session.execute(Pedido.__table__.insert().from_select(
+        ['producto', 'talla', 'direccion', 'usuario_id', 'id_factura', 'id_item', 'id_producto', 'creado_en'],
+        consulta))
+
+
+# -----------------------
+# Consultas
+# -----------------------
+def pagina_pedidos(filtros, despues=None, por_pagina=POR_PAGINA_ADMIN):
+    """Pedidos del más reciente al más antiguo, por cursor sobre el id.
+
+    Devuelve (pedidos, cursor_siguiente). El cursor es el último id visto, así
+    que cada página es un recorrido corto de los índices (estado, id) o
+    (usuario_id, id) sin importar cuántos pedidos haya.
+    """
+    consulta = Pedido.query.filter(*filtros.condiciones())
+    despues = _despues(despues)
+    if despues is not None:
+        consulta = consulta.filter(Pedido.id < despues)
+
+    pedidos = consulta.order_by(Pedido.id.desc()).limit(por_pagina + 1).all()
+    siguiente = None
+    if len(pedidos) > por_pagina:
+        pedidos = pedidos[:por_pagina]
+        siguiente = pedidos[-1].id
+    return pedidos, siguiente
+
+
+def contar_por_estado(filtros):
+    """{estado: n} con una sola consulta agrupada (ignora el filtro de estado)."""
+    filas = db.session.execute(
+        db.select(Pedido.estado, db.func.count())
+        .where(*filtros.condiciones(con_estado=False))
+        .group_by(Pedido.estado)
+    ).all()
+    conteos = dict.fromkeys(ESTADOS_PEDIDO, 0)
+    conteos.update({estado: n for estado, n in filas})
+    return conteos
+
+
+def historial_pedidos(usuario_id, despues=None, estado=None, por_pagina=POR_PAGINA_HISTORIAL):
+    """Pedidos de un cliente, del más reciente al más antiguo, por cursor.
+
+    Devuelve (filas, cursor_siguiente). Cada fila trae los datos de su línea
+    de factura (cantidad, color, subtotal) en la misma consulta.
+    """
+    tp, ti = Pedido.__table__, FacturaItem.__table__
+    consulta = (db.select(tp.c.id, tp.c.estado, tp.c.id_factura, tp.c.creado_en, tp.c.direccion,
+                          db.func.coalesce(ti.c.nombre_producto, tp.c.producto).label('producto'),
+                          db.func.coalesce(ti.c.talla, tp.c.talla).label('talla'),
+                          ti.c.color, ti.c.cantidad, ti.c.subtotal)
+                .select_from(tp.outerjoin(ti, ti.c.id_item == tp.c.id_item))
+                .where(tp.c.usuario_id == str(usuario_id)))
+    if estado in ESTADOS_PEDIDO:
+        consulta = consulta.where(tp.c.estado == estado)
+    despues = _despues(despues)
+    if despues is not None:
+        consulta = consulta.where(tp.c.id < despues)
+
+    filas = db.session.execute(consulta.order_by(tp.c.id.desc()).limit(por_pagina + 1)).all()
+    siguiente = None
+    if len(filas) > por_pagina:
+        filas = filas[:por_pagina]
+        siguiente = filas[-1].id
+    return filas, siguiente
+
+
+# -----------------------
+# Migración de pedidos antiguos
+# -----------------------
+def migrar_pedidos():
+    """Enlaza los pedidos sin línea de factura con la que los originó.
+
+    Antes cada compra escribía, por línea, un FacturaItem y un Pedido con el
+    mismo nombre, talla, dirección y cliente, en el mismo orden. Se emparejan
+    por esos datos y por orden de id; los pedidos sin pareja quedan como
+    estaban. Devuelve (enlazados, sin_pareja).
+    """
+    tp, ti, tf = Pedido.__table__, FacturaItem.__table__, Factura.__table__
+    ya_enlazado = db.exists().where(tp.c.id_item == ti.c.id_item)
+    candidatos = defaultdict(deque)
+    for fila in db.session.execute(
+        db.select(ti.c.id_item, ti.c.id_factura, ti.c.id_producto, ti.c.nombre_producto, ti.c.talla,
+                  tf.c.id_usuario, tf.c.direccion_envio, tf.c.creado_en)
+        .select_from(ti.join(tf, tf.c.id_factura == ti.c.id_factura))
+        .where(~ya_enlazado)
+        .order_by(ti.c.id_item)
+    ):
+        clave = (fila.id_usuario, fila.nombre_producto or '', fila.talla or '', fila.direccion_envio)
+        candidatos[clave].append(fila)
+
+    cambios, sin_pareja = [], 0
+    for pedido in db.session.execute(
+        db.select(tp.c.id, tp.c.usuario_id, tp.c.producto, tp.c.talla, tp.c.direccion)
+        .where(tp.c.id_item.is_(None))
+        .order_by(tp.c.id)
+    ):
+        pendientes = candidatos.get((pedido.usuario_id, pedido.producto, pedido.talla or '', pedido.direccion))
+        if not pendientes:
+            sin_pareja += 1
+            continue
+        item = pendientes.popleft()
+        cambios.append({'p_id': pedido.id, 'p_factura': item.id_factura, 'p_item': item.id_item,
+                        'p_producto': item.id_producto, 'p_creado': item.creado_en})
+
+    actualizar = (tp.update().where(tp.c.id == db.bindparam('p_id'))
+                  .values(id_factura=db.bindparam('p_factura'), id_item=db.bindparam('p_item'),
+                          id_producto=db.bindparam('p_producto'), creado_en=db.bindparam('p_creado')))
+    for inicio in range(0, len(cambios), LOTE_MIGRACION):
+        db.session.execute(actualizar, cambios[inicio:inicio + LOTE_MIGRACION])
+    db.session.commit()
+    return len(cambios), sin_pareja
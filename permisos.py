@@ -0,0 +1,105 @@
+# permisos.py
+import threading
+import time
+from flask_login import current_user
+from extensions import db
+from models import Rol, RolPermiso
+
+# Permisos conocidos y su descripción. El orden fija el bit de cada uno:
+# sólo se agregan al final.
+PERMISOS = {
+    'productos.gestionar': 'Crear, editar, importar y exportar productos',
+    'usuarios.gestionar': 'Administrar usuarios',
+    'roles.gestionar': 'Administrar roles y sus permisos',
+    'pedidos.gestionar': 'Ver y actualizar todos los pedidos',
+    'facturas.ver_todas': 'Ver y descargar facturas de cualquier cliente',
+    'facturas.exportar': 'Exportación masiva de facturas',
+    'reportes.ver': 'Panel de ventas y métricas',
+}
+BITS = {nombre: 1 << i for i, nombre in enumerate(PERMISOS)}
+# Rol al que `flask conceder-permisos` da todo si no se indica otro
+ROL_INICIAL = 'admin'
+
+
+def bit(permiso):
+    """Bit del permiso; un nombre desconocido falla al definir la ruta, no al usarla."""
+    try:
+        return BITS[permiso]
+    except KeyError:
+        raise ValueError(f'Permiso desconocido: {permiso}') from None
+
+
+class RegistroPermisos:
+    """Máscara de bits de permisos por rol, compilada desde `rol_permisos`.
+
+    Comprobar un permiso es un AND sobre un entero en memoria. La tabla se
+    vuelve a leer cuando las rutas de roles la cambian y, para ver los
+    cambios hechos en otros procesos, cada PERMISOS_TTL segundos. Sólo lee:
+    los permisos iniciales los concede `flask conceder-permisos`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._mascaras = {}
+        self._compilado_en = None
+        self.ttl = 60
+
+    def init_app(self, app):
+        self.ttl = app.config.get('PERMISOS_TTL', 60)
+        app.jinja_env.globals['puede'] = puede
+
+    def _compilar(self):
+        filas = db.session.execute(db.select(RolPermiso.id_rol, RolPermiso.permiso)).all()
+        mascaras = {}
+        for id_rol, permiso in filas:
+            mascaras[id_rol] = mascaras.get(id_rol, 0) | BITS.get(permiso, 0)
+        with self._lock:
+            self._mascaras = mascaras
+            self._compilado_en = time.monotonic()
+
+    def refrescar(self):
+        self._compilado_en = None
+
+    def mascara(self, id_rol):
+        compilado = self._compilado_en
+        if compilado is None or (self.ttl and time.monotonic() - compilado > self.ttl):
+            self._compilar()
+        return self._mascaras.get(id_rol, 0)
+
+    def permisos_de(self, id_rol):
+        m = self.mascara(id_rol)
+        return {nombre for nombre, b in BITS.items() if m & b}
+
+
+registro_permisos = RegistroPermisos()
+
+
+def id_rol_inicial():
+    """id del rol ROL_INICIAL, o None si no existe."""
+    return db.session.execute(db.select(Rol.id_rol).where(Rol.nombre == ROL_INICIAL)).scalar()
+
+
+def hay_permisos():
+    return db.session.execute(db.select(RolPermiso.id_rol).limit(1)).first() is not None
+
+
+def guardar_permisos(id_rol, permisos):
+    """Reemplaza los permisos del rol (sin commit) y marca el registro para recompilar."""
+    id_rol = int(id_rol)
+    db.session.execute(db.delete(RolPermiso).where(RolPermiso.id_rol == id_rol))
+    validos = [p for p in PERMISOS if p in set(permisos)]
+    if validos:
+        db.session.execute(db.insert(RolPermiso), [{'id_rol': id_rol, 'permiso': p} for p in validos])
+    registro_permisos.refrescar()
+
+
+def tiene_permiso(usuario, permiso):
+    id_rol = getattr(usuario, 'id_rol', None)
+    if id_rol is None:
+        return False
+    return bool(registro_permisos.mascara(id_rol) & bit(permiso))
+
+
+def puede(*permisos):
+    """Para las plantillas: ¿el usuario actual tiene alguno de los permisos?"""
+    return any(tiene_permiso(current_user, p) for p in permisos)
@@ -0,0 +1,142 @@
+# precios.py
+from decimal import Decimal, ROUND_HALF_UP
+from flask import url_for
+from extensions import db
+from models import Producto, VarianteProducto
+from imagenes import imagen_url
+
+CENTAVO = Decimal('0.01')
+
+
+def _dinero(valor):
+    return Decimal(str(valor or 0)).quantize(CENTAVO, rounding=ROUND_HALF_UP)
+
+
+class LineaCotizada:
+    """Línea del carrito con precio y disponibilidad tomados de la base."""
+
+    def __init__(self, clave, item, producto=None, variante=None):
+        self.clave = clave
+        self.id_producto = item.get('id')
+        self.id_variante = item.get('id_variante')
+        self.talla = item.get('talla')
+        self.cantidad = int(item.get('cantidad', 1))
+        self.precio_carrito = _dinero(item.get('precio'))
+        self.producto = producto
+        self.variante = variante
+
+        if producto is None:
+            self.nombre = item.get('nombre')
+            self.precio = self.precio_carrito
+            self.stock = 0
+            self.motivo = 'Producto no disponible'
+            return
+
+        self.nombre = producto.nombre
+        if variante is not None:
+            precio = variante.precio if variante.precio is not None else producto.precio_producto
+            disponible = variante.disponibilidad == 'SI'
+            self.stock = variante.stock or 0
+        else:
+            precio = producto.precio_producto
+            disponible = producto.disponibilidad == 'SI'
+            self.stock = producto.stock or 0
+        self.precio = _dinero(precio)
+
+        if self.id_variante and variante is None:
+            self.motivo = f'La talla {self.talla} ya no existe'
+        elif not disponible or self.stock <= 0:
+            self.motivo = 'Agotado'
+        elif self.stock < self.cantidad:
+            self.motivo = f'Sólo quedan {self.stock}'
+        else:
+            self.motivo = None
+
+    @property
+    def disponible(self):
+        return self.motivo is None
+
+    @property
+    def precio_cambiado(self):
+        return self.precio != self.precio_carrito
+
+    @property
+    def subtotal(self):
+        return self.precio * self.cantidad
+
+    @property
+    def imagen(self):
+        if self.producto is None:
+            return url_for('static', filename='img/no-image.png')
+        return imagen_url(self.producto, 'thumb')
+
+
+class ResumenCarrito:
+    """Carrito cotizado: líneas, totales exactos y problemas detectados."""
+
+    def __init__(self, lineas):
+        self.lineas = lineas
+
+    def __iter__(self):
+        return iter(self.lineas)
+
+    def __len__(self):
+        return len(self.lineas)
+
+    @property
+    def disponibles(self):
+        return [l for l in self.lineas if l.disponible]
+
+    @property
+    def no_disponibles(self):
+        return [l for l in self.lineas if not l.disponible]
+
+    @property
+    def precios_cambiados(self):
+        return [l for l in self.lineas if l.producto is not None and l.precio_cambiado]
+
+    @property
+    def cantidad_articulos(self):
+        return sum(l.cantidad for l in self.disponibles)
+
+    @property
+    def total(self):
+        # Sólo suman las líneas que se pueden comprar
+        return sum((l.subtotal for l in self.disponibles), Decimal('0.00'))
+
+    @property
+    def listo_para_pagar(self):
+        return bool(self.lineas) and not self.no_disponibles and not self.precios_cambiados
+
+
+def cotizar_carrito(cart):
+    """Cotiza el carrito ({clave: línea}) con una sola consulta.
+
+    Productos y variantes de todas las líneas se leen juntos (LEFT JOIN con
+    IN), así que el número de consultas no depende del tamaño del carrito.
+    """
+    if not cart:
+        return ResumenCarrito([])
+
+    ids_producto = {int(item['id']) for item in cart.values()}
+    ids_variante = {int(item['id_variante']) for item in cart.values() if item.get('id_variante')}
+
+    consulta = db.session.query(Producto, VarianteProducto).filter(Producto.id_producto.in_(ids_producto))
+    if ids_variante:
+        consulta = consulta.outerjoin(VarianteProducto, db.and_(
+            VarianteProducto.id_producto == Producto.id_producto,
+            VarianteProducto.id_variante.in_(ids_variante),
+        ))
+    else:
+        consulta = consulta.outerjoin(VarianteProducto, db.false())
+
+    productos, variantes = {}, {}
+    for producto, variante in consulta:
+        productos[producto.id_producto] = producto
+        if variante is not None:
+            variantes[variante.id_variante] = variante
+
+    return ResumenCarrito([
+        LineaCotizada(clave, item, productos.get(int(item['id'])), variantes.get(item.get('id_variante')))
+        for clave, item in cart.items()
+    ])
@@ -7,6 +7,7 @@ from .rol import rol_bp
 from .usuarios import usuarios_bp
 from .home import home_bp
 from .resenas import resenas_bp
+from .reportes import reportes_bp
 
 # Lista de blueprints disponibles (opcional, útil para registro dinámico)
 __all__ = [
@@ -18,5 +19,6 @@ __all__ = [
     'rol_bp',
     'usuarios_bp',
     'home_bp',
-    'resenas_bp'
+    'resenas_bp',
+    'reportes_bp'
 ]
\ No newline at end of file
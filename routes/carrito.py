@@ -1,7 +1,13 @@
+import uuid
 from decimal import Decimal
-from flask import Blueprint, request, session, flash, redirect, url_for, render_template
+from flask import Blueprint, request, flash, redirect, url_for, render_template, jsonify
 from flask_login import login_required, current_user
 from models import Producto
+from inventario import StockInsuficiente, cantidades_por_producto, buscar_variante, tiene_variantes
+from cache import cache_paginas
+from precios import cotizar_carrito
+from compras import registrar_compra, factura_por_clave, normalizar_clave
+from carrito_store import carritos, carrito_actual, ErrorCarrito
 
 carrito_bp = Blueprint('carrito', __name__)
 
@@ -9,7 +15,7 @@ carrito_bp = Blueprint('carrito', __name__)
 # Helpers
 # -----------------------
 def _get_cart():
-    return session.get("cart", {})
+    return carritos.obtener(carrito_actual())
 
 def format_currency(value, symbol='$'):
     try:
@@ -19,42 +25,51 @@ def format_currency(value, symbol='$'):
     return f"{symbol}{v:,.2f}"
 
 
-# -----------------------
-# Rutas del carrito
-# -----------------------
-
-@carrito_bp.route('/cart/add/<int:product_id>', methods=['POST'])
-@login_required
-def add_to_cart(product_id):
-    producto = Producto.query.get_or_404(product_id)
-    talla = request.form.get('talla') or request.form.get('size')
-
+def _agregar_al_carrito(producto, talla, color=None, cantidad=1):
+    """Suma la talla elegida al carrito. Devuelve (clave, None) o (None, mensaje de error)."""
     if not talla:
-        flash('Por favor selecciona una talla antes de añadir al carrito.', 'warning')
-        return redirect(url_for('productos.catalogo'))
+        return None, 'Por favor selecciona una talla antes de añadir al carrito.'
 
-    cart = _get_cart()
-    key = f"{product_id}:{talla}"
+    # Variante (SKU) de la talla elegida; los productos sin migrar no tienen
+    variante = buscar_variante(producto.id_producto, talla, color)
+    if variante is None and tiene_variantes(producto.id_producto):
+        return None, f'La talla {talla} de {producto.nombre} está agotada.'
+
+    key = f"{producto.id_producto}:{talla}"
 
-    precio_attr = getattr(producto, 'precio_producto', None) or getattr(producto, 'precio', 0)
+    precio_attr = variante.precio_efectivo if variante else (getattr(producto, 'precio_producto', None) or getattr(producto, 'precio', 0))
     try:
         precio_float = float(precio_attr)
     except Exception:
         precio_float = 0.0
 
-    if key in cart:
-        cart[key]['cantidad'] = int(cart[key].get('cantidad', 0)) + 1
-    else:
-        cart[key] = {
-            'id': product_id,
+    try:
+        carritos.agregar(carrito_actual(), key, {
+            'id': producto.id_producto,
+            'id_variante': variante.id_variante if variante else None,
             'nombre': producto.nombre,
             'precio': precio_float,
-            'cantidad': 1,
             'talla': talla
-        }
+        }, cantidad)
+    except ErrorCarrito:
+        return None, f'No se pudo agregar {producto.nombre} al carrito. Inténtalo de nuevo.'
+    return key, None
 
-    session['cart'] = cart
-    session.modified = True
+
+# -----------------------
+# Rutas del carrito
+# -----------------------
+
+@carrito_bp.route('/cart/add/<int:product_id>', methods=['POST'])
+@login_required
+def add_to_cart(product_id):
+    producto = Producto.query.get_or_404(product_id)
+    talla = request.form.get('talla') or request.form.get('size')
+
+    key, error = _agregar_al_carrito(producto, talla, request.form.get('color'))
+    if error:
+        flash(error, 'warning')
+        return redirect(request.referrer or url_for('productos.catalogo'))
 
     flash(f"{producto.nombre} agregado al carrito (Talla {talla})", 'success')
     return redirect(url_for('carrito.cart'))
@@ -63,31 +78,20 @@ def add_to_cart(product_id):
 @carrito_bp.route('/cart')
 @login_required
 def cart():
-    cart_dict = _get_cart()
-    carrito = []
-    total = Decimal('0.00')
-
-    for key, item in cart_dict.items():
-        producto = Producto.query.get(item.get('id'))
-        imagen_src = url_for('static', filename='img/' + producto.foto_producto) if producto and producto.foto_producto else url_for('static', filename='no-image.png')
+    cid = carrito_actual()
+    resumen = cotizar_carrito(carritos.obtener(cid))
 
-        precio = Decimal(str(item.get('precio', 0)))
-        cantidad = int(item.get('cantidad', 1))
-        subtotal = precio * cantidad
-        total += subtotal
+    # Los precios mostrados pasan a ser los del carrito
+    cambiados = resumen.precios_cambiados
+    for linea in cambiados:
+        carritos.actualizar_precio(cid, linea.clave, linea.precio)
+        linea.precio_carrito = linea.precio
+    if cambiados:
+        flash('Algunos precios de tu carrito se actualizaron.', 'info')
 
-        carrito.append({
-            'key': key,
-            'id': item.get('id'),
-            'nombre': item.get('nombre'),
-            'precio': float(precio),
-            'cantidad': cantidad,
-            'talla': item.get('talla'),
-            'imagen': imagen_src,
-            'subtotal': float(subtotal)
-        })
-
-    return render_template('cart.html', carrito=carrito, total=float(total))
+    # Clave nueva por cada vez que se muestra el carrito: un doble envío del
+    # mismo formulario no genera dos compras
+    return render_template('cart.html', resumen=resumen, clave_idempotencia=uuid.uuid4().hex)
 
 
 @carrito_bp.route('/cart/update', methods=['POST'])
@@ -95,19 +99,12 @@ def cart():
 def update_cart():
     key = request.form.get('key')
     action = request.form.get('action')
-    cart = _get_cart()
+    delta = {'increase': 1, 'decrease': -1}.get(action, 0)
 
-    if not key or key not in cart:
+    if not key or not carritos.cambiar_cantidad(carrito_actual(), key, delta):
         flash('Elemento no encontrado en el carrito.', 'warning')
         return redirect(url_for('carrito.cart'))
 
-    if action == 'increase':
-        cart[key]['cantidad'] += 1
-    elif action == 'decrease':
-        cart[key]['cantidad'] = max(1, cart[key]['cantidad'] - 1)
-
-    session['cart'] = cart
-    session.modified = True
     return redirect(url_for('carrito.cart'))
 
 
@@ -115,12 +112,8 @@ def update_cart():
 @login_required
 def remove_from_cart():
     key = request.form.get('key')
-    cart = _get_cart()
 
-    if key in cart:
-        del cart[key]
-        session['cart'] = cart
-        session.modified = True
+    if key and carritos.quitar(carrito_actual(), key):
         flash("Producto eliminado del carrito", "success")
     else:
         flash("No se encontró el producto en el carrito", "warning")
@@ -131,8 +124,7 @@ def remove_from_cart():
 @carrito_bp.route('/cart/clear')
 @login_required
 def clear_cart():
-    session.pop("cart", None)
-    session.modified = True
+    carritos.vaciar(carrito_actual())
     flash("Carrito limpiado.", "info")
     return redirect(url_for("carrito.cart"))
 
@@ -140,51 +132,133 @@ def clear_cart():
 @carrito_bp.route('/cart/checkout', methods=['POST'])
 @login_required
 def cart_checkout():
-    from models import Factura, FacturaItem, Pedido, db
+    usuario_id = getattr(current_user, 'id_usuario', None) or current_user.get_id()
 
-    cart = session.get('cart', {})
+    # Un envío repetido con la misma clave devuelve la factura original
+    clave = normalizar_clave(request.headers.get('Idempotency-Key') or request.form.get('idempotency_key'))
+    existente = factura_por_clave(usuario_id, clave)
+    if existente is not None:
+        return redirect(url_for('factura.invoice_detail', factura_id=existente))
+
+    cart = _get_cart()
     if not cart:
         flash('Tu carrito está vacío.', 'warning')
         return redirect(url_for('carrito.cart'))
 
-    usuario_id = getattr(current_user, 'id_usuario', None) or current_user.get_id()
+    # Precios y disponibilidad se validan contra la base, no contra el carrito
+    resumen = cotizar_carrito(cart)
+    if not resumen.listo_para_pagar:
+        flash('Algunos productos de tu carrito cambiaron de precio o ya no están disponibles. Revísalo antes de pagar.', 'warning')
+        return redirect(url_for('carrito.cart'))
+
     direccion_envio = request.form.get('direccion_envio', '').strip()
-    total = sum(float(item['precio']) * int(item['cantidad']) for item in cart.values())
-
-    factura = Factura(
-        id_usuario=str(usuario_id),
-        direccion_envio=direccion_envio,
-        total=total,
-        estado='pagada'
-    )
-    db.session.add(factura)
-    db.session.commit()
-
-    for item in cart.values():
-        subtotal = float(item['precio']) * int(item['cantidad'])
-        factura_item = FacturaItem(
-            id_factura=factura.id_factura,
-            id_producto=item['id'],
-            nombre_producto=item['nombre'],
-            talla=item.get('talla', ''),
-            cantidad=item['cantidad'],
-            precio_unitario=item['precio'],
-            subtotal=subtotal
-        )
-        db.session.add(factura_item)
-
-        pedido = Pedido(
-            producto=item['nombre'],
-            talla=item.get('talla', ''),
-            direccion=direccion_envio,
-            usuario_id=usuario_id
-        )
-        db.session.add(pedido)
-
-    db.session.commit()
-
-    session.pop('cart', None)
-    session.modified = True
+
+    # Reserva de inventario, factura, líneas y pedidos en una sola transacción
+    try:
+        id_factura = registrar_compra(usuario_id, direccion_envio, cart, resumen, clave)
+    except StockInsuficiente as e:
+        flash(e.mensaje(), 'danger')
+        return redirect(url_for('carrito.cart'))
+
+    for id_producto in cantidades_por_producto(cart):
+        cache_paginas.invalidar_producto(id_producto)
+    cache_paginas.invalidar_catalogo()  # tallas agotadas
+
+    carritos.vaciar(carrito_actual())
 
     flash('Compra realizada con éxito. Tu factura y pedido han sido generados.', 'success')
-    return redirect(url_for('factura.invoice_detail', factura_id=factura.id_factura))
+    return redirect(url_for('factura.invoice_detail', factura_id=id_factura))
+
+
+# -----------------------
+# API JSON del carrito
+# -----------------------
+def _linea_json(linea):
+    return {
+        'clave': linea.clave,
+        'id': linea.id_producto,
+        'nombre': linea.nombre,
+        'talla': linea.talla,
+        'cantidad': linea.cantidad,
+        'precio': str(linea.precio),
+        'subtotal': str(linea.subtotal),
+        'imagen': linea.imagen,
+        'disponible': linea.disponible,
+        'motivo': linea.motivo,
+    }
+
+def _totales_json(resumen):
+    return {
+        'total': str(resumen.total),
+        'lineas': len(resumen),
+        'articulos': resumen.cantidad_articulos,
+        'listo_para_pagar': resumen.listo_para_pagar,
+    }
+
+def _respuesta_api(clave=None, status=200):
+    """Línea modificada (None si ya no está) y totales del carrito."""
+    resumen = cotizar_carrito(_get_cart())
+    linea = next((l for l in resumen if l.clave == clave), None) if clave else None
+    return jsonify({
+        'clave': clave,
+        'linea': _linea_json(linea) if linea else None,
+        'totales': _totales_json(resumen),
+    }), status
+
+def _cantidad(valor, defecto=None):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return defecto
+
+
+@carrito_bp.route('/api/cart')
+@login_required
+def api_cart():
+    resumen = cotizar_carrito(_get_cart())
+    return jsonify({
+        'lineas': [_linea_json(l) for l in resumen],
+        'totales': _totales_json(resumen),
+    })
+
+
+@carrito_bp.route('/api/cart/lines', methods=['POST'])
+@login_required
+def api_add():
+    datos = request.get_json(silent=True) or request.form
+    producto = Producto.query.get_or_404(_cantidad(datos.get('product_id'), 0))
+    cantidad = _cantidad(datos.get('cantidad'), 1)
+    if cantidad < 1:
+        return jsonify({'error': 'Cantidad inválida.'}), 400
+
+    key, error = _agregar_al_carrito(producto, datos.get('talla'), datos.get('color'), cantidad)
+    if error:
+        return jsonify({'error': error}), 409
+    return _respuesta_api(key, 201)
+
+
+@carrito_bp.route('/api/cart/lines/<clave>', methods=['PATCH'])
+@login_required
+def api_update(clave):
+    """Fija `cantidad` o suma `delta` a la línea."""
+    datos = request.get_json(silent=True) or request.form
+    cantidad = _cantidad(datos.get('cantidad'))
+    delta = _cantidad(datos.get('delta'))
+    if cantidad is not None and cantidad >= 1:
+        ok = carritos.fijar_cantidad(carrito_actual(), clave, cantidad)
+    elif delta is not None:
+        ok = carritos.cambiar_cantidad(carrito_actual(), clave, delta)
+    else:
+        return jsonify({'error': 'Indica cantidad (>= 1) o delta.'}), 400
+
+    if not ok:
+        return jsonify({'error': 'Elemento no encontrado en el carrito.'}), 404
+    return _respuesta_api(clave)
+
+
+@carrito_bp.route('/api/cart/lines/<clave>', methods=['DELETE'])
+@login_required
+def api_remove(clave):
+    if not carritos.quitar(carrito_actual(), clave):
+        return jsonify({'error': 'No se encontró el producto en el carrito.'}), 404
+    return _respuesta_api(clave)
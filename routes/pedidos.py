@@ -1,40 +1,60 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask_login import login_required, current_user
 from models import Pedido, db
+from decorators import permiso_requerido
+from pedidos import FiltrosPedidos, pagina_pedidos, contar_por_estado, historial_pedidos, ESTADOS_PEDIDO
+from ventas import cambiar_estado_pedidos
 
 pedidos_bp = Blueprint('pedidos', __name__)
 
+
+def _volver():
+    # Tras una acción se vuelve a la misma página y filtros del tablero
+    destino = request.form.get('volver', '')
+    if destino.startswith(url_for('pedidos.admin_pedidos')):
+        return redirect(destino)
+    return redirect(url_for('pedidos.admin_pedidos'))
+
 # Vista principal de pedidos
 @pedidos_bp.route('/admin/pedidos')
+@permiso_requerido('pedidos.gestionar')
 def admin_pedidos():
-    pedidos = Pedido.query.all()
-    return render_template('admin_pedidos.html', pedidos=pedidos)
+    filtros = FiltrosPedidos.desde_args(request.args)
+    pedidos, siguiente = pagina_pedidos(filtros, request.args.get('despues'))
+    return render_template('admin_pedidos.html', pedidos=pedidos, siguiente=siguiente,
+                           primera=not request.args.get('despues'), filtros=filtros,
+                           conteos=contar_por_estado(filtros))
 
 # Cambiar estado de un pedido
 @pedidos_bp.route('/admin/pedidos/estado/<int:pedido_id>', methods=['POST'])
+@permiso_requerido('pedidos.gestionar')
 def cambiar_estado_pedido(pedido_id):
     nuevo_estado = request.form.get('estado')
     pedido = Pedido.query.get_or_404(pedido_id)
 
-    if nuevo_estado in ['pendiente', 'finalizado']:
-        pedido.estado = nuevo_estado
+    if nuevo_estado in ESTADOS_PEDIDO:
+        # Mueve también el pedido en el desglose de ventas por estado
+        cambiar_estado_pedidos(Pedido.id == pedido.id, nuevo_estado)
         db.session.commit()
         flash(f"Estado del pedido actualizado a {nuevo_estado}.", "success")
     else:
         flash("Estado inválido.", "warning")
 
-    return redirect(url_for('pedidos.admin_pedidos'))
+    return _volver()
 
 # Eliminar un pedido individual
 @pedidos_bp.route('/admin/pedidos/eliminar/<int:pedido_id>', methods=['POST'])
+@permiso_requerido('pedidos.gestionar')
 def eliminar_pedido(pedido_id):
     pedido = Pedido.query.get_or_404(pedido_id)
     db.session.delete(pedido)
     db.session.commit()
     flash("Pedido eliminado correctamente.", "success")
-    return redirect(url_for('pedidos.admin_pedidos'))
+    return _volver()
 
 # Eliminar todos los pedidos
 @pedidos_bp.route('/admin/pedidos/eliminar_todos', methods=['POST'])
+@permiso_requerido('pedidos.gestionar')
 def eliminar_todos_pedidos():
     try:
         db.session.query(Pedido).delete()
@@ -44,3 +64,14 @@ def eliminar_todos_pedidos():
         db.session.rollback()
         flash("Error al eliminar los pedidos: " + str(e), "danger")
     return redirect(url_for('pedidos.admin_pedidos'))
+
+# Historial de pedidos del usuario
+@pedidos_bp.route('/mis-pedidos')
+@login_required
+def mis_pedidos():
+    usuario_id = getattr(current_user, 'id_usuario', None) or current_user.get_id()
+    estado = request.args.get('estado')
+    estado = estado if estado in ESTADOS_PEDIDO else None
+    pedidos, siguiente = historial_pedidos(usuario_id, despues=request.args.get('despues'), estado=estado)
+    return render_template('mis_pedidos.html', pedidos=pedidos, siguiente=siguiente, estado=estado,
+                           estados=ESTADOS_PEDIDO, primera=not request.args.get('despues'))
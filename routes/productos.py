@@ -1,29 +1,78 @@
 from flask import (
     Blueprint, render_template, request, redirect, url_for, flash,
-    abort, current_app, Response
+    abort, current_app, Response, send_file, stream_with_context
 )
 from werkzeug.utils import secure_filename
 import datetime
 import os
 from extensions import db
-from models import Producto
-from decorators import role_required  # asumes que este decorador existe y usa session
+from models import Producto, VarianteProducto
+from paginacion import paginar_productos
+from filtros import FiltrosCatalogo, aplicar_filtros, contar_facetas
+from busqueda import indice_productos, marcar_cambio_catalogo, refrescar_indice
+from cache import cache_paginas, cache_pagina
+from imagenes import generar_derivados, foto_de_producto, olvidar_foto, ruta_estatica, enviar_imagen, archivo_estatico
+from valoraciones import resumenes_de, paginar_resenas
+from inventario import tallas_disponibles, sincronizar_stock_producto
+from catalogo_masivo import importar_productos, ruta_reporte, EXPORTADORES, FORMATOS, LECTORES
+from decorators import permiso_requerido
 
 productos_bp = Blueprint("productos", __name__, url_prefix="/productos")
 
+# -----------------------
+# Helpers
+# -----------------------
+def _guardar_variantes(producto, form):
+    """Aplica los cambios del bloque de variantes del formulario de edición."""
+    for variante in producto.variantes:
+        prefijo = f'variante_{variante.id_variante}_'
+        if form.get(prefijo + 'eliminar'):
+            db.session.delete(variante)
+            continue
+        try:
+            variante.stock = max(0, int(form.get(prefijo + 'stock', variante.stock)))
+        except ValueError:
+            pass
+        if prefijo + 'precio' in form:
+            precio = form[prefijo + 'precio'].strip()
+            try:
+                variante.precio = float(precio) if precio else None
+            except ValueError:
+                pass
+        variante.disponibilidad = form.get(prefijo + 'disponibilidad', variante.disponibilidad)
+
+    nueva_talla = form.get('nueva_talla', '').strip()
+    if nueva_talla:
+        try:
+            nuevo_stock = max(0, int(form.get('nuevo_stock', 0)))
+        except ValueError:
+            nuevo_stock = 0
+        nuevo_precio = form.get('nuevo_precio', '').strip()
+        try:
+            nuevo_precio = float(nuevo_precio) if nuevo_precio else None
+        except ValueError:
+            nuevo_precio = None
+        producto.variantes.append(VarianteProducto(
+            talla=nueva_talla,
+            color=form.get('nuevo_color', '').strip() or producto.color,
+            stock=nuevo_stock,
+            precio=nuevo_precio,
+        ))
+
+
 # -----------------------
 # RUTAS ADMIN (CRUD)
 # -----------------------
 
 @productos_bp.route('/admin/productos')
-@role_required(1)
+@permiso_requerido('productos.gestionar')
 def admin_products():
     productos = Producto.query.order_by(Producto.creado_en.desc()).all()
     return render_template('admin_products.html', productos=productos)
 
 
 @productos_bp.route('/admin/productos/new', methods=['GET', 'POST'])
-@role_required(1)
+@permiso_requerido('productos.gestionar')
 def admin_create_product():
     if request.method == 'POST':
         nombre = request.form.get('nombre', '').strip()
@@ -45,6 +94,7 @@ def admin_create_product():
 
         # FOTO — si el admin sube archivo, lo guardas en static/img
         foto_filename = None
+        foto_derivados = None
         if 'foto_producto' in request.files:
             f = request.files['foto_producto']
             if f and f.filename:
@@ -53,6 +103,7 @@ def admin_create_product():
                 os.makedirs(upload_path, exist_ok=True)
                 f.save(os.path.join(upload_path, filename))
                 foto_filename = filename  # solo guardamos el nombre
+                foto_derivados = generar_derivados(current_app.static_folder, filename)
 
         nuevo = Producto(
             nombre=nombre,
@@ -62,12 +113,21 @@ def admin_create_product():
             precio_producto=precio,
             disponibilidad=disponibilidad,
             stock=stock,
-            foto_producto=foto_filename
+            foto_producto=foto_filename,
+            foto_derivados=foto_derivados
         )
+        # Variante inicial con la talla y el stock del formulario
+        if talla:
+            nuevo.variantes.append(VarianteProducto(talla=talla, stock=stock, disponibilidad=disponibilidad))
 
         db.session.add(nuevo)
         try:
+            marcar_cambio_catalogo()
             db.session.commit()
+            # Puede quedar memorizado un "sin foto" de antes de existir el id
+            olvidar_foto(nuevo.id_producto)
+            indice_productos.actualizar(nuevo)
+            cache_paginas.invalidar_catalogo()
             flash('Producto creado con éxito', 'success')
         except Exception as e:
             db.session.rollback()
@@ -79,7 +139,7 @@ def admin_create_product():
 
 
 @productos_bp.route('/admin/productos/edit/<int:id_producto>', methods=['GET', 'POST'])
-@role_required(1)
+@permiso_requerido('productos.gestionar')
 def admin_edit_product(id_producto):
     producto = Producto.query.get_or_404(id_producto)
 
@@ -101,6 +161,12 @@ def admin_edit_product(id_producto):
         except:
             pass
 
+        # Con variantes, el stock del producto es la suma del de sus tallas
+        _guardar_variantes(producto, request.form)
+        db.session.flush()
+        if producto.variantes.count():
+            sincronizar_stock_producto(id_producto)
+
         # Si suben nueva foto, reemplaza archivo
         if 'foto_producto' in request.files:
             f = request.files['foto_producto']
@@ -112,9 +178,15 @@ def admin_edit_product(id_producto):
                 os.makedirs(upload_path, exist_ok=True)
                 f.save(os.path.join(upload_path, filename))
                 producto.foto_producto = filename  
+                producto.foto_derivados = generar_derivados(current_app.static_folder, filename)
 
         try:
+            marcar_cambio_catalogo()
             db.session.commit()
+            indice_productos.actualizar(producto)
+            cache_paginas.invalidar_catalogo()
+            cache_paginas.invalidar_producto(id_producto)
+            olvidar_foto(id_producto)
             flash('Producto actualizado', 'success')
         except Exception as e:
             db.session.rollback()
@@ -122,15 +194,66 @@ def admin_edit_product(id_producto):
 
         return redirect(url_for('productos.admin_products'))
 
-    return render_template('product_form.html', action='Editar', producto=producto)
+    variantes = producto.variantes.order_by(VarianteProducto.talla).all()
+    return render_template('product_form.html', action='Editar', producto=producto, variantes=variantes)
+
+# -----------------------
+# Importación / exportación masiva
+# -----------------------
+@productos_bp.route('/admin/productos/importar', methods=['GET', 'POST'])
+@permiso_requerido('productos.gestionar')
+def admin_importar_productos():
+    if request.method == 'GET':
+        return render_template('admin_productos_importar.html', resultado=None)
+
+    archivo = request.files.get('archivo')
+    if not archivo or not archivo.filename:
+        flash('Selecciona un archivo CSV o JSONL', 'warning')
+        return redirect(url_for('productos.admin_importar_productos'))
+    formato = 'jsonl' if archivo.filename.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+    if request.form.get('formato') in LECTORES:
+        formato = request.form['formato']
+
+    resultado = importar_productos(archivo.stream, formato)
+    current_app.logger.info("Importación de productos: %s creados, %s actualizados, %s errores en %.1fs",
+                            resultado.creados, resultado.actualizados, resultado.errores, resultado.segundos)
+    return render_template('admin_productos_importar.html', resultado=resultado,
+                           reporte=resultado.reporte and os.path.basename(resultado.reporte))
+
+
+@productos_bp.route('/admin/productos/importar/reporte/<nombre>')
+@permiso_requerido('productos.gestionar')
+def admin_reporte_importacion(nombre):
+    ruta = ruta_reporte(nombre)
+    if ruta is None:
+        abort(404)
+    return send_file(ruta, mimetype='text/csv', as_attachment=True, download_name='errores_importacion.csv')
+
+
+@productos_bp.route('/admin/productos/exportar')
+@permiso_requerido('productos.gestionar')
+def admin_exportar_productos():
+    formato = request.args.get('formato', 'csv')
+    if formato not in EXPORTADORES:
+        abort(400)
+    response = Response(stream_with_context(EXPORTADORES[formato]()), mimetype=FORMATOS[formato])
+    response.headers['Content-Disposition'] = f'attachment; filename=productos.{formato}'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 
 @productos_bp.route('/admin/productos/delete/<int:id_producto>', methods=['POST'])
-@role_required(1)
+@permiso_requerido('productos.gestionar')
 def admin_delete_product(id_producto):
     producto = Producto.query.get_or_404(id_producto)
     db.session.delete(producto)
     try:
+        marcar_cambio_catalogo()
         db.session.commit()
+        indice_productos.eliminar(id_producto)
+        cache_paginas.invalidar_catalogo()
+        cache_paginas.invalidar_producto(id_producto)
+        olvidar_foto(id_producto)
         flash('Producto eliminado', 'success')
     except Exception as e:
         db.session.rollback()
@@ -139,31 +262,29 @@ def admin_delete_product(id_producto):
 
 
 # ------------------------------------------------
-# NUEVA RUTA PARA SERVIR IMÁGENES DESDE EL BLOB
+# SERVIR IMÁGENES DE PRODUCTO
 # ------------------------------------------------
 @productos_bp.route('/imagen/<int:pid>')
 def imagen(pid):
-    producto = Producto.query.get_or_404(pid)
+    foto = foto_de_producto(pid)
+    if foto is None:
+        abort(404)
 
-    if producto.foto_producto is None:
-        return "", 404
+    foto_producto, derivados = foto
+    if foto_producto:
+        formato = 'webp' if request.args.get('formato') == 'webp' else 'jpg'
+        relativa, huella = ruta_estatica(foto_producto, derivados, request.args.get('tamano'), formato)
+    else:
+        relativa, huella = 'img/no-image.png', None
 
-    # Si la imagen ES BLOB (bytes)
-    if isinstance(producto.foto_producto, bytes):
-        return Response(producto.foto_producto, mimetype="image/jpeg")
+    ruta = archivo_estatico(relativa)
+    if ruta is None or not os.path.isfile(ruta):
+        abort(404)
 
-    # Si es ruta de archivo
-    ruta = os.path.join(current_app.static_folder, producto.foto_producto)
+    # Sólo la URL que lleva la huella del contenido (?v=...) es inmutable
+    inmutable = huella is not None and request.args.get('v') == huella
+    return enviar_imagen(relativa, inmutable=inmutable)
 
-    if os.path.isfile(ruta):
-        with open(ruta, "rb") as f:
-            return Response(f.read(), mimetype="image/jpeg")
-
-    # Imagen por defecto
-    default_path = os.path.join(current_app.static_folder, "no-image.png")
-    with open(default_path, "rb") as f:
-        return Response(f.read(), mimetype="image/png")
-    
 @productos_bp.route('/debug/imagenes')
 def debug_imagenes():
     productos = Producto.query.all()
@@ -185,17 +306,53 @@ def debug_imagenes():
 # -----------------------
 
 @productos_bp.route("/catalogo")
+@cache_pagina(lambda: ['catalogo'])
 def catalogo():
-    productos = Producto.query.all()
-    return render_template("catalogo.html", products=productos)
+    filtros = FiltrosCatalogo.desde_args(request.args)
+    pagina = paginar_productos(
+        query=aplicar_filtros(Producto.query, filtros),
+        orden=request.args.get('orden', 'recientes'),
+        por_pagina=request.args.get('por_pagina'),
+        despues=request.args.get('despues'),
+        antes=request.args.get('antes'),
+    )
+    return render_template(
+        "catalogo.html",
+        products=pagina.items,
+        pagina=pagina,
+        filtros=filtros,
+        facetas=contar_facetas(filtros),
+        resumenes=resumenes_de([p.id_producto for p in pagina.items]),
+        tallas=tallas_disponibles([p.id_producto for p in pagina.items]),
+    )
+
+
+@productos_bp.route("/buscar")
+def buscar():
+    q = request.args.get('q', '').strip()
+    productos = []
+    if q:
+        refrescar_indice()
+        ids = indice_productos.buscar(q)
+        if ids:
+            # Una sola consulta IN y se respeta el orden del ranking
+            por_id = {p.id_producto: p for p in Producto.query.filter(Producto.id_producto.in_(ids))}
+            productos = [por_id[i] for i in ids if i in por_id]
+    return render_template("buscar.html", products=productos, q=q)
 
 
 @productos_bp.route("/<int:pid>")
+@cache_pagina(lambda pid: [f'producto:{pid}'])
 def detalle(pid):
     product = Producto.query.get_or_404(pid)
-    return render_template("productos.html", product=product)
+    return render_template("productos.html", product=product,
+                           tallas=tallas_disponibles([pid]).get(pid, []))
 
 @productos_bp.route('/detalle/<int:id_producto>')
+@cache_pagina(lambda id_producto: [f'producto:{id_producto}'])
 def detalle_producto(id_producto):
     producto = Producto.query.get_or_404(id_producto)
-    return render_template('detalle_producto.html', product=producto)
\ No newline at end of file
+    resumen = resumenes_de([id_producto]).get(id_producto)
+    resenas, siguiente = paginar_resenas(id_producto)
+    return render_template('detalle_producto.html', product=producto, resumen=resumen,
+                           resenas=resenas, siguiente=siguiente)
\ No newline at end of file
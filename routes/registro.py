@@ -4,6 +4,7 @@ from extensions import db
 from models import Usuario, Rol
 from flask_login import login_user, logout_user
 from werkzeug.security import check_password_hash, generate_password_hash
+from carrito_store import abrir_carrito
 
 # Blueprint de registro/autenticación
 registro_bp = Blueprint('registro', __name__, url_prefix='/registro')
@@ -75,6 +76,7 @@ def login():
             login_user(usuario)
             session["role"] = usuario.id_rol
             session["user_id"] = usuario.id_usuario
+            abrir_carrito(usuario)
             flash("Inicio de sesión exitoso", "success")
             return redirect(url_for('home.index'))
         else:
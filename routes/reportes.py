@@ -0,0 +1,65 @@
+# routes/reportes.py
+from datetime import datetime, timedelta
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from decorators import permiso_requerido
+from ventas import resumen_ventas, actualizar_ventas
+
+reportes_bp = Blueprint('reportes', __name__)
+
+DIAS_DEFECTO = 30
+
+
+def _rango(args):
+    """(desde, hasta) de los parámetros; por defecto los últimos 30 días."""
+    def _fecha(valor):
+        try:
+            return datetime.strptime(valor, '%Y-%m-%d').date() if valor else None
+        except ValueError:
+            return None
+    hasta = _fecha(args.get('hasta')) or datetime.utcnow().date()  # días UTC, como los agregados
+    desde = _fecha(args.get('desde')) or hasta - timedelta(days=DIAS_DEFECTO - 1)
+    return min(desde, hasta), hasta
+
+
+# ---------------------------------
+# Panel de ventas (sólo lee los agregados)
+# ---------------------------------
+@reportes_bp.route('/admin/ventas')
+@permiso_requerido('reportes.ver')
+def panel_ventas():
+    desde, hasta = _rango(request.args)
+    return render_template('admin_ventas.html', r=resumen_ventas(desde, hasta))
+
+
+@reportes_bp.route('/admin/ventas/datos')
+@permiso_requerido('reportes.ver')
+def datos_ventas():
+    desde, hasta = _rango(request.args)
+    r = resumen_ventas(desde, hasta)
+
+    def _fila(f, **extra):
+        # El desglose por estado cuenta pedidos; el resto, facturas
+        conteo = 'pedidos' if 'pedidos' in f._fields else 'facturas'
+        return {**extra, 'unidades': int(f.unidades or 0), 'ingresos': str(f.ingresos or 0),
+                conteo: int(getattr(f, conteo) or 0)}
+
+    return jsonify({
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'datos_hasta': r['marca'].creado_en.isoformat() if r['marca'] else None,
+        'totales': {'unidades': r['total_unidades'], 'ingresos': str(r['total_ingresos']),
+                    'facturas': r['total_facturas']},
+        'por_dia': [_fila(f, dia=str(f.dia)) for f in r['por_dia']],
+        'por_estado': [_fila(f, estado=f.estado) for f in r['por_estado']],
+        'por_categoria': [_fila(f, categoria=f.categoria) for f in r['por_categoria']],
+        'top_productos': [_fila(f, id_producto=f.id_producto, nombre=nombre) for nombre, f in r['top_productos']],
+    })
+
+
+@reportes_bp.route('/admin/ventas/actualizar', methods=['POST'])
+@permiso_requerido('reportes.ver')
+def actualizar_panel_ventas():
+    """Suma las facturas nuevas sin esperar al cron."""
+    total = actualizar_ventas()
+    flash(f"Agregados actualizados: {total} facturas nuevas.", "success")
+    return redirect(url_for('reportes.panel_ventas', desde=request.form.get('desde'), hasta=request.form.get('hasta')))
@@ -1,37 +1,72 @@
-from flask import Blueprint, request, redirect, url_for
+from flask import Blueprint, request, redirect, url_for, flash, render_template, jsonify
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 import os
 from datetime import datetime
+from sqlalchemy.exc import IntegrityError
 from app import db
 from models import Resena
+from cache import cache_paginas
+from valoraciones import normalizar_puntaje, registrar_resena, paginar_resenas
 
 resenas_bp = Blueprint('resenas', __name__)
 
 @resenas_bp.route('/guardar', methods=['POST'])
 @login_required
 def guardar_resena():
-    id_producto = request.form.get('id_producto')
-    calidad = request.form.get('calidad')
-    comodidad = request.form.get('comodidad')
+    id_producto = request.form.get('id_producto', type=int)
+    calidad = normalizar_puntaje(request.form.get('calidad'))
+    comodidad = normalizar_puntaje(request.form.get('comodidad'))
     comentario = request.form.get('comentario')
     foto = request.files.get('foto')
 
+    if not id_producto or calidad is None or comodidad is None:
+        flash('La reseña debe incluir calidad y comodidad entre 1 y 5.', 'warning')
+        return redirect(request.referrer or url_for('productos.catalogo'))
+
     nombre_archivo = None
     if foto and foto.filename != '':
         nombre_archivo = secure_filename(foto.filename)
         foto.save(os.path.join('static/img/resenas', nombre_archivo))
 
-    nueva_resena = Resena(
-        id_producto=id_producto,
-        calidad=calidad,
-        comodidad=comodidad,
-        comentario=comentario,
-        foto=nombre_archivo,
-        usuario=current_user.nombre,
-        fecha=datetime.utcnow()
-    )
-    db.session.add(nueva_resena)
-    db.session.commit()
+    # La reseña y su resumen se guardan en la misma transacción. Si otra
+    # reseña creó el resumen al mismo tiempo, se reintenta una vez con UPDATE.
+    for intento in range(2):
+        nueva_resena = Resena(
+            id_producto=id_producto,
+            calidad=calidad,
+            comodidad=comodidad,
+            comentario=comentario,
+            foto=nombre_archivo,
+            usuario=current_user.nombre,
+            fecha=datetime.utcnow()
+        )
+        db.session.add(nueva_resena)
+        registrar_resena(id_producto, calidad, comodidad)
+        try:
+            db.session.commit()
+            break
+        except IntegrityError:
+            db.session.rollback()
+            if intento:
+                raise
+
+    cache_paginas.invalidar_producto(id_producto)
+    cache_paginas.invalidar_catalogo()
 
     return redirect(url_for('productos.detalle_producto', id_producto=id_producto))
+
+
+@resenas_bp.route('/resenas/<int:id_producto>')
+def listar_resenas(id_producto):
+    """Página siguiente de reseñas, como fragmento HTML listo para insertar."""
+    resenas, siguiente = paginar_resenas(
+        id_producto,
+        orden=request.args.get('orden', 'recientes'),
+        despues=request.args.get('despues'),
+    )
+    return jsonify({
+        'html': render_template('_resenas.html', resenas=resenas),
+        'siguiente': siguiente,
+    })
+
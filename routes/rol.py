@@ -1,19 +1,23 @@
 # routes/rol.py
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from extensions import db
-from models import Rol
-from decorators import role_required  # asegúrate que esté en tu proyecto
+from models import Rol, RolPermiso
+from decorators import permiso_requerido
+from identidad import olvidar_rol
+from permisos import PERMISOS, registro_permisos, guardar_permisos
 
 rol_bp = Blueprint('rol', __name__)
 
 @rol_bp.route("/roles")
-@role_required(1)
+@permiso_requerido('roles.gestionar')
 def listar_roles():
     roles = Rol.query.order_by(Rol.fecha_registro.desc()).all()
-    return render_template("admin_rol.html", roles=roles)
+    permisos_por_rol = {r.id_rol: registro_permisos.permisos_de(r.id_rol) for r in roles}
+    return render_template("admin_rol.html", roles=roles, permisos=PERMISOS,
+                           permisos_por_rol=permisos_por_rol)
 
 @rol_bp.route("/roles/crear", methods=["POST"])
-@role_required(1)
+@permiso_requerido('roles.gestionar')
 def crear_rol():
     id_rol = request.form["id_rol"]
     nombre = request.form["nombre"]
@@ -22,6 +26,7 @@ def crear_rol():
     db.session.add(nuevo)
     try:
         db.session.commit()
+        registro_permisos.refrescar()
         flash("✅ Rol creado correctamente.", "success")
     except Exception as e:
         db.session.rollback()
@@ -29,7 +34,7 @@ def crear_rol():
     return redirect(url_for("rol.listar_roles"))
 
 @rol_bp.route("/roles/editar/<id>", methods=["GET", "POST"])
-@role_required(1)
+@permiso_requerido('roles.gestionar')
 def editar_rol(id):
     rol = Rol.query.filter_by(id_rol=str(id)).first()
     if not rol:
@@ -45,6 +50,8 @@ def editar_rol(id):
         rol.nombre = nombre
         try:
             db.session.commit()
+            olvidar_rol(rol.id_rol)
+            registro_permisos.refrescar()
             flash("✅ Rol actualizado correctamente.", "success")
         except Exception as e:
             db.session.rollback()
@@ -54,23 +61,45 @@ def editar_rol(id):
     return render_template("roles_edit.html", rol=rol)
 
 @rol_bp.route("/roles/eliminar/<id>", methods=["POST"])
-@role_required(1)
+@permiso_requerido('roles.gestionar')
 def eliminar_rol(id):
     rol = Rol.query.filter_by(id_rol=str(id)).first()
     if not rol:
         flash("⚠️ Rol no encontrado.", "warning")
         return redirect(url_for("rol.listar_roles"))
 
+    RolPermiso.query.filter_by(id_rol=rol.id_rol).delete()
     db.session.delete(rol)
     try:
         db.session.commit()
+        olvidar_rol(id)
+        registro_permisos.refrescar()
         flash("✅ Rol eliminado.", "success")
     except Exception as e:
         db.session.rollback()
         flash(f"❌ Error al eliminar: {e}", "danger")
     return redirect(url_for("rol.listar_roles"))
 
+@rol_bp.route("/roles/permisos/<id>", methods=["POST"])
+@permiso_requerido('roles.gestionar')
+def permisos_rol(id):
+    rol = Rol.query.filter_by(id_rol=str(id)).first()
+    if not rol:
+        flash("⚠️ Rol no encontrado.", "warning")
+        return redirect(url_for("rol.listar_roles"))
+
+    try:
+        guardar_permisos(rol.id_rol, request.form.getlist("permisos"))
+        db.session.commit()
+        flash("✅ Permisos actualizados.", "success")
+    except Exception as e:
+        db.session.rollback()
+        flash(f"❌ Error al guardar permisos: {e}", "danger")
+    registro_permisos.refrescar()
+    return redirect(url_for("rol.listar_roles"))
+
 @rol_bp.route('/debug/list_roles')
+@permiso_requerido('roles.gestionar')
 def debug_list_roles():
     try:
         rows = [{"id_rol": r.id_rol, "nombre": r.nombre} for r in Rol.query.all()]
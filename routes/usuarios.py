@@ -1,8 +1,10 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
 from flask_login import login_user, logout_user
 from models import Usuario, Rol, db
-from decorators import role_required, find_or_create_role
-from globals import SHOPPING_CARTS
+from decorators import permiso_requerido, find_or_create_role
+from carrito_store import abrir_carrito
+from identidad import olvidar_usuario
+from permisos import tiene_permiso
 
 usuarios_bp = Blueprint('usuarios', __name__)
 
@@ -22,20 +24,18 @@ def login():
             session['username'] = user.id_usuario
             session['role'] = int(user.id_rol) 
 
-            if username not in SHOPPING_CARTS:
-                SHOPPING_CARTS[username] = []
-            session['cart'] = SHOPPING_CARTS[username]
+            # El carrito vive en el servidor; la cookie sólo lleva su id
+            abrir_carrito(user)
 
             flash('¡Bienvenido!', 'success')
-            return redirect(url_for('usuarios.admin_users') if user.id_rol == 1 else url_for('index'))
+            return redirect(url_for('usuarios.admin_users') if tiene_permiso(user, 'usuarios.gestionar') else url_for('index'))
 
         flash('Usuario o contraseña incorrectos', 'danger')
     return render_template('login.html')
 
 @usuarios_bp.route('/logout')
 def logout():
-    if 'username' in session:
-        SHOPPING_CARTS[session['username']] = session.get('cart', [])
+    logout_user()
     session.clear()
     flash('Has cerrado sesión', 'info')
     return redirect(url_for('index'))
@@ -45,14 +45,14 @@ def logout():
 # CRUD DE USUARIOS (solo admin)
 # -----------------------
 @usuarios_bp.route('/admin/users')
-@role_required(1)  # ✅ cambio mínimo aquí
+@permiso_requerido('usuarios.gestionar')
 def admin_users():
     users = Usuario.query.order_by(Usuario.creado_en.desc()).all()
     return render_template('admin_users.html', users=users)
 
 
 @usuarios_bp.route('/admin/users/new', methods=['GET', 'POST'])
-@role_required(1)  
+@permiso_requerido('usuarios.gestionar')
 def admin_create_user():
     if request.method == 'POST':
         id_usuario = request.form['id_usuario'].strip()
@@ -115,7 +115,7 @@ def admin_create_user():
     return render_template('admin_user_form.html', action='Crear', user=None, roles=roles)
 
 @usuarios_bp.route('/admin/users/edit/<string:id_usuario>', methods=['GET', 'POST'])
-@role_required(1)  # ✅ cambio mínimo aquí
+@permiso_requerido('usuarios.gestionar')
 def admin_edit_user(id_usuario):
     user = Usuario.query.get_or_404(id_usuario)
 
@@ -148,6 +148,7 @@ def admin_edit_user(id_usuario):
 
         try:
             db.session.commit()
+            olvidar_usuario(id_usuario)
         except Exception as e:
             db.session.rollback()
             flash(f'Error actualizando usuario: {e}', 'danger')
@@ -162,7 +163,7 @@ def admin_edit_user(id_usuario):
 
 
 @usuarios_bp.route('/admin/users/delete/<string:id_usuario>', methods=['POST'])
-@role_required(1)  # ✅ cambio mínimo aquí
+@permiso_requerido('usuarios.gestionar')
 def admin_delete_user(id_usuario):
     if id_usuario == session.get('username'):
         flash('No puedes eliminarte a ti mismo', 'warning')
@@ -173,6 +174,7 @@ def admin_delete_user(id_usuario):
         db.session.delete(u)
         try:
             db.session.commit()
+            olvidar_usuario(id_usuario)
         except Exception as e:
             db.session.rollback()
             flash(f'Error eliminando usuario: {e}', 'danger')
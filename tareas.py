@@ -0,0 +1,240 @@
+# tareas.py
+import random
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timedelta
+from flask import current_app
+from extensions import db
+from models import Tarea
+
+# tipo -> función(payload)
+REGISTRO = {}
+
+
+def tarea(tipo):
+    """Registra la función que ejecuta las tareas de `tipo`."""
+    def decorador(funcion):
+        REGISTRO[tipo] = funcion
+        return funcion
+    return decorador
+
+
+class Trabajo:
+    """Tarea tomada por un worker, independiente del backend."""
+
+    def __init__(self, id, tipo, payload, intentos, max_intentos):
+        self.id = id
+        self.tipo = tipo
+        self.payload = payload or {}
+        self.intentos = intentos
+        self.max_intentos = max_intentos
+
+
+class BackendCola:
+    """Interfaz de la cola de tareas."""
+
+    def encolar(self, tipo, payload, retraso=0, max_intentos=5):
+        raise NotImplementedError
+
+    def tomar(self, lote):
+        """Marca hasta `lote` tareas vencidas como en proceso y las devuelve."""
+        raise NotImplementedError
+
+    def completar(self, trabajo):
+        raise NotImplementedError
+
+    def reintentar(self, trabajo, error, espera):
+        raise NotImplementedError
+
+    def descartar(self, trabajo, error):
+        """Deja la tarea como fallida (dead letter)."""
+        raise NotImplementedError
+
+
+class ColaDB(BackendCola):
+    """Outbox en la tabla `tareas`.
+
+    `encolar` sólo añade la fila a la sesión: se confirma (o se descarta)
+    junto con la transacción que la originó. Varios workers pueden tomar
+    tareas a la vez; cada una se reclama con un UPDATE condicional.
+    """
+
+    def __init__(self, tiempo_limite=600):
+        # Segundos tras los que una tarea en proceso se da por abandonada
+        self.tiempo_limite = tiempo_limite
+
+    def encolar(self, tipo, payload, retraso=0, max_intentos=5):
+        ahora = datetime.utcnow()
+        db.session.add(Tarea(tipo=tipo, payload=payload, max_intentos=max_intentos,
+                             disponible_en=ahora + timedelta(seconds=retraso)))
+
+    def _recuperar_abandonadas(self, ahora):
+        # Un worker que murió a mitad de una tarea la deja en proceso para siempre
+        tabla = Tarea.__table__
+        db.session.execute(tabla.update().where(
+            tabla.c.estado == 'en_proceso',
+            tabla.c.tomada_en < ahora - timedelta(seconds=self.tiempo_limite),
+        ).values(estado='pendiente'))
+
+    def tomar(self, lote):
+        tabla = Tarea.__table__
+        ahora = datetime.utcnow()
+        self._recuperar_abandonadas(ahora)
+        candidatas = db.session.execute(
+            db.select(tabla.c.id)
+            .where(tabla.c.estado == 'pendiente', tabla.c.disponible_en <= ahora)
+            .order_by(tabla.c.disponible_en, tabla.c.id)
+            .limit(lote)
+        ).scalars().all()
+        db.session.commit()
+
+        tomadas = []
+        for id_tarea in candidatas:
+            resultado = db.session.execute(
+                tabla.update()
+                .where(tabla.c.id == id_tarea, tabla.c.estado == 'pendiente')
+                .values(estado='en_proceso', tomada_en=ahora, intentos=tabla.c.intentos + 1)
+            )
+            db.session.commit()
+            if resultado.rowcount == 1:  # otro worker no la tomó antes
+                tomadas.append(id_tarea)
+        if not tomadas:
+            return []
+        filas = db.session.execute(
+            db.select(tabla.c.id, tabla.c.tipo, tabla.c.payload, tabla.c.intentos, tabla.c.max_intentos)
+            .where(tabla.c.id.in_(tomadas)).order_by(tabla.c.id)
+        ).all()
+        return [Trabajo(*fila) for fila in filas]
+
+    def _actualizar(self, trabajo, **valores):
+        db.session.rollback()  # descarta lo que haya dejado a medias la tarea
+        tabla = Tarea.__table__
+        db.session.execute(tabla.update().where(tabla.c.id == trabajo.id).values(**valores))
+        db.session.commit()
+
+    def completar(self, trabajo):
+        self._actualizar(trabajo, estado='hecha', ultimo_error=None)
+
+    def reintentar(self, trabajo, error, espera):
+        self._actualizar(trabajo, estado='pendiente', ultimo_error=error,
+                         disponible_en=datetime.utcnow() + timedelta(seconds=espera))
+
+    def descartar(self, trabajo, error):
+        self._actualizar(trabajo, estado='fallida', ultimo_error=error)
+
+
+class ColaMemoria(BackendCola):
+    """Cola en memoria del proceso, para pruebas y desarrollo.
+
+    No es transaccional: una tarea encolada sigue en la cola aunque la
+    transacción que la originó se revierta.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pendientes = deque()
+        self._siguiente_id = 1
+        self.hechas = []
+        self.fallidas = []
+
+    def encolar(self, tipo, payload, retraso=0, max_intentos=5):
+        with self._lock:
+            trabajo = Trabajo(self._siguiente_id, tipo, payload, 0, max_intentos)
+            self._siguiente_id += 1
+            self._pendientes.append((time.time() + retraso, trabajo))
+
+    def tomar(self, lote):
+        ahora = time.time()
+        tomadas = []
+        with self._lock:
+            for _ in range(len(self._pendientes)):
+                if len(tomadas) >= lote:
+                    break
+                disponible_en, trabajo = self._pendientes.popleft()
+                if disponible_en <= ahora:
+                    trabajo.intentos += 1
+                    tomadas.append(trabajo)
+                else:
+                    self._pendientes.append((disponible_en, trabajo))
+        return tomadas
+
+    def completar(self, trabajo):
+        self.hechas.append(trabajo)
+
+    def reintentar(self, trabajo, error, espera):
+        with self._lock:
+            self._pendientes.append((time.time() + espera, trabajo))
+
+    def descartar(self, trabajo, error):
+        trabajo.error = error
+        self.fallidas.append(trabajo)
+
+    def __len__(self):
+        return len(self._pendientes)
+
+
+class Tareas:
+    """Punto de acceso a la cola configurada (TAREAS_BACKEND)."""
+
+    def __init__(self):
+        self.cola = None
+        self.backoff_base = 10
+        self.backoff_max = 3600
+
+    def init_app(self, app):
+        if app.config.get('TAREAS_BACKEND', 'db') == 'memoria':
+            self.cola = ColaMemoria()
+        else:
+            self.cola = ColaDB(tiempo_limite=app.config.get('TAREAS_TIEMPO_LIMITE', 600))
+        self.backoff_base = app.config.get('TAREAS_BACKOFF_BASE', 10)
+        self.backoff_max = app.config.get('TAREAS_BACKOFF_MAX', 3600)
+
+    def encolar(self, tipo, payload=None, retraso=0, max_intentos=5):
+        if tipo not in REGISTRO:
+            raise ValueError(f'Tarea desconocida: {tipo}')
+        self.cola.encolar(tipo, payload or {}, retraso, max_intentos)
+
+    def espera(self, intentos):
+        """Segundos hasta el siguiente intento: exponencial con jitter."""
+        base = min(self.backoff_max, self.backoff_base * 2 ** max(0, intentos - 1))
+        return base * random.uniform(0.5, 1.0)
+
+    def procesar(self, lote=10):
+        """Ejecuta un lote de tareas vencidas. Devuelve cuántas se tomaron."""
+        trabajos = self.cola.tomar(lote)
+        for trabajo in trabajos:
+            funcion = REGISTRO.get(trabajo.tipo)
+            try:
+                if funcion is None:
+                    raise LookupError(f'Sin función registrada para {trabajo.tipo}')
+                funcion(trabajo.payload)
+            except Exception:
+                error = traceback.format_exc(limit=5)
+                current_app.logger.warning("Tarea %s (%s) falló en el intento %s",
+                                           trabajo.id, trabajo.tipo, trabajo.intentos)
+                if funcion is None or trabajo.intentos >= trabajo.max_intentos:
+                    self.cola.descartar(trabajo, error)
+                else:
+                    self.cola.reintentar(trabajo, error, self.espera(trabajo.intentos))
+            else:
+                self.cola.completar(trabajo)
+        return len(trabajos)
+
+    def trabajar(self, intervalo=2.0, lote=10, una_vez=False):
+        """Bucle del worker: procesa lotes y duerme cuando la cola está vacía.
+
+        Con `una_vez` vacía las tareas vencidas y termina.
+        """
+        total = 0
+        while True:
+            tomadas = self.procesar(lote)
+            total += tomadas
+            if not tomadas:
+                if una_vez:
+                    return total
+                time.sleep(intervalo)
+
+
+tareas = Tareas()
@@ -0,0 +1,66 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+
+import pytest
+
+# La configuración lee DATABASE_URL al importarse: una base SQLite de archivo
+# (no en memoria) para que los hilos de las pruebas de concurrencia la compartan.
+_BASE = os.path.join(tempfile.mkdtemp(prefix='fashionfusion-tests-'), 'tests.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + _BASE
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app as _app  # noqa: E402
+from extensions import db  # noqa: E402
+from models import Rol, Usuario, Producto, VarianteProducto  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    _app.config.update(TESTING=True, FACTURAS_PDF_PRECALENTAR=False)
+    with _app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add_all([Rol(id_rol=1, nombre='admin'), Rol(id_rol=2, nombre='user')])
+        db.session.add(Usuario(id_usuario='cliente', nombre='Cliente', correo='cliente@test', id_rol=2))
+        db.session.commit()
+        yield _app
+        db.session.remove()
+
+
+@pytest.fixture
+def crear_producto(app):
+    """Crea un producto (y opcionalmente una variante) y devuelve sus ids."""
+
+    def _crear(stock=10, precio='10.00', talla=None, nombre='Camisa'):
+        producto = Producto(nombre=nombre, descripcion='Prueba', categoria='Camisas',
+                            precio_producto=precio, stock=stock, disponibilidad='SI')
+        db.session.add(producto)
+        db.session.flush()
+        id_variante = None
+        if talla:
+            variante = VarianteProducto(id_producto=producto.id_producto, talla=talla, stock=stock)
+            db.session.add(variante)
+            db.session.flush()
+            id_variante = variante.id_variante
+        db.session.commit()
+        return producto.id_producto, id_variante
+
+    return _crear
+
+
+
+@pytest.fixture
+def consultas(app):
+    """Lista que junta, mientras dura la prueba, las sentencias enviadas a la base."""
+    from sqlalchemy import event
+
+    sentencias = []
+
+    def _registrar(conn, cursor, statement, *args):
+        sentencias.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', _registrar)
+    yield sentencias
+    event.remove(db.engine, 'before_cursor_execute', _registrar)
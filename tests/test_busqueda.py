@@ -0,0 +1,36 @@
+# tests/test_busqueda.py
+from busqueda import indice_productos, marcar_cambio_catalogo, refrescar_indice, init_app
+from extensions import db
+from models import Producto
+
+
+def test_el_indice_ve_los_cambios_hechos_por_otro_proceso(app, crear_producto):
+    init_app(app)
+    id_producto, _ = crear_producto(nombre='Camisa lino')
+    # El producto se creó sin pasar por este índice, como desde otro worker
+    assert indice_productos.buscar('lino') == []
+    refrescar_indice()
+    assert indice_productos.buscar('lino') == []
+
+    marcar_cambio_catalogo()
+    db.session.commit()
+    refrescar_indice()
+    assert indice_productos.buscar('lino') == [id_producto]
+
+    tp = Producto.__table__
+    db.session.execute(tp.update().where(tp.c.id_producto == id_producto).values(nombre='Camisa seda'))
+    marcar_cambio_catalogo()
+    db.session.commit()
+    refrescar_indice()
+    assert indice_productos.buscar('lino') == []
+    assert indice_productos.buscar('seda') == [id_producto]
+
+
+def test_la_ruta_de_busqueda_reconstruye_si_el_catalogo_cambio(app, crear_producto):
+    init_app(app)
+    crear_producto(nombre='Buzo lana')
+    marcar_cambio_catalogo()
+    db.session.commit()
+    respuesta = app.test_client().get('/productos/buscar?q=lana')
+    assert respuesta.status_code == 200
+    assert b'Buzo lana' in respuesta.data
@@ -0,0 +1,81 @@
+# tests/test_carrito_store.py
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from carrito_store import DBCartStore, ErrorCarrito, SQLiteCartStore
+from extensions import db
+from models import CarritoLinea
+
+TTL = 3600
+
+
+@pytest.fixture(params=['sqlite', 'db'])
+def store(request, app):
+    return SQLiteCartStore(ttl=TTL) if request.param == 'sqlite' else DBCartStore(ttl=TTL)
+
+
+def _envejecer(store, carrito_id, clave, segundos):
+    """Retrasa `actualizado_en` de una línea como si no se tocara desde hace `segundos`."""
+    if isinstance(store, SQLiteCartStore):
+        store._ejecutar("UPDATE carrito_lineas SET actualizado_en = ? WHERE carrito_id = ? AND clave = ?",
+                        (time.time() - segundos, carrito_id, clave))
+    else:
+        CarritoLinea.query.filter_by(carrito_id=carrito_id, clave=clave).update(
+            {'actualizado_en': datetime.utcnow() - timedelta(seconds=segundos)})
+        db.session.commit()
+
+
+def _actualizado_en(store, carrito_id, clave):
+    if isinstance(store, SQLiteCartStore):
+        return store._valor("SELECT actualizado_en FROM carrito_lineas WHERE carrito_id = ? AND clave = ?",
+                            (carrito_id, clave))
+    db.session.expire_all()
+    return CarritoLinea.query.filter_by(carrito_id=carrito_id, clave=clave).one().actualizado_en.timestamp()
+
+
+def _agregar(store, clave, cantidad=1):
+    store.agregar('c1', clave, {'id': 1, 'talla': clave, 'precio': 10, 'nombre': 'Camisa'}, cantidad)
+
+
+def test_contar_y_obtener_aplican_la_misma_expiracion(store):
+    _agregar(store, 'S')
+    _agregar(store, 'M')
+    _envejecer(store, 'c1', 'S', TTL * 2)
+
+    # Una línea reciente mantiene vivo todo el carrito
+    assert store.contar('c1') == len(store.obtener('c1')) == 2
+
+    _envejecer(store, 'c1', 'M', TTL * 2)
+    assert store.contar('c1') == 0
+    assert store.obtener('c1') == {}
+
+
+def test_actualizar_precio_renueva_la_linea(store):
+    _agregar(store, 'S')
+    _envejecer(store, 'c1', 'S', TTL - 10)
+    antes = _actualizado_en(store, 'c1', 'S')
+
+    assert store.actualizar_precio('c1', 'S', 12)
+
+    assert _actualizado_en(store, 'c1', 'S') > antes
+    assert store.obtener('c1')['S']['precio'] == 12
+
+
+def test_agregar_suma_cantidades(store):
+    _agregar(store, 'S', 2)
+    _agregar(store, 'S', 3)
+    assert store.obtener('c1')['S']['cantidad'] == 5
+    assert store.contar('c1') == 1
+
+
+def test_agregar_que_no_se_puede_guardar_lanza_error(app, monkeypatch):
+    store = DBCartStore(ttl=TTL)
+    _agregar(store, 'S')
+    # El UPDATE no encuentra la línea y el INSERT choca con ella: dos veces
+    monkeypatch.setattr(store, '_actualizar', lambda *args: False)
+
+    with pytest.raises(ErrorCarrito):
+        _agregar(store, 'S')
+    assert store.obtener('c1')['S']['cantidad'] == 1
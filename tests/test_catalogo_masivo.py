@@ -0,0 +1,150 @@
+# tests/test_catalogo_masivo.py
+import io
+import time
+from decimal import Decimal
+
+import pytest
+
+from catalogo_masivo import ErrorFila, exportar_csv, exportar_jsonl, importar_productos, validar_fila
+from extensions import db
+from models import Producto
+
+FILAS_BENCHMARK = 5000
+
+
+def _importar(texto, formato='csv', **kwargs):
+    return importar_productos(io.BytesIO(texto.encode('utf-8')), formato, **kwargs)
+
+
+def _exportar(exportador):
+    return b''.join(exportador())
+
+
+# -----------------------
+# validar_fila
+# -----------------------
+def test_validar_fila_limpia_los_valores(app):
+    valores = validar_fila({'nombre': ' Camisa ', 'precio_producto': '12,5', 'stock': '3',
+                            'disponibilidad': 'si', 'talla': '', 'otra': 'x'})
+    assert valores == {'nombre': 'Camisa', 'precio_producto': Decimal('12.50'), 'stock': 3,
+                       'disponibilidad': 'SI', 'talla': None}
+
+
+@pytest.mark.parametrize('datos, mensaje', [
+    ({'descripcion': 'sin nombre'}, 'Falta el nombre'),
+    ({'id_producto': 'abc'}, 'id_producto no es un número'),
+    ({'nombre': 'x', 'precio_producto': '-1'}, 'Precio fuera de rango'),
+    ({'nombre': 'x', 'precio_producto': 'gratis'}, 'Precio inválido'),
+    ({'nombre': 'x', 'stock': '-2'}, 'no puede ser negativo'),
+    ({'nombre': 'x', 'disponibilidad': 'tal vez'}, 'Disponibilidad'),
+    ({'nombre': 'x' * 151}, 'supera 150'),
+    ({'id_producto': '1', 'nombre': ''}, 'no puede quedar vacío'),
+])
+def test_validar_fila_rechaza_valores_invalidos(app, datos, mensaje):
+    with pytest.raises(ErrorFila, match=mensaje):
+        validar_fila(datos)
+
+
+@pytest.mark.parametrize('foto', ['../../.env', '/etc/passwd', 'sub/foto.jpg', '..\\..\\.env'])
+def test_validar_fila_rechaza_rutas_en_la_foto(app, foto):
+    with pytest.raises(ErrorFila, match='no permitido'):
+        validar_fila({'nombre': 'x', 'foto_producto': foto})
+
+
+def test_validar_fila_exige_que_la_foto_exista(app, tmp_path, monkeypatch):
+    (tmp_path / 'img').mkdir()
+    (tmp_path / 'img' / 'camisa.jpg').write_bytes(b'jpg')
+    monkeypatch.setattr(app, 'static_folder', str(tmp_path))
+
+    assert validar_fila({'nombre': 'x', 'foto_producto': 'camisa.jpg'})['foto_producto'] == 'camisa.jpg'
+    with pytest.raises(ErrorFila, match='no existe'):
+        validar_fila({'nombre': 'x', 'foto_producto': 'otra.jpg'})
+
+
+# -----------------------
+# Importación
+# -----------------------
+def test_importar_crea_actualiza_y_reporta_en_orden(app, crear_producto):
+    existente, _ = crear_producto(stock=4, talla='M', nombre='Viejo')
+    resultado = _importar('\n'.join([
+        'id_producto,nombre,talla,stock,precio_producto',
+        '999,Fantasma,,,',
+        ',Nuevo,S,2,10',
+        ',,,,',
+        f'{existente},Renombrado,,,',
+        f'{existente},,,9,',
+    ]), lote=2)
+
+    assert (resultado.creados, resultado.actualizados, resultado.errores) == (1, 1, 3)
+    assert [fila for fila, _ in resultado.primeros_errores] == [2, 4, 6]
+    with open(resultado.reporte, encoding='utf-8') as f:
+        assert [linea.split(',')[0] for linea in f.read().splitlines()] == ['fila', '2', '4', '6']
+
+    nuevo = Producto.query.filter_by(nombre='Nuevo').one()
+    assert [(v.talla, v.stock) for v in nuevo.variantes] == [('S', 2)]
+    viejo = db.session.get(Producto, existente)
+    assert (viejo.nombre, viejo.stock) == ('Renombrado', 4)
+
+
+@pytest.mark.parametrize('formato, exportador', [('csv', exportar_csv), ('jsonl', exportar_jsonl)])
+def test_exportar_e_importar_sin_cambios_no_altera_nada(app, crear_producto, formato, exportador):
+    for n in range(5):
+        crear_producto(stock=n, precio=f'{n}.99', talla='L' if n % 2 else None, nombre=f'Producto {n}')
+    antes = _exportar(exportador)
+
+    resultado = importar_productos(io.BytesIO(antes), formato)
+
+    assert (resultado.creados, resultado.actualizados, resultado.errores) == (0, 5, 0)
+    assert resultado.reporte is None
+    assert _exportar(exportador) == antes
+
+
+def test_exportacion_importada_sin_ids_duplica_el_catalogo(app):
+    db.session.add(Producto(nombre='Camisa', descripcion='Lino', categoria='Camisas', talla='M',
+                            precio_producto=Decimal('5.00'), stock=3))
+    db.session.commit()
+    texto = _exportar(exportar_csv).decode('utf-8-sig')
+    sin_ids = '\n'.join(linea.split(',', 1)[1] for linea in texto.splitlines())
+
+    resultado = _importar(sin_ids)
+
+    assert resultado.creados == 1
+    original, copia = Producto.query.order_by(Producto.id_producto).all()
+    columnas = ('nombre', 'descripcion', 'categoria', 'talla', 'precio_producto', 'stock')
+    assert [getattr(copia, c) for c in columnas] == [getattr(original, c) for c in columnas]
+    # Como el formulario: la talla del archivo pasa a ser la variante inicial
+    assert [(v.talla, v.stock) for v in copia.variantes] == [('M', 3)]
+
+
+# -----------------------
+# Rendimiento
+# -----------------------
+def test_benchmark_importacion_y_exportacion(app, consultas):
+    """Filas por segundo de la importación y la exportación (ver con -s)."""
+    texto = 'nombre,categoria,talla,stock,precio_producto\n' + ''.join(
+        f'Producto {n},Cat {n % 20},{"SML"[n % 3]},{n % 7},{n % 90}.50\n' for n in range(FILAS_BENCHMARK))
+
+    inicio = time.perf_counter()
+    resultado = _importar(texto)
+    importar = time.perf_counter() - inicio
+    # SQLite no garantiza el orden de un RETURNING en lote: SQLAlchemy inserta
+    # los productos fila a fila allí (en PostgreSQL va en lotes); el resto sí va por lotes
+    sentencias_importar = len([s for s in consultas if not s.startswith('INSERT INTO productos')])
+
+    consultas.clear()
+    inicio = time.perf_counter()
+    exportado = _exportar(exportar_csv)
+    exportar = time.perf_counter() - inicio
+
+    print(f'\nimportar: {FILAS_BENCHMARK} filas en {importar:.2f}s '
+          f'({FILAS_BENCHMARK / importar:.0f} filas/s, {sentencias_importar} sentencias)')
+    print(f'exportar: {len(exportado) / 1024:.0f} KB en {exportar:.2f}s '
+          f'({FILAS_BENCHMARK / exportar:.0f} filas/s, {len(consultas)} sentencias)')
+
+    assert resultado.creados == FILAS_BENCHMARK and not resultado.errores
+    assert exportado.count(b'\n') == FILAS_BENCHMARK + 1
+    # Por lotes: las sentencias no crecen fila a fila
+    assert sentencias_importar < FILAS_BENCHMARK / 20
+    assert len(consultas) < FILAS_BENCHMARK / 100
+    # Holgado: sólo detecta que se vuelva a escribir fila por fila
+    assert importar < 30 and exportar < 10
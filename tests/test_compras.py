@@ -0,0 +1,61 @@
+# tests/test_compras.py
+import time
+
+from extensions import db
+from compras import factura_por_clave, registrar_compra
+from models import Factura, FacturaItem, Pedido, Producto
+from precios import cotizar_carrito
+
+TAMANOS = (1, 10, 50)
+
+
+def _carrito(crear_producto, lineas):
+    cart = {}
+    for n in range(lineas):
+        talla = 'M' if n % 2 else None
+        pid, vid = crear_producto(stock=100, precio='9.90', talla=talla, nombre=f'Producto {n}')
+        cart[f'{pid}:{talla or ""}'] = {'id': pid, 'id_variante': vid, 'talla': talla,
+                                        'cantidad': 1, 'precio': '9.90', 'nombre': f'Producto {n}'}
+    return cart
+
+
+def test_latencia_del_checkout_segun_tamano_del_carrito(app, crear_producto, consultas):
+    """Las escrituras son las mismas para 1 o 50 líneas; sólo crece la reserva de stock."""
+    medidas = {}
+    for lineas in TAMANOS:
+        cart = _carrito(crear_producto, lineas)
+        resumen = cotizar_carrito(cart)
+        consultas.clear()
+
+        inicio = time.perf_counter()
+        registrar_compra('cliente', 'Calle 1', cart, resumen, clave=f'latencia-{lineas}')
+        segundos = time.perf_counter() - inicio
+
+        reservas = [s for s in consultas if s.lstrip().upper().startswith('UPDATE')]
+        medidas[lineas] = (len(consultas) - len(reservas), len(reservas), segundos)
+
+    print('\nlíneas  sentencias  reservas  ms')
+    for lineas, (resto, reservas, segundos) in medidas.items():
+        print(f'{lineas:>6}  {resto:>10}  {reservas:>8}  {segundos * 1000:.1f}')
+
+    # Un UPDATE condicional por producto y por variante; todo lo demás no depende del carrito
+    assert {resto for resto, _, _ in medidas.values()} == {medidas[1][0]}
+    for lineas, (_, reservas, _) in medidas.items():
+        assert reservas == lineas + lineas // 2
+    # Holgado: sólo detecta que vuelva el insert fila por fila con varios commits
+    assert medidas[50][2] < 1.0
+    assert db.session.query(FacturaItem).count() == sum(TAMANOS)
+    assert db.session.query(Pedido).count() == sum(TAMANOS)
+
+
+def test_clave_repetida_devuelve_la_misma_factura(app, crear_producto):
+    cart = _carrito(crear_producto, 3)
+    resumen = cotizar_carrito(cart)
+
+    primera = registrar_compra('cliente', 'Calle 1', cart, resumen, clave='abc')
+    segunda = registrar_compra('cliente', 'Calle 1', cart, resumen, clave='abc')
+
+    assert segunda == primera == factura_por_clave('cliente', 'abc')
+    assert db.session.query(Factura).count() == 1
+    # El reintento se deshizo entero: el stock se descontó una sola vez
+    assert {p.stock for p in Producto.query} == {99}
@@ -0,0 +1,52 @@
+# tests/test_exportacion.py
+import time
+
+from extensions import db
+from compras import registrar_compra
+from exportacion import ESTADOS, FiltrosExportacion, exportar_jsonl, _pdfs_en_orden
+from facturas_pdf import metricas
+from models import Pedido
+from precios import cotizar_carrito
+
+
+def _comprar(crear_producto, clave):
+    pid, vid = crear_producto(stock=10, precio='10.00', talla='M', nombre=clave)
+    cart = {f'{pid}:M': {'id': pid, 'id_variante': vid, 'talla': 'M', 'cantidad': 1,
+                         'precio': '10.00', 'nombre': clave}}
+    return registrar_compra('cliente', 'Calle 1', cart, cotizar_carrito(cart), clave=clave)
+
+
+def _exportadas(estado):
+    return b''.join(exportar_jsonl(FiltrosExportacion(estado=estado))).count(b'"id_factura"')
+
+
+def test_el_filtro_de_estado_usa_el_de_los_pedidos(app, crear_producto):
+    _comprar(crear_producto, 'a')
+    cerrada = _comprar(crear_producto, 'b')
+    db.session.execute(Pedido.__table__.update().where(Pedido.id_factura == cerrada).values(estado='finalizado'))
+    db.session.commit()
+
+    assert set(ESTADOS) == {'pendiente', 'finalizado'}
+    assert _exportadas(None) == 2
+    assert _exportadas('pendiente') == 1
+    assert _exportadas('finalizado') == 1
+
+
+def test_los_pdf_que_se_pasan_de_tiempo_liberan_su_lugar(app, crear_producto, monkeypatch, tmp_path):
+    for clave in 'abc':
+        _comprar(crear_producto, clave)
+    monkeypatch.setitem(app.config, 'FACTURAS_PDF_TIMEOUT', 0.001)
+    monkeypatch.setitem(app.config, 'FACTURAS_PDF_DIR', str(tmp_path))
+    metricas.reiniciar()
+
+    resultados = list(_pdfs_en_orden(FiltrosExportacion()))
+    assert len(resultados) == 3
+    # El primero se pasa de tiempo; los demás de su pool pueden caer con él al reciclarlo
+    assert all(datos is None for _, datos, _ in resultados)
+    assert resultados[0][2] == 'tiempo agotado'
+
+    # Los PDF abandonados se cancelan o su pool se recicla: la cola queda libre
+    limite = time.monotonic() + 30
+    while metricas.como_dict()['en_curso'] and time.monotonic() < limite:
+        time.sleep(0.1)
+    assert metricas.como_dict()['en_curso'] == 0
@@ -0,0 +1,82 @@
+# tests/test_inventario.py
+import threading
+
+import pytest
+
+from extensions import db
+from inventario import StockInsuficiente, reservar_stock
+from models import Producto, VarianteProducto
+
+COMPRADORES = 40
+
+
+def _competir(app, pedir):
+    """Lanza COMPRADORES hilos que reservan a la vez; devuelve (exitos, faltas, errores)."""
+    exitos, faltas, errores = [], [], []
+    salida = threading.Barrier(COMPRADORES)
+
+    def comprador(n):
+        with app.app_context():
+            salida.wait()
+            try:
+                pedir(n)
+                db.session.commit()
+                exitos.append(n)
+            except StockInsuficiente:
+                db.session.rollback()
+                faltas.append(n)
+            except Exception as e:  # p. ej. "database is locked"
+                db.session.rollback()
+                errores.append(e)
+            finally:
+                db.session.remove()
+
+    hilos = [threading.Thread(target=comprador, args=(n,)) for n in range(COMPRADORES)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return exitos, faltas, errores
+
+
+def test_reserva_concurrente_no_sobrevende(app, crear_producto):
+    id_producto, _ = crear_producto(stock=7)
+
+    exitos, faltas, errores = _competir(app, lambda n: reservar_stock({id_producto: 1}))
+
+    assert not errores
+    assert len(exitos) == 7
+    assert len(faltas) == COMPRADORES - 7
+    db.session.expire_all()
+    assert db.session.get(Producto, id_producto).stock == 0
+
+
+def test_reserva_concurrente_por_variante(app, crear_producto):
+    id_producto, id_variante = crear_producto(stock=10, talla='M')
+
+    # Cada comprador pide 1 o 2 unidades de la última talla M
+    cantidad = lambda n: 1 + n % 2  # noqa: E731
+    exitos, faltas, errores = _competir(
+        app, lambda n: reservar_stock({id_producto: cantidad(n)}, {id_variante: cantidad(n)}))
+
+    assert not errores
+    vendidas = sum(cantidad(n) for n in exitos)
+    assert vendidas <= 10
+    db.session.expire_all()
+    assert db.session.get(VarianteProducto, id_variante).stock == 10 - vendidas
+    assert db.session.get(Producto, id_producto).stock == 10 - vendidas
+    assert faltas
+
+
+def test_pedido_con_una_linea_corta_no_descuenta_nada(app, crear_producto):
+    con_stock, _ = crear_producto(stock=5, nombre='Camisa')
+    sin_stock, _ = crear_producto(stock=1, nombre='Pantalón')
+
+    with pytest.raises(StockInsuficiente) as error:
+        reservar_stock({con_stock: 2, sin_stock: 3})
+    db.session.rollback()
+
+    assert error.value.faltantes == [
+        {'id_producto': sin_stock, 'nombre': 'Pantalón', 'pedido': 3, 'disponible': 1}]
+    assert db.session.get(Producto, con_stock).stock == 5
+    assert db.session.get(Producto, sin_stock).stock == 1
@@ -0,0 +1,44 @@
+# tests/test_precios.py
+from decimal import Decimal
+
+import pytest
+
+from extensions import db
+from precios import cotizar_carrito
+
+
+def _carrito(ids, precio='1.00'):
+    return {f'{pid}:{talla or ""}': {'id': pid, 'id_variante': vid, 'talla': talla,
+                                     'cantidad': 2, 'precio': precio, 'nombre': 'x'}
+            for pid, vid, talla in ids}
+
+
+@pytest.mark.parametrize('lineas', [1, 5, 30])
+def test_cotizar_carrito_hace_una_sola_consulta(app, crear_producto, consultas, lineas):
+    ids = []
+    for n in range(lineas):
+        talla = 'M' if n % 2 else None
+        pid, vid = crear_producto(stock=10, precio='12.50', talla=talla, nombre=f'Producto {n}')
+        ids.append((pid, vid, talla))
+    cart = _carrito(ids)
+    db.session.expunge_all()  # sin objetos en la sesión: todo sale de la consulta
+    consultas.clear()
+
+    resumen = cotizar_carrito(cart)
+
+    selects = [s for s in consultas if s.lstrip().upper().startswith('SELECT')]
+    assert len(selects) == 1
+    assert len(resumen) == lineas
+    assert all(linea.disponible for linea in resumen)
+
+
+def test_cotizar_carrito_usa_precios_de_la_base(app, crear_producto):
+    barato, _ = crear_producto(stock=3, precio='19.99')
+    agotado, _ = crear_producto(stock=0, precio='5.00', nombre='Agotado')
+
+    resumen = cotizar_carrito(_carrito([(barato, None, None), (agotado, None, None)], precio='1.00'))
+
+    assert resumen.total == Decimal('39.98')
+    assert [l.id_producto for l in resumen.precios_cambiados] == [barato, agotado]
+    assert [l.motivo for l in resumen.no_disponibles] == ['Agotado']
+    assert not resumen.listo_para_pagar
@@ -0,0 +1,46 @@
+# tests/test_valoraciones.py
+from datetime import datetime, timedelta
+
+import pytest
+
+from extensions import db
+from models import Resena
+from valoraciones import paginar_resenas
+
+
+def _recorrer(id_producto, orden, por_pagina):
+    vistas, cursor = [], None
+    while True:
+        filas, cursor = paginar_resenas(id_producto, orden, cursor, por_pagina=por_pagina)
+        vistas += [r.id for r in filas]
+        if cursor is None:
+            return vistas
+
+
+@pytest.mark.parametrize('orden', ['calidad', 'recientes'])
+@pytest.mark.parametrize('por_pagina', [1, 4, 7, 100])
+def test_el_cursor_recorre_todas_las_resenas_aunque_falten_datos(app, crear_producto, orden, por_pagina):
+    id_producto, _ = crear_producto()
+    otro, _ = crear_producto(nombre='Otro')
+    inicio = datetime(2024, 1, 1)
+    for n in range(20):
+        # Reseñas antiguas sin calidad o sin fecha, y empates de calidad
+        db.session.add(Resena(id_producto=id_producto, usuario='u', comodidad=3,
+                              calidad=None if n % 3 == 0 else n % 5 + 1,
+                              fecha=inicio + timedelta(days=n % 6)))
+    db.session.add(Resena(id_producto=otro, usuario='u', calidad=5, comodidad=5, fecha=inicio))
+    db.session.flush()
+    # `fecha` tiene default en el modelo: las filas antiguas sin fecha se simulan aparte
+    tabla = Resena.__table__
+    db.session.execute(tabla.update().where(tabla.c.id_producto == id_producto, tabla.c.id % 4 == 0)
+                       .values(fecha=None))
+    db.session.commit()
+
+    vistas = _recorrer(id_producto, orden, por_pagina)
+
+    columna = 'calidad' if orden == 'calidad' else 'fecha'
+    resenas = Resena.query.filter_by(id_producto=id_producto).all()
+    con_valor = sorted((r for r in resenas if getattr(r, columna) is not None),
+                       key=lambda r: (getattr(r, columna), r.id), reverse=True)
+    sin_valor = sorted((r for r in resenas if getattr(r, columna) is None), key=lambda r: r.id, reverse=True)
+    assert vistas == [r.id for r in con_valor + sin_valor]
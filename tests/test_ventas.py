@@ -0,0 +1,63 @@
+# tests/test_ventas.py
+from datetime import date
+
+from extensions import db
+from compras import registrar_compra
+from models import Pedido
+from precios import cotizar_carrito
+from ventas import actualizar_ventas, cambiar_estado_pedidos, reconstruir_ventas, resumen_ventas
+
+
+def _comprar(crear_producto, lineas, clave):
+    cart = {}
+    for n in range(lineas):
+        pid, vid = crear_producto(stock=100, precio='10.00', talla='M', nombre=f'{clave} {n}')
+        cart[f'{pid}:M'] = {'id': pid, 'id_variante': vid, 'talla': 'M', 'cantidad': 2,
+                            'precio': '10.00', 'nombre': f'{clave} {n}'}
+    return registrar_compra('cliente', 'Calle 1', cart, cotizar_carrito(cart), clave=clave)
+
+
+def _por_estado():
+    hoy = date.today()
+    r = resumen_ventas(hoy, hoy)
+    return {f.estado: (f.pedidos, f.unidades, int(f.ingresos)) for f in r['por_estado']}, r
+
+
+def test_el_desglose_sigue_el_estado_de_los_pedidos(app, crear_producto, monkeypatch):
+    monkeypatch.setitem(app.config, 'VENTAS_MARGEN', 0)
+    _comprar(crear_producto, 3, 'a')
+    _comprar(crear_producto, 2, 'b')
+    assert actualizar_ventas() == 2
+
+    estados, r = _por_estado()
+    assert estados == {'pendiente': (5, 10, 100)}
+    assert r['total_facturas'] == 2 and r['total_unidades'] == 10
+
+    primero = db.session.query(Pedido.id).order_by(Pedido.id).limit(2).all()
+    assert cambiar_estado_pedidos(Pedido.id.in_([p.id for p in primero]), 'finalizado') == 2
+    db.session.commit()
+    estados, r = _por_estado()
+    assert estados == {'pendiente': (3, 6, 60), 'finalizado': (2, 4, 40)}
+    # Los totales por día son de facturas y no cambian
+    assert r['total_facturas'] == 2 and r['total_unidades'] == 10
+
+    # Volver a poner el mismo estado no mueve nada
+    assert cambiar_estado_pedidos(Pedido.id == primero[0].id, 'finalizado') == 0
+    db.session.commit()
+    assert _por_estado()[0] == estados
+
+    reconstruir_ventas()
+    assert _por_estado()[0] == estados
+
+
+def test_un_pedido_aun_no_sumado_entra_con_su_estado_nuevo(app, crear_producto, monkeypatch):
+    monkeypatch.setitem(app.config, 'VENTAS_MARGEN', 0)
+    id_factura = _comprar(crear_producto, 2, 'c')
+    cambiar_estado_pedidos(Pedido.id_factura == id_factura, 'finalizado')
+    db.session.commit()
+    actualizar_ventas()
+    assert _por_estado()[0] == {'finalizado': (2, 4, 40)}
+
+    cambiar_estado_pedidos(Pedido.id_factura == id_factura, 'pendiente')
+    db.session.commit()
+    assert _por_estado()[0] == {'pendiente': (2, 4, 40)}
@@ -1,5 +1,5 @@
 import base64, os
-from flask import url_for
+from flask import current_app, url_for
 
 def _dict_to_namespace(data):
     class Namespace:
@@ -7,11 +7,20 @@ def _dict_to_namespace(data):
             self.__dict__.update(entries)
     return Namespace(**data)
 
+# ruta -> (mtime, data URI); el logo de las facturas se lee una sola vez por proceso
+_DATAURIS = {}
+
 def _static_file_to_datauri(filename):
-    static_path = os.path.join('static', filename)
+    static_path = os.path.join(current_app.static_folder, filename)
     if not os.path.exists(static_path):
         return url_for('static', filename=filename)
+    mtime = os.path.getmtime(static_path)
+    cacheado = _DATAURIS.get(static_path)
+    if cacheado and cacheado[0] == mtime:
+        return cacheado[1]
     with open(static_path, 'rb') as f:
         data = base64.b64encode(f.read()).decode('utf-8')
     ext = filename.split('.')[-1]
-    return f"data:image/{ext};base64,{data}"
+    datauri = f"data:image/{ext};base64,{data}"
+    _DATAURIS[static_path] = (mtime, datauri)
+    return datauri
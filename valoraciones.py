@@ -0,0 +1,114 @@
+# valoraciones.py
+from datetime import datetime
+from extensions import db
+from models import Resena, ResumenResenas
+from paginacion import codificar_cursor, decodificar_cursor, condicion_keyset
+
+RESENAS_POR_PAGINA = 10
+
+# Orden del listado de reseñas -> (columna, conversor del cursor)
+ORDENES_RESENAS = {
+    'recientes': (Resena.fecha, datetime.fromisoformat),
+    'calidad': (Resena.calidad, int),
+}
+
+
+def normalizar_puntaje(valor):
+    """Entero entre 1 y 5, o None si el valor no es válido."""
+    try:
+        n = int(valor)
+    except (TypeError, ValueError):
+        return None
+    return n if 1 <= n <= 5 else None
+
+
+def registrar_resena(id_producto, calidad, comodidad):
+    """Suma una reseña al resumen del producto dentro de la transacción actual.
+
+    El UPDATE incrementa los contadores en la base (sin leer-modificar-escribir),
+    así que dos reseñas simultáneas no se pisan. Si el producto aún no tiene
+    resumen se inserta la fila.
+    """
+    tabla = ResumenResenas.__table__
+    columna_estrellas = tabla.c[f'calidad_{calidad}']
+    resultado = db.session.execute(
+        tabla.update()
+        .where(tabla.c.id_producto == id_producto)
+        .values({
+            tabla.c.total: tabla.c.total + 1,
+            tabla.c.suma_calidad: tabla.c.suma_calidad + calidad,
+            tabla.c.suma_comodidad: tabla.c.suma_comodidad + comodidad,
+            columna_estrellas: columna_estrellas + 1,
+        })
+    )
+    if resultado.rowcount == 0:
+        resumen = ResumenResenas(
+            id_producto=id_producto, total=1,
+            suma_calidad=calidad, suma_comodidad=comodidad,
+            **{f'calidad_{n}': int(n == calidad) for n in range(1, 6)}
+        )
+        db.session.add(resumen)
+
+
+def reconstruir_resumenes():
+    """Recalcula todos los resúmenes desde la tabla de reseñas en una sola sentencia."""
+    columnas = {
+        'total': db.func.count(Resena.id),
+        'suma_calidad': db.func.coalesce(db.func.sum(Resena.calidad), 0),
+        'suma_comodidad': db.func.coalesce(db.func.sum(Resena.comodidad), 0),
+    }
+    for n in range(1, 6):
+        columnas[f'calidad_{n}'] = db.func.sum(db.case((Resena.calidad == n, 1), else_=0))
+
+    consulta = (db.select(Resena.id_producto, *columnas.values())
+                .where(Resena.id_producto.isnot(None))
+                .group_by(Resena.id_producto))
+    db.session.execute(ResumenResenas.__table__.delete())
+    resultado = db.session.execute(
+        ResumenResenas.__table__.insert().from_select(['id_producto', *columnas.keys()], consulta)
+    )
+    db.session.commit()
+    return resultado.rowcount
+
+
+def resumenes_de(ids):
+    """{id_producto: ResumenResenas} para una página de productos, en una consulta."""
+    if not ids:
+        return {}
+    return {r.id_producto: r for r in ResumenResenas.query.filter(ResumenResenas.id_producto.in_(ids))}
+
+
+def paginar_resenas(id_producto, orden='recientes', despues=None, por_pagina=RESENAS_POR_PAGINA):
+    """Una página de reseñas del producto y el cursor de la siguiente (o None).
+
+    Recorre los índices (id_producto, fecha, id) / (id_producto, calidad, id)
+    con LIMIT, así que cuesta lo mismo en la página 1 que en la 100.
+    Las reseñas antiguas sin fecha o sin calidad van al final, por id: con
+    NULL la comparación del cursor nunca es verdadera, así que se recorren
+    en un segundo tramo (`columna IS NULL`) que usa el mismo índice.
+    """
+    if orden not in ORDENES_RESENAS:
+        orden = 'recientes'
+    columna, convertir = ORDENES_RESENAS[orden]
+
+    base = Resena.query.filter(Resena.id_producto == id_producto)
+    cursor = decodificar_cursor(despues, lambda v: None if v is None else convertir(v))
+    filas = []
+    if cursor is None or cursor[0] is not None:
+        query = base.filter(columna.isnot(None))
+        if cursor is not None:
+            query = query.filter(condicion_keyset(columna, Resena.id, cursor[0], cursor[1], desc=True))
+        filas = query.order_by(columna.desc(), Resena.id.desc()).limit(por_pagina + 1).all()
+    if len(filas) <= por_pagina:
+        query = base.filter(columna.is_(None))
+        if cursor is not None and cursor[0] is None:
+            query = query.filter(Resena.id < cursor[1])
+        filas += query.order_by(Resena.id.desc()).limit(por_pagina + 1 - len(filas)).all()
+
+    siguiente = None
+    if len(filas) > por_pagina:
+        filas = filas[:por_pagina]
+        ultima = filas[-1]
+        siguiente = codificar_cursor(getattr(ultima, columna.key), ultima.id)
+    return filas, siguiente
+
@@ -0,0 +1,296 @@
+# ventas.py
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import (Factura, FacturaItem, Pedido, Producto, MarcaAgregado,
+                    VentaDia, VentaDiaProducto, VentaDiaCategoria, VentaDiaEstado)
+from paginacion import condicion_keyset
+
+MARCA = 'ventas'
+AGREGADOS = (VentaDia, VentaDiaProducto, VentaDiaCategoria, VentaDiaEstado)
+
+
+def _dia(valor):
+    # SQLite devuelve date() como texto
+    return date.fromisoformat(valor) if isinstance(valor, str) else valor
+
+
+def _metricas(tabla):
+    """Columnas que se suman: todas menos la clave."""
+    return [c.name for c in tabla.columns if not c.primary_key]
+
+
+def _filas(filas, claves=(), conteo='facturas'):
+    """(dia, *claves, unidades, ingresos, conteo) -> dicts listos para `_acumular`."""
+    n = len(claves) + 1
+    return [{'dia': _dia(f[0]), **dict(zip(claves, f[1:n])), 'unidades': int(f[n] or 0),
+             'ingresos': Decimal(str(f[n + 1] or 0)), conteo: int(f[n + 2] or 0)} for f in filas]
+
+
+# -----------------------
+# Marca de agua
+# -----------------------
+def leer_marca(bloquear=False):
+    """(creado_en, id_factura, actualizado_en) de la última factura ya sumada.
+
+    Con `bloquear` la fila queda tomada hasta el commit: ninguna pasada de
+    `actualizar_ventas` puede mover la marca mientras tanto.
+    """
+    tm = MarcaAgregado.__table__
+    consulta = db.select(tm.c.creado_en, tm.c.id_factura, tm.c.actualizado_en).where(tm.c.nombre == MARCA)
+    if bloquear:
+        consulta = consulta.with_for_update()
+    fila = db.session.execute(consulta).first()
+    if fila is None:
+        try:
+            db.session.add(MarcaAgregado(nombre=MARCA))
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # otro proceso la creó a la vez
+        fila = db.session.execute(consulta).first()
+    return fila
+
+
+def _mover_marca(desde, hasta):
+    """Avanza la marca sólo si sigue en `desde`; False si otro proceso se adelantó.
+
+    Es lo primero que escribe cada lote, así que dos actualizaciones
+    simultáneas no pueden sumar las mismas facturas dos veces.
+    """
+    tm = MarcaAgregado.__table__
+    resultado = db.session.execute(
+        tm.update()
+        .where(tm.c.nombre == MARCA, tm.c.creado_en == desde.creado_en, tm.c.id_factura == desde.id_factura)
+        .values(creado_en=hasta.creado_en, id_factura=hasta.id_factura, actualizado_en=datetime.utcnow())
+    )
+    return resultado.rowcount == 1
+
+
+# -----------------------
+# Actualización incremental
+# -----------------------
+def _por_estado(condicion, estado=None):
+    """Filas de `VentaDiaEstado` para los pedidos que cumplen `condicion`.
+
+    El día es el de su factura. Con `estado` se agrupan como si ya lo tuvieran.
+    """
+    tpe, tf, ti = Pedido.__table__, Factura.__table__, FacturaItem.__table__
+    dia = db.func.date(tf.c.creado_en)
+    columna = db.literal(estado) if estado else tpe.c.estado
+    filas = db.session.execute(
+        db.select(dia, columna, db.func.sum(db.func.coalesce(ti.c.cantidad, 0)),
+                  db.func.sum(db.func.coalesce(ti.c.subtotal, 0)), db.func.count())
+        .select_from(tpe.join(tf, tf.c.id_factura == tpe.c.id_factura)
+                     .outerjoin(ti, ti.c.id_item == tpe.c.id_item))
+        .where(condicion).group_by(dia, columna)
+    ).all()
+    return _filas(filas, ('estado',), conteo='pedidos')
+
+
+def _agregados_lote(en_lote):
+    """Filas {clave..., unidades, ingresos, facturas|pedidos} de cada tabla para las facturas del lote."""
+    tf, ti, tp = Factura.__table__, FacturaItem.__table__, Producto.__table__
+    dia = db.func.date(tf.c.creado_en)
+    lineas = ti.join(tf, tf.c.id_factura == ti.c.id_factura)
+    sumas = (db.func.sum(ti.c.cantidad), db.func.sum(ti.c.subtotal), db.func.count(db.distinct(ti.c.id_factura)))
+
+    producto = db.func.coalesce(ti.c.id_producto, 0)
+    por_producto = db.session.execute(
+        db.select(dia, producto, *sumas).select_from(lineas).where(en_lote).group_by(dia, producto)
+    ).all()
+
+    categoria = db.func.coalesce(tp.c.categoria, '')
+    por_categoria = db.session.execute(
+        db.select(dia, categoria, *sumas)
+        .select_from(lineas.outerjoin(tp, tp.c.id_producto == ti.c.id_producto))
+        .where(en_lote).group_by(dia, categoria)
+    ).all()
+
+    unidades = (db.select(db.func.coalesce(db.func.sum(ti.c.cantidad), 0))
+                .where(ti.c.id_factura == tf.c.id_factura).scalar_subquery())
+    por_dia = db.session.execute(
+        db.select(dia, db.func.sum(unidades), db.func.sum(tf.c.total), db.func.count())
+        .where(en_lote).group_by(dia)
+    ).all()
+
+    return {
+        VentaDia: _filas(por_dia),
+        VentaDiaProducto: _filas(por_producto, ('id_producto',)),
+        VentaDiaCategoria: _filas(por_categoria, ('categoria',)),
+        VentaDiaEstado: _por_estado(en_lote),
+    }
+
+
+def _acumular(modelo, filas):
+    """Suma las filas a la tabla: UPDATE de las claves que ya existen, INSERT del resto.
+
+    Tres sentencias por tabla (leer claves, executemany de cada tipo), sin
+    importar cuántos días o productos traiga el lote.
+    """
+    if not filas:
+        return
+    tabla = modelo.__table__
+    claves = [c.name for c in tabla.primary_key.columns]
+    metricas = _metricas(tabla)
+    existentes = set(db.session.execute(
+        db.select(*[tabla.c[c] for c in claves]).where(tabla.c.dia.in_(sorted({f['dia'] for f in filas})))
+    ).all())
+
+    actualizar, insertar = [], []
+    for fila in filas:
+        if tuple(fila[c] for c in claves) in existentes:
+            actualizar.append({**{f'k_{c}': fila[c] for c in claves}, **{f's_{m}': fila[m] for m in metricas}})
+        else:
+            insertar.append(fila)
+
+    if actualizar:
+        db.session.execute(
+            tabla.update()
+            .where(*[tabla.c[c] == db.bindparam(f'k_{c}') for c in claves])
+            .values({tabla.c[m]: tabla.c[m] + db.bindparam(f's_{m}') for m in metricas}),
+            actualizar,
+        )
+    if insertar:
+        db.session.execute(tabla.insert(), insertar)
+
+
+def _sumar_lote(lote, corte):
+    """Suma a los agregados el siguiente lote de facturas tras la marca.
+
+    Devuelve cuántas facturas sumó (0 si no quedaban o si otro proceso
+    tomó el lote).
+    """
+    tf = Factura.__table__
+    marca = leer_marca()
+    despues = condicion_keyset(tf.c.creado_en, tf.c.id_factura, marca.creado_en, marca.id_factura, desc=False)
+    claves = db.session.execute(
+        db.select(tf.c.creado_en, tf.c.id_factura)
+        .where(despues, tf.c.creado_en <= corte)
+        .order_by(tf.c.creado_en, tf.c.id_factura)
+        .limit(lote)
+    ).all()
+    if not claves:
+        return 0
+
+    hasta = claves[-1]
+    try:
+        if not _mover_marca(marca, hasta):
+            db.session.rollback()
+            return 0
+        hasta_incluida = ~condicion_keyset(tf.c.creado_en, tf.c.id_factura, hasta.creado_en, hasta.id_factura, desc=False)
+        for modelo, filas in _agregados_lote(db.and_(despues, hasta_incluida)).items():
+            _acumular(modelo, filas)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(claves)
+
+
+def actualizar_ventas(lote=None):
+    """Suma a los agregados las facturas nuevas desde la marca de agua.
+
+    Sólo se leen las facturas posteriores a la marca, por el índice
+    (creado_en, id_factura). Las de los últimos VENTAS_MARGEN segundos se
+    dejan para la siguiente pasada: una compra cuya transacción aún no se
+    confirmó no debe quedar detrás de la marca. Devuelve cuántas facturas
+    se sumaron.
+    """
+    config = current_app.config
+    lote = lote or config.get('VENTAS_LOTE', 1000)
+    corte = datetime.utcnow() - timedelta(seconds=config.get('VENTAS_MARGEN', 120))
+    total = 0
+    while True:
+        sumadas = _sumar_lote(lote, corte)
+        if not sumadas:
+            return total
+        total += sumadas
+
+
+def reconstruir_ventas():
+    """Vacía los agregados, devuelve la marca al principio y vuelve a sumar todo."""
+    leer_marca()
+    for modelo in AGREGADOS:
+        db.session.execute(modelo.__table__.delete())
+    db.session.execute(
+        MarcaAgregado.__table__.update()
+        .where(MarcaAgregado.nombre == MARCA)
+        .values(creado_en=datetime(1970, 1, 1), id_factura=0, actualizado_en=datetime.utcnow())
+    )
+    db.session.commit()
+    return actualizar_ventas()
+
+
+def cambiar_estado_pedidos(condicion, estado):
+    """Pone `estado` a los pedidos que cumplen `condicion` (sin commit) y mueve sus totales.
+
+    Sólo se corrigen los pedidos de facturas ya sumadas: los demás entran con
+    su estado nuevo en la próxima pasada. La marca se lee bloqueada para que
+    una pasada simultánea no sume los mismos pedidos con el estado viejo.
+    Devuelve cuántos pedidos cambiaron.
+    """
+    tpe, tf = Pedido.__table__, Factura.__table__
+    marca = leer_marca(bloquear=True)
+    sumadas = db.select(tf.c.id_factura).where(
+        ~condicion_keyset(tf.c.creado_en, tf.c.id_factura, marca.creado_en, marca.id_factura, desc=False))
+    cambian = db.and_(condicion, tpe.c.estado != estado)
+    ya_sumados = db.and_(cambian, tpe.c.id_factura.in_(sumadas))
+
+    salen = _por_estado(ya_sumados)
+    entran = _por_estado(ya_sumados, estado)
+    for fila in salen:
+        for m in _metricas(VentaDiaEstado.__table__):
+            fila[m] = -fila[m]
+    _acumular(VentaDiaEstado, salen + entran)
+    if salen:
+        te = VentaDiaEstado.__table__
+        db.session.execute(te.delete().where(te.c.pedidos == 0, te.c.dia.in_(sorted({f['dia'] for f in salen}))))
+    return db.session.execute(tpe.update().where(cambian).values(estado=estado)).rowcount
+
+
+# -----------------------
+# Lectura para el panel
+# -----------------------
+def _totales(modelo, desde, hasta, *columnas, orden=None, limite=None):
+    tabla = modelo.__table__
+    consulta = (db.select(*columnas, *[db.func.sum(tabla.c[m]).label(m) for m in _metricas(tabla)])
+                .where(tabla.c.dia >= desde, tabla.c.dia <= hasta)
+                .group_by(*columnas))
+    if orden is not None:
+        consulta = consulta.order_by(orden)
+    if limite:
+        consulta = consulta.limit(limite)
+    return db.session.execute(consulta).all()
+
+
+def resumen_ventas(desde, hasta, top=10):
+    """Ventas entre dos días (incluidos) leídas sólo de las tablas de agregados.
+
+    El desglose por estado cuenta pedidos (líneas) según su estado actual.
+    """
+    td, te = VentaDia.__table__, VentaDiaEstado.__table__
+    tp, tc = VentaDiaProducto.__table__, VentaDiaCategoria.__table__
+    por_dia = _totales(VentaDia, desde, hasta, td.c.dia, orden=td.c.dia)
+
+    productos = _totales(VentaDiaProducto, desde, hasta, tp.c.id_producto,
+                         orden=db.func.sum(tp.c.ingresos).desc(), limite=top)
+    nombres = dict(db.session.execute(
+        db.select(Producto.id_producto, Producto.nombre)
+        .where(Producto.id_producto.in_([p.id_producto for p in productos]))
+    ).all()) if productos else {}
+
+    return {
+        'desde': desde,
+        'hasta': hasta,
+        'por_dia': por_dia,
+        'total_ingresos': sum((d.ingresos or 0 for d in por_dia), Decimal('0')),
+        'total_unidades': sum(int(d.unidades or 0) for d in por_dia),
+        'total_facturas': sum(int(d.facturas or 0) for d in por_dia),
+        'por_estado': _totales(VentaDiaEstado, desde, hasta, te.c.estado, orden=te.c.estado),
+        'por_categoria': _totales(VentaDiaCategoria, desde, hasta, tc.c.categoria,
+                                  orden=db.func.sum(tc.c.ingresos).desc()),
+        'top_productos': [(nombres.get(p.id_producto, 'Producto eliminado'), p) for p in productos],
+        'marca': leer_marca(),
+    }